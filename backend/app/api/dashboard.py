@@ -1,26 +1,36 @@
 """
 API endpoints для dashboard
 GET /state - состояние операторов и сводка
-GET /boxes - группировка по коробам
+GET /boxes - сводки коробов (клиент → город → короб)
+GET /boxes/items - товары короба
 GET /raw - сырые логи
+GET /stream - live поток изменений за сегодня (SSE)
+POST /stream-token - токен подключения к /stream
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, time, timezone, timedelta
 from collections import defaultdict
 import logging
+import orjson
 
-from app.database import get_db
+from app.database import AsyncSessionLocal
 from app.config import settings
-from app.models.event import Event
+from app.services import queries
+from app.services.live_state import live_state, now_ms, to_ms
+from app.services.live_stream import live_hub, sse
+from app.services.cache import etag_matches, response_cache
+from app.services.read_routing import get_read_db
+from app.services.data_version import days_between
 from app.schemas.dashboard import (
     DashboardStateResponse, OperatorStats, ClientStats,
     FeedEvent, Summary, BoxesStateResponse, ClientBoxes,
-    CityBoxes, BoxDetails, BoxItem, RawLogsResponse, RawLogEvent
+    CityBoxes, BoxDetails, BoxItem, BoxItemsResponse, RawLogsResponse,
+    LiveDelta, LiveStatus, StreamTokenResponse
 )
-from app.api.events import verify_api_key
+from app.api.events import issue_stream_token, verify_api_key, verify_api_key_or_token
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -95,14 +105,179 @@ def extract_box_number(box: str) -> str:
     return parts[1] if len(parts) > 1 else box
 
 
+def operator_stats(rows) -> List[OperatorStats]:
+    """Строки операторов → OperatorStats (онлайн первыми, затем по itemsToday)"""
+    # Текущее время для расчета онлайн-статуса
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    online_threshold = settings.ONLINE_THRESHOLD_SECONDS
+
+    operators = []
+    for row in rows:
+        last_seen_ms = int(row.last_received_at.timestamp() * 1000)
+        age_sec = (now_ms - last_seen_ms) // 1000
+        online = age_sec <= online_threshold
+
+        operators.append(OperatorStats(
+            operator=row.operator or '—',
+            online=online,
+            onlineAgeSec=age_sec,
+            lastSeenMs=last_seen_ms,
+            lastClient=row.client or '—',
+            lastCity=row.city or '—',
+            lastBox=extract_box_number(row.last_box or ''),
+            itemsToday=row.items,
+            errorsToday=row.errors,
+            lastSeenAt=format_datetime(row.last_received_at)
+        ))
+
+    operators.sort(key=lambda x: (-x.online, -x.itemsToday))
+    return operators
+
+
+def client_stats(rows) -> List[ClientStats]:
+    """Строки клиентов → ClientStats (по items)"""
+    # Клиенты без ITEM/BOX/CLOSE/ERROR событий (только CITY и т.п.) не показываются
+    clients = [
+        ClientStats(
+            client=row.client or '—',
+            items=row.items,
+            boxesOpen=row.boxes_open,
+            boxesClose=row.boxes_close,
+            errors=row.errors
+        )
+        for row in rows
+        if row.items or row.boxes_open or row.boxes_close or row.errors
+    ]
+    clients.sort(key=lambda x: -x.items)
+    return clients
+
+
+def feed_events(rows) -> List[FeedEvent]:
+    """Строки ленты → FeedEvent"""
+    return [
+        FeedEvent(
+            ts=format_datetime(e.ts),
+            operator=e.operator or '—',
+            type=e.type,
+            client=e.client or '—',
+            city=e.city or '—',
+            box=extract_box_number(e.box or ''),
+            code=e.code or '',
+            uuid=str(e.uuid)
+        )
+        for e in rows
+    ]
+
+
+def summary_of(client_rows) -> Summary:
+    """Сводка по строкам клиентов"""
+    return Summary(
+        items=sum(row.items for row in client_rows),
+        opens=sum(row.boxes_open for row in client_rows),
+        closes=sum(row.boxes_close for row in client_rows),
+        errors=sum(row.errors for row in client_rows)
+    )
+
+
+async def build_state(
+    db: AsyncSession,
+    start_date: datetime,
+    end_date: datetime,
+    operator: Optional[str],
+    client: Optional[str],
+    city: Optional[str],
+    live: bool = False,
+    since: Optional[int] = None
+) -> DashboardStateResponse:
+    """
+    Собрать ответ /state (live=True - из live состояния воркера)
+
+    since - версия предыдущего ответа: за сегодня вернуть только изменившихся
+    операторов/клиентов и новые события ленты (delta=True). Если воркер не
+    может посчитать дельту (since раньше его гидратации), ответ полный.
+    """
+    # Версия - до чтения состояния: все, что применится позже, будет новее
+    version = now_ms()
+    delta = live and since is not None and live_state.can_sync_since(since)
+
+    if live:
+        filters = (operator, client, city)
+        operator_rows = live_state.operator_rows(*filters)
+        client_rows = live_state.client_rows(*filters)
+        cities_list = live_state.city_list(*filters)
+        if delta:
+            cutoff = since - settings.DASHBOARD_DELTA_OVERLAP_SECONDS * 1000
+            feed_rows = live_state.feed_since(cutoff, *filters)
+        else:
+            feed_rows = live_state.feed_rows(*filters)
+    else:
+        stats_where = queries.stats_filters(start_date, end_date, operator, client, city)
+        operator_rows = await queries.operator_rows(db, stats_where)
+        client_rows = await queries.client_rows(db, stats_where)
+        cities_list = await queries.city_list(db, stats_where)
+        feed_rows = None
+
+    if feed_rows is None:
+        feed_where = queries.event_filters(start_date, end_date, operator, client, city)
+        feed_rows = await queries.feed_rows(db, feed_where)
+
+    summary = summary_of(client_rows)
+    feed = feed_events(feed_rows)
+
+    # === СПИСКИ ДЛЯ ФИЛЬТРОВ ===
+    operators_list = sorted(row.operator for row in operator_rows if row.operator)
+    clients_list = sorted(row.client for row in client_rows if row.client)
+
+    if delta:
+        changed = live_state.changed_keys(cutoff, *filters)
+        changed_operators = set(key[0] for key in changed)
+        changed_clients = set(key[1] for key in changed)
+        # Онлайн-статус меняется и без событий: оператор мог уйти в офлайн после cutoff
+        offline_after_ms = cutoff - settings.ONLINE_THRESHOLD_SECONDS * 1000
+        operator_rows = [
+            row for row in operator_rows
+            if row.operator in changed_operators or to_ms(row.last_received_at) > offline_after_ms
+        ]
+        client_rows = [row for row in client_rows if row.client in changed_clients]
+
+    operators = operator_stats(operator_rows)
+    clients = client_stats(client_rows)
+
+    return DashboardStateResponse(
+        generatedAt=datetime.now(timezone.utc).isoformat(),
+        operators=operators,
+        clients=clients,
+        feed=feed,
+        summary=summary,
+        filters={
+            'date': start_date.date().isoformat(), 'date_end': end_date.date().isoformat(),
+            'operator': operator, 'client': client, 'city': city
+        },
+        operatorsList=operators_list,
+        clientsList=clients_list,
+        citiesList=cities_list,
+        version=version,
+        delta=delta
+    )
+
+
+def live_etag(operator: Optional[str], client: Optional[str], city: Optional[str]) -> str:
+    """ETag ответа за сегодня: отпечаток live состояния под фильтр (одинаков во всех воркерах)"""
+    online_after = datetime.now(timezone.utc) - timedelta(seconds=settings.ONLINE_THRESHOLD_SECONDS)
+    return '"live-' + live_state.fingerprint(online_after, operator, client, city) + '"'
+
+
 @router.get("/state", response_model=DashboardStateResponse)
 async def get_dashboard_state(
+    response: Response,
     date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
     date_end: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
     operator: Optional[str] = Query(None, description="Фильтр по оператору"),
     client: Optional[str] = Query(None, description="Фильтр по клиенту"),
     city: Optional[str] = Query(None, description="Фильтр по городу"),
-    db: AsyncSession = Depends(get_db),
+    since: Optional[int] = Query(None, description="version предыдущего ответа: только изменения (за сегодня)"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
@@ -111,6 +286,19 @@ async def get_dashboard_state(
     - Статистика по клиентам
     - Лента последних 100 событий
     - Сводка за период (items, opens, closes, errors)
+    
+    За сегодня ответ строится из live состояния в памяти воркера
+    (app.services.live_state) без запросов к БД.
+    
+    Иначе операторы, клиенты, сводка и списки считаются в SQL по дневным
+    агрегатам event_daily_stats (app.services.queries). Из events читается
+    только лента: ORDER BY received_at DESC LIMIT 100. Такой ответ
+    кэшируется в Redis (app.services.cache).
+    
+    Delta-sync: ответ содержит version; запрос с since=<version> за сегодня
+    возвращает delta=true и только изменившиеся operators/clients и новые
+    события feed (summary и списки - полные). ETag + If-None-Match → 304,
+    если данные под фильтр не изменились.
     """
     try:
         # Парсинг диапазона дат
@@ -118,157 +306,213 @@ async def get_dashboard_state(
         
         logger.info(f"🔍 get_dashboard_state: date={date}, date_end={date_end}, operator={operator}, client={client}, city={city}")
         
-        # Базовый запрос
-        stmt = select(Event).where(
-            and_(
-                Event.ts >= start_date,
-                Event.ts <= end_date
-            )
-        )
-        
-        # Фильтры
-        if operator:
-            stmt = stmt.where(Event.operator == operator)
-        if client:
-            stmt = stmt.where(Event.client == client)
-        if city:
-            stmt = stmt.where(Event.city == city)
-        
-        # Выполнить запрос
-        result = await db.execute(stmt)
-        events = result.scalars().all()
-        
-        # Текущее время для расчета онлайн-статуса
-        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
-        online_threshold = settings.ONLINE_THRESHOLD_SECONDS
-        
-        # === ОПЕРАТОРЫ ===
-        operator_data = defaultdict(lambda: {
-            'last_event': None,
-            'items': set(),  # уникальные UUID
-            'errors': 0
-        })
-        
-        for event in events:
-            op = event.operator or '—'
-            op_data = operator_data[op]
-            
-            # Обновить последнее событие
-            if op_data['last_event'] is None or event.received_at > op_data['last_event'].received_at:
-                op_data['last_event'] = event
-            
-            # Подсчет ITEM (по уникальным UUID)
-            if event.type == 'ITEM':
-                op_data['items'].add(str(event.uuid))
-            
-            # Подсчет ошибок
-            if event.type == 'ERROR':
-                op_data['errors'] += 1
-        
-        # Формирование списка операторов
-        operators = []
-        for op, data in operator_data.items():
-            last_event = data['last_event']
-            if not last_event:
-                continue
-            
-            last_seen_ms = int(last_event.received_at.timestamp() * 1000)
-            age_sec = (now_ms - last_seen_ms) // 1000
-            online = age_sec <= online_threshold
-            
-            operators.append(OperatorStats(
-                operator=op,
-                online=online,
-                onlineAgeSec=age_sec,
-                lastSeenMs=last_seen_ms,
-                lastClient=last_event.client or '—',
-                lastCity=last_event.city or '—',
-                lastBox=extract_box_number(last_event.box or ''),
-                itemsToday=len(data['items']),
-                errorsToday=data['errors'],
-                lastSeenAt=format_datetime(last_event.received_at)
-            ))
-        
-        # Сортировка: онлайн операторы первыми, затем по itemsToday
-        operators.sort(key=lambda x: (-x.online, -x.itemsToday))
-        
-        # === КЛИЕНТЫ ===
-        client_data = defaultdict(lambda: {
-            'items': 0,
-            'boxesOpen': 0,
-            'boxesClose': 0,
-            'errors': 0
-        })
-        
-        for event in events:
-            c = event.client or '—'
-            if event.type == 'ITEM':
-                client_data[c]['items'] += 1
-            elif event.type == 'BOX':
-                client_data[c]['boxesOpen'] += 1
-            elif event.type == 'CLOSE':
-                client_data[c]['boxesClose'] += 1
-            elif event.type == 'ERROR':
-                client_data[c]['errors'] += 1
-        
-        clients = [
-            ClientStats(
-                client=c,
-                items=data['items'],
-                boxesOpen=data['boxesOpen'],
-                boxesClose=data['boxesClose'],
-                errors=data['errors']
-            )
-            for c, data in client_data.items()
-        ]
-        clients.sort(key=lambda x: -x.items)
-        
-        # === ЛЕНТА (последние 100 событий) ===
-        feed_events = sorted(events, key=lambda e: e.received_at, reverse=True)[:100]
-        feed = [
-            FeedEvent(
-                ts=format_datetime(e.ts),
-                operator=e.operator or '—',
-                type=e.type,
-                client=e.client or '—',
-                city=e.city or '—',
-                box=extract_box_number(e.box or ''),
-                code=e.code or ''
-            )
-            for e in feed_events
-        ]
-        
-        # === СВОДКА ===
-        unique_item_uuids = set(str(e.uuid) for e in events if e.type == 'ITEM')
-        summary = Summary(
-            items=len(unique_item_uuids),
-            opens=sum(1 for e in events if e.type == 'BOX'),
-            closes=sum(1 for e in events if e.type == 'CLOSE'),
-            errors=sum(1 for e in events if e.type == 'ERROR')
-        )
-        
-        # === СПИСКИ ДЛЯ ФИЛЬТРОВ ===
-        operators_list = sorted(set(e.operator for e in events if e.operator))
-        clients_list = sorted(set(e.client for e in events if e.client))
-        cities_list = sorted(set(e.city for e in events if e.city))
-        
-        return DashboardStateResponse(
-            generatedAt=datetime.now(timezone.utc).isoformat(),
-            operators=operators,
-            clients=clients,
-            feed=feed,
-            summary=summary,
-            filters={'date': date, 'operator': operator, 'client': client, 'city': city},
-            operatorsList=operators_list,
-            clientsList=clients_list,
-            citiesList=cities_list
+        # За сегодня - из памяти воркера, кэш не нужен
+        if live_state.serves(start_date, end_date):
+            etag = live_etag(operator, client, city)
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+            return await build_state(db, start_date, end_date, operator, client, city, live=True, since=since)
+        
+        key = response_cache.key("state", start_date.date(), end_date.date(), operator, client, city)
+        return await response_cache.get_or_compute(
+            "state", key, days_between(start_date.date(), end_date.date()),
+            lambda session: build_state(session, start_date, end_date, operator, client, city),
+            db,
+            if_none_match=if_none_match
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in get_dashboard_state: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def render_live_delta(scope, rows) -> Optional[str]:
+    """
+    delta для подписчиков scope: новые события под фильтр и полные значения
+    затронутых операторов/клиентов из live состояния (считается один раз на scope)
+    """
+    operator, client, city = scope.filters
+    rows = [
+        r for r in rows
+        if (not operator or r.operator == operator)
+        and (not client or r.client == client)
+        and (not city or r.city == city)
+    ]
+    if not rows:
+        return None
+
+    touched_operators = set(r.operator for r in rows)
+    touched_clients = set(r.client for r in rows)
+    operators = operator_stats(
+        [row for row in live_state.operator_rows(*scope.filters) if row.operator in touched_operators]
+    )
+    client_rows = live_state.client_rows(*scope.filters)
+
+    online = scope.state.setdefault("online", {})
+    for o in operators:
+        online[o.operator] = o.online
+
+    return LiveDelta(
+        feed=feed_events(sorted(rows, key=lambda r: r.received_at, reverse=True)),
+        operators=operators,
+        clients=client_stats([row for row in client_rows if row.client in touched_clients]),
+        summary=summary_of(client_rows)
+    ).model_dump_json()
+
+
+def render_live_status(scope) -> Optional[str]:
+    """status для подписчиков scope: операторы, сменившие онлайн-статус"""
+    if not live_state.ready:
+        return None
+    operators = operator_stats(live_state.operator_rows(*scope.filters))
+    previous = scope.state.get("online")
+    scope.state["online"] = {o.operator: o.online for o in operators}
+    if previous is None:
+        return None
+
+    changed = [o for o in operators if previous.get(o.operator) != o.online]
+    if not changed:
+        return None
+    return LiveStatus(operators=changed).model_dump_json()
+
+
+live_hub.configure(render_delta=render_live_delta, render_status=render_live_status)
+
+
+@router.post("/stream-token", response_model=StreamTokenResponse)
+async def stream_token(api_key: str = Depends(verify_api_key)):
+    """
+    Выдать короткоживущий токен для /dashboard/stream
+
+    EventSource не передает заголовки; токен вместо API ключа в URL.
+    Проверяется только при подключении - переподключение берет новый.
+    """
+    return StreamTokenResponse(token=issue_stream_token(), expiresIn=settings.STREAM_TOKEN_TTL_SECONDS)
+
+
+@router.get("/stream")
+async def stream_dashboard(
+    operator: Optional[str] = Query(None, description="Фильтр по оператору"),
+    client: Optional[str] = Query(None, description="Фильтр по клиенту"),
+    city: Optional[str] = Query(None, description="Фильтр по городу"),
+    api_key: str = Depends(verify_api_key_or_token)
+):
+    """
+    Live поток изменений dashboard за сегодня (text/event-stream)
+    
+    Первое событие - snapshot (как /state за сегодня), затем delta с новыми
+    событиями ленты и обновленными счетчиками, status при смене онлайн-статуса
+    операторов, reset - переподключиться (app.services.live_stream).
+    
+    EventSource не умеет заголовки: вместо API ключа - параметр token
+    из POST /stream-token.
+    Сессия БД не держится на время потока - только для ленты snapshot.
+    """
+    start_date, end_date = parse_date_range(None, None)
+    if not live_state.serves(start_date, end_date):
+        raise HTTPException(status_code=503, detail="Live state is not ready")
+
+    filters = (operator or None, client or None, city or None)
+
+    # Подписка до snapshot: события, пришедшие пока лента читается из БД,
+    # придут дельтой (клиент дедуплицирует ленту по uuid)
+    scope, queue = live_hub.subscribe(filters)
+    try:
+        async with AsyncSessionLocal() as db:
+            snapshot = await build_state(db, start_date, end_date, *filters, live=True)
+    except Exception as e:
+        live_hub.unsubscribe(scope, queue)
+        logger.error(f"❌ Error in stream_dashboard: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    scope.state.setdefault("online", {o.operator: o.online for o in snapshot.operators})
+
+    logger.info(f"📡 Live stream subscribed: operator={operator}, client={client}, city={city}")
+
+    return StreamingResponse(
+        live_hub.stream(scope, queue, sse("snapshot", snapshot.model_dump_json())),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def build_boxes(
+    db: AsyncSession,
+    start_date: datetime,
+    end_date: datetime,
+    operator: Optional[str],
+    client: Optional[str],
+    city: Optional[str],
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> BoxesStateResponse:
+    """
+    Собрать ответ /boxes из сводок box_daily_stats (без товаров)
+
+    Страница - limit групп (клиент, город) по убыванию товаров, начиная с offset.
+    """
+    where = queries.box_stats_filters(start_date, end_date, operator, client, city)
+
+    groups = await queries.box_group_rows(db, where, limit, offset)
+    total_groups = groups[0].total_groups if groups else 0
+
+    # Группировка: client → city → [BoxDetails]
+    by_client = defaultdict(lambda: defaultdict(list))
+    if groups:
+        group_keys = [(g.client, g.city) for g in groups]
+        for row in await queries.box_summary_rows(db, where, group_keys):
+            client_name = row.client or '—'
+            city_name = row.city or '—'
+            by_client[client_name][city_name].append(BoxDetails(
+                client=client_name,
+                city=city_name,
+                boxNo=row.box_no,
+                itemsCount=row.items,
+                closed=row.closes > 0,
+                firstAt=format_datetime(row.first_ts),
+                lastAt=format_datetime(row.last_ts),
+                operators=sorted(row.operators)
+            ))
+
+    # Формирование ответа
+    clients_list = []
+    for c, cities_dict in by_client.items():
+        cities_list = []
+        for city_name, boxes_list in cities_dict.items():
+            boxes_list.sort(key=lambda b: (-b.itemsCount, b.boxNo))
+            cities_list.append(CityBoxes(
+                city=city_name,
+                boxes=boxes_list,
+                totalItems=sum(b.itemsCount for b in boxes_list),
+                totalBoxes=len(boxes_list)
+            ))
+
+        cities_list.sort(key=lambda c: (-c.totalItems, c.city))
+        clients_list.append(ClientBoxes(
+            client=c,
+            cities=cities_list,
+            totalItems=sum(c.totalItems for c in cities_list),
+            totalBoxes=sum(c.totalBoxes for c in cities_list)
+        ))
+
+    clients_list.sort(key=lambda c: (-c.totalItems, c.client))
+
+    next_offset = offset + len(groups)
+    return BoxesStateResponse(
+        generatedAt=datetime.now(timezone.utc).isoformat(),
+        filters={
+            'date': start_date.date().isoformat(), 'date_end': end_date.date().isoformat(),
+            'operator': operator, 'client': client, 'city': city
+        },
+        clients=clients_list,
+        totalGroups=total_groups,
+        nextOffset=next_offset if next_offset < total_groups else None
+    )
+
+
 @router.get("/boxes", response_model=BoxesStateResponse)
 async def get_boxes_state(
     date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
@@ -276,118 +520,149 @@ async def get_boxes_state(
     operator: Optional[str] = Query(None),
     client: Optional[str] = Query(None),
     city: Optional[str] = Query(None),
-    db: AsyncSession = Depends(get_db),
+    limit: int = Query(50, ge=1, le=1000, description="Групп (клиент, город) на странице"),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
-    Группировка событий по клиентам → городам → коробам → товарам
+    Сводки коробов: клиенты → города → короба (без товаров)
+    
+    Строится по box_daily_stats, которую поддерживает ingest путь: время
+    не зависит от числа отсканированных товаров за период. Пагинация по
+    группам (клиент, город): limit/offset, nextOffset в ответе.
+    Товары короба - GET /boxes/items при раскрытии.
+    Ответ кэшируется в Redis (app.services.cache).
     """
     try:
         start_date, end_date = parse_date_range(date, date_end)
         
         logger.info(f"🔍 get_boxes_state: date={date}, date_end={date_end}, operator={operator}, client={client}, city={city}")
         
-        stmt = select(Event).where(
-            and_(
-                Event.ts >= start_date,
-                Event.ts <= end_date
-            )
+        key = response_cache.key("boxes", start_date.date(), end_date.date(), operator, client, city, limit, offset)
+        return await response_cache.get_or_compute(
+            "boxes", key, days_between(start_date.date(), end_date.date()),
+            lambda session: build_boxes(session, start_date, end_date, operator, client, city, limit, offset),
+            db
         )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in get_boxes_state: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def build_box_items(
+    db: AsyncSession,
+    start_date: datetime,
+    end_date: datetime,
+    operator: Optional[str],
+    client: str,
+    city: str,
+    box_no: str
+) -> BoxItemsResponse:
+    """Собрать ответ /boxes/items: ITEM события короба по ts"""
+    where = queries.event_filters(start_date, end_date, operator) + queries.box_filter(client, city, box_no)
+    items = [
+        BoxItem(
+            ts=format_datetime(row.ts),
+            code=row.code or '',
+            operator=row.operator or '',
+            uuid=str(row.uuid)
+        )
+        for row in await queries.box_item_rows(db, where)
+    ]
+    return BoxItemsResponse(client=client, city=city, boxNo=box_no, items=items, total=len(items))
+
+
+@router.get("/boxes/items", response_model=BoxItemsResponse)
+async def get_box_items(
+    client: str = Query(..., description="Клиент из /boxes ('—' - не указан)"),
+    city: str = Query(..., description="Город из /boxes ('—' - не указан)"),
+    box_no: str = Query(..., description="Номер короба (boxNo из /boxes)"),
+    date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    date_end: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    operator: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Товары одного короба за период (загружаются при раскрытии в /boxes)
+    Ответ кэшируется в Redis (app.services.cache).
+    """
+    try:
+        start_date, end_date = parse_date_range(date, date_end)
         
-        if operator:
-            stmt = stmt.where(Event.operator == operator)
-        if client:
-            stmt = stmt.where(Event.client == client)
-        if city:
-            stmt = stmt.where(Event.city == city)
-        
-        result = await db.execute(stmt)
-        events = result.scalars().all()
-        
-        # Группировка: client → city → box
-        by_client = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: {
-            'items': {},  # uuid → BoxItem
-            'first_ts': None,
-            'last_ts': None,
-            'operators': set()
-        })))
-        
-        for event in events:
-            c = event.client or '—'
-            city = event.city or '—'
-            box_no = extract_box_number(event.box or '')
-            
-            box_data = by_client[c][city][box_no]
-            
-            # Добавить ITEM
-            if event.type == 'ITEM':
-                uuid_str = str(event.uuid)
-                if uuid_str not in box_data['items']:
-                    box_data['items'][uuid_str] = BoxItem(
-                        ts=format_datetime(event.ts),
-                        code=event.code or '',
-                        operator=event.operator or '',
-                        uuid=uuid_str
-                    )
-            
-            # Обновить временные границы
-            if box_data['first_ts'] is None or event.ts < box_data['first_ts']:
-                box_data['first_ts'] = event.ts
-            if box_data['last_ts'] is None or event.ts > box_data['last_ts']:
-                box_data['last_ts'] = event.ts
-            
-            # Операторы
-            if event.operator:
-                box_data['operators'].add(event.operator)
-        
-        # Формирование ответа
-        clients_list = []
-        for c, cities_dict in by_client.items():
-            cities_list = []
-            for city, boxes_dict in cities_dict.items():
-                boxes_list = []
-                for box_no, box_data in boxes_dict.items():
-                    items = sorted(box_data['items'].values(), key=lambda x: x.ts)
-                    boxes_list.append(BoxDetails(
-                        client=c,
-                        city=city,
-                        boxNo=box_no,
-                        itemsCount=len(items),
-                        firstAt=format_datetime(box_data['first_ts']) if box_data['first_ts'] else '',
-                        lastAt=format_datetime(box_data['last_ts']) if box_data['last_ts'] else '',
-                        operators=sorted(box_data['operators']),
-                        items=items
-                    ))
-                
-                boxes_list.sort(key=lambda b: (-b.itemsCount, b.boxNo))
-                cities_list.append(CityBoxes(
-                    city=city,
-                    boxes=boxes_list,
-                    totalItems=sum(b.itemsCount for b in boxes_list),
-                    totalBoxes=len(boxes_list)
-                ))
-            
-            cities_list.sort(key=lambda c: (-c.totalItems, c.city))
-            clients_list.append(ClientBoxes(
-                client=c,
-                cities=cities_list,
-                totalItems=sum(c.totalItems for c in cities_list),
-                totalBoxes=sum(c.totalBoxes for c in cities_list)
-            ))
-        
-        clients_list.sort(key=lambda c: (-c.totalItems, c.client))
-        
-        return BoxesStateResponse(
-            generatedAt=datetime.now(timezone.utc).isoformat(),
-            filters={'date': date, 'operator': operator, 'client': client},
-            clients=clients_list
+        key = response_cache.key("box_items", start_date.date(), end_date.date(), operator, client, city, box_no)
+        return await response_cache.get_or_compute(
+            "box_items", key, days_between(start_date.date(), end_date.date()),
+            lambda session: build_box_items(session, start_date, end_date, operator, client, city, box_no),
+            db
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"❌ Error in get_boxes_state: {e}")
+        logger.error(f"❌ Error in get_box_items: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def build_raw(
+    db: AsyncSession,
+    start_date: datetime,
+    end_date: datetime,
+    operator: Optional[str],
+    client: Optional[str],
+    city: Optional[str],
+    type: Optional[str],
+    limit: int,
+    cursor: Optional[str] = None,
+    estimate_total: bool = False
+) -> bytes:
+    """
+    Собрать страницу /raw - готовое JSON тело RawLogsResponse
+
+    Keyset пагинация по (received_at DESC, uuid DESC): страница на любой
+    глубине читает только limit + 1 строк по idx_events_feed.
+
+    Страница до 10000 строк, поэтому без ORM и pydantic: Postgres отдает
+    колонки уже в формате ответа (queries.RAW_COLUMNS), строки сразу
+    сериализуются orjson.
+    """
+    where = queries.event_filters(start_date, end_date, operator, client, city, type)
+    if cursor:
+        try:
+            where += queries.after_cursor(*queries.decode_cursor(cursor))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    rows = await queries.raw_page(db, where, limit)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = queries.encode_cursor(last.received_at, last.uuid)
+
+    logger.info(f"✅ get_raw_logs: found {len(rows)} events")
+
+    fields = queries.RAW_FIELDS
+    logs = [dict(zip(fields, row)) for row in rows]
+
+    total_estimate = None
+    if estimate_total:
+        total_estimate = await queries.estimate_event_count(
+            db, start_date, end_date, operator, client, city, type
+        )
+
+    return orjson.dumps({
+        "logs": logs,
+        "total": len(logs),
+        "nextCursor": next_cursor,
+        "totalEstimate": total_estimate,
+    })
+
+
 @router.get("/raw", response_model=RawLogsResponse)
 async def get_raw_logs(
     date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
@@ -397,69 +672,40 @@ async def get_raw_logs(
     city: Optional[str] = Query(None),
     type: Optional[str] = Query(None, description="Event type filter"),
     limit: int = Query(1000, ge=1, le=10000),
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="nextCursor предыдущей страницы"),
+    estimate_total: bool = Query(False, description="Вернуть totalEstimate - быструю оценку общего числа"),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Получить сырые логи за период (без агрегации)
-    Сортировка: по received_at DESC
+    Сортировка: по received_at DESC, uuid DESC
     Поддерживает фильтрацию по дате, оператору, клиенту, городу, типу события
+    
+    Пагинация курсором: ответ содержит nextCursor, следующая страница -
+    тот же запрос с cursor=<nextCursor>. Время страницы не зависит от глубины.
+    totalEstimate (estimate_total=true) считается по event_daily_stats или
+    оценке планировщика, без чтения всех строк.
+    Ответ кэшируется в Redis (app.services.cache).
     """
     try:
         start_date, end_date = parse_date_range(date, date_end)
         
         logger.info(f"🔍 get_raw_logs: date={date}, date_end={date_end}, operator={operator}, client={client}, city={city}, type={type}")
         
-        # Базовый запрос
-        stmt = select(Event).where(
-            and_(
-                Event.ts >= start_date,
-                Event.ts <= end_date
-            )
-        ).order_by(Event.received_at.desc()).limit(limit)
-        
-        # Фильтры
-        if operator:
-            stmt = stmt.where(Event.operator == operator)
-        
-        if client:
-            stmt = stmt.where(Event.client == client)
-        
-        if city:
-            stmt = stmt.where(Event.city == city)
-        
-        if type:
-            stmt = stmt.where(Event.type == type)
-        
-        result = await db.execute(stmt)
-        events = result.scalars().all()
-        
-        logger.info(f"✅ get_raw_logs: found {len(events)} events")
-        
-        logs = [
-            RawLogEvent(
-                uuid=str(e.uuid),
-                ts=format_datetime(e.ts),
-                type=e.type,
-                operator=e.operator or '',
-                client=e.client or '',
-                city=e.city or '',
-                box=e.box or '',
-                code=e.code or '',
-                details=e.details,
-                receivedAt=format_datetime(e.received_at),
-                source=e.source,
-                tsMs=int(e.ts.timestamp() * 1000),
-                receivedAtMs=int(e.received_at.timestamp() * 1000)
-            )
-            for e in events
-        ]
-        
-        return RawLogsResponse(
-            logs=logs,
-            total=len(logs)
+        key = response_cache.key(
+            "raw", start_date.date(), end_date.date(), operator, client, city, type, limit, cursor, estimate_total
+        )
+        return await response_cache.get_or_compute(
+            "raw", key, days_between(start_date.date(), end_date.date()),
+            lambda session: build_raw(
+                session, start_date, end_date, operator, client, city, type, limit, cursor, estimate_total
+            ),
+            db
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in get_raw_logs: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,21 +1,35 @@
 """
 API endpoints для работы с событиями сканирования
 POST /batch - прием батча событий
+POST /stream - потоковый прием NDJSON (для накопившихся офлайн событий)
 POST /verify - проверка существующих UUID
 POST /remove - удаление товара
 POST /bulk-remove - массовое удаление
 """
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update
 from typing import Optional
+import hashlib
+import hmac
 import logging
+import time
 from datetime import datetime, timezone
 import uuid as uuid_lib
 
 from app.database import get_db
 from app.config import settings
-from app.models.event import Event
+from app.models.event import Event, EventUUID
+from app.services.ingest import after_commit, ingest_events, ingest_rows, insert_rows
+from app.services import data_version, day_snapshots, rollups
+from app.services.read_routing import TOKEN_HEADER, read_router, write_token
+from app.services.live_state import live_state
+from app.services.uuid_filter import uuid_filter
+from app.services.codec import PayloadError, decompress, decode_batch, is_msgpack
+from app.services.ingest_queue import ingest_queue
+from app.services.stream_ingest import StreamingAckResponse, ingest_ndjson
 from app.schemas.event import (
     EventBatchRequest, EventBatchResponse,
     VerifyUUIDRequest, VerifyUUIDResponse,
@@ -33,81 +47,115 @@ def verify_api_key(x_api_key: Optional[str] = Header(None)):
     return x_api_key
 
 
-@router.post("/batch", response_model=EventBatchResponse)
+def stream_signature(expires: int) -> str:
+    return hmac.new(settings.API_KEY.encode(), f"stream:{expires}".encode(), hashlib.sha256).hexdigest()
+
+
+def issue_stream_token() -> str:
+    """
+    Короткоживущий токен для EventSource: "<expires>.<HMAC-SHA256(API_KEY)>"
+
+    EventSource не умеет заголовки, а общий API ключ в URL попадает в логи
+    прокси и историю браузера. Токен действует STREAM_TOKEN_TTL_SECONDS
+    и нужен только при подключении.
+    """
+    expires = int(time.time()) + settings.STREAM_TOKEN_TTL_SECONDS
+    return f"{expires}.{stream_signature(expires)}"
+
+
+def verify_api_key_or_token(
+    x_api_key: Optional[str] = Header(None),
+    token: Optional[str] = Query(None, description="Токен из POST /dashboard/stream-token (для EventSource)")
+):
+    """Проверка API ключа из заголовка X-API-Key или токена потока"""
+    if x_api_key:
+        return verify_api_key(x_api_key)
+    try:
+        expires, signature = (token or "").split(".")
+        valid = int(expires) >= time.time() and hmac.compare_digest(signature, stream_signature(int(expires)))
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream token")
+    return token
+
+
+BATCH_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {"type": "object", "description": "EventBatchRequest: {events: [EventCreate, ...]}"}
+            },
+            "application/msgpack": {
+                "schema": {
+                    "type": "object",
+                    "description": "Построчная {events: [...]} или колоночная {shared: {...}, columns: {...}} раскладка"
+                }
+            },
+        },
+    }
+}
+
+
+async def parse_batch_body(http_request: Request) -> tuple[Optional[EventBatchRequest], Optional[list]]:
+    """
+    Разобрать тело /batch по Content-Type / Content-Encoding
+    
+    Returns:
+        (EventBatchRequest, None) для JSON или (None, rows) для msgpack
+    """
+    body = await http_request.body()
+    try:
+        body = decompress(body, http_request.headers.get("content-encoding"))
+        if is_msgpack(http_request.headers.get("content-type")):
+            return None, decode_batch(body)
+        return EventBatchRequest.model_validate_json(body), None
+    except PayloadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        )
+
+
+@router.post("/batch", response_model=EventBatchResponse, openapi_extra=BATCH_OPENAPI)
 async def batch_insert_events(
-    request: EventBatchRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Батч-вставка событий сканирования
     
-    - Проверяет дубликаты по UUID
-    - Вставляет только уникальные события
+    - Тело: JSON (application/json) или msgpack (application/msgpack),
+      опционально сжатое (Content-Encoding: gzip)
+    - msgpack поддерживает колоночную раскладку и декодируется без EventCreate на строку
+    - Дедупликация и вставка одним INSERT ... ON CONFLICT (uuid, ts) DO NOTHING
+    - Параллельные ретраи одного батча не приводят к IntegrityError
+    - При INGEST_GROUP_COMMIT_ENABLED батч уходит в group commit очередь
+      и объединяется с параллельными запросами в одну транзакцию
     - Возвращает статистику: inserted, skipped, duplicates
     """
+    request, rows = await parse_batch_body(http_request)
+    
     try:
-        # Извлечь UUID из запроса
-        uuids_to_check = [str(e.uuid) for e in request.events if e.uuid]
-        
-        # Найти существующие UUID в БД
-        if uuids_to_check:
-            stmt = select(Event.uuid).where(Event.uuid.in_(uuids_to_check))
-            result = await db.execute(stmt)
-            existing_uuids = set(str(row[0]) for row in result.fetchall())
+        if ingest_queue.running:
+            if rows is not None:
+                response = await ingest_queue.ingest_rows(rows)
+            else:
+                response = await ingest_queue.ingest(request.events)
         else:
-            existing_uuids = set()
-        
-        # Подготовка событий для вставки
-        events_to_insert = []
-        skipped_count = 0
-        duplicates = []
-        
-        for event_data in request.events:
-            # Генерация UUID если не указан
-            event_uuid = event_data.uuid or uuid_lib.uuid4()
-            event_uuid_str = str(event_uuid)
-            
-            # Проверка дубликата
-            if event_uuid_str in existing_uuids:
-                skipped_count += 1
-                duplicates.append(event_uuid_str)
-                continue
-            
-            # Конвертация timestamp (ms → datetime)
-            ts_dt = datetime.fromtimestamp(event_data.ts / 1000, tz=timezone.utc)
-            
-            # Создание модели Event
-            event = Event(
-                uuid=event_uuid,
-                ts=ts_dt,
-                type=event_data.type,
-                operator=event_data.operator,
-                client=event_data.client,
-                city=event_data.city,
-                box=event_data.box,
-                code=event_data.code,
-                details=event_data.details,
-                source=event_data.source or "pwa",
-                received_at=datetime.now(timezone.utc)
-            )
-            
-            events_to_insert.append(event)
-            existing_uuids.add(event_uuid_str)  # Предотвратить дубликаты внутри батча
-        
-        # Bulk insert
-        if events_to_insert:
-            db.add_all(events_to_insert)
+            if rows is not None:
+                response, inserted, txid = await ingest_rows(db, rows)
+            else:
+                response, inserted, txid = await ingest_events(db, request.events)
             await db.commit()
-            logger.info(f"✅ Inserted {len(events_to_insert)} events, skipped {skipped_count}")
+            await after_commit(inserted, txid)
         
-        return EventBatchResponse(
-            ok=True,
-            inserted=len(events_to_insert),
-            skipped=skipped_count,
-            duplicates=duplicates,
-            errors=[]
-        )
+        logger.info(f"✅ Inserted {response.inserted} events, skipped {response.skipped}")
+        
+        return response
     
     except Exception as e:
         logger.error(f"❌ Error in batch_insert: {e}", exc_info=True)
@@ -115,6 +163,27 @@ async def batch_insert_events(
         raise HTTPException(status_code=500, detail=f"Batch insert failed: {str(e)}")
 
 
+@router.post("/stream")
+async def stream_insert_events(
+    request: Request,
+    offset: int = Query(0, ge=0, description="Номер первой строки потока (для возобновления)"),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Потоковый прием событий в формате NDJSON (одно событие EventCreate на строку)
+    
+    - Длина потока не ограничена, память сервера постоянна
+    - События пишутся чанками по INGEST_STREAM_CHUNK_SIZE
+    - После commit каждого чанка в ответ пишется ACK строка с ackedThrough
+    - После обрыва соединения клиент продолжает с ackedThrough + 1
+      (передав его в ?offset=, чтобы номера строк в ACK совпадали)
+    """
+    return StreamingAckResponse(
+        ingest_ndjson(request.stream(), offset=offset),
+        media_type="application/x-ndjson"
+    )
+
+
 @router.post("/verify", response_model=VerifyUUIDResponse)
 async def verify_uuids(
     request: VerifyUUIDRequest,
@@ -125,12 +194,25 @@ async def verify_uuids(
     Проверить какие UUID уже существуют в БД
     
     Используется PWA для verify-ACK механизма перед отправкой батча
+    
+    UUID, отсеянные Bloom фильтром, отсутствуют в БД: в memory режиме
+    они дополнительно ищутся среди событий, полученных после последней
+    синхронизации фильтра (вставки других воркеров), в redis режиме
+    фильтр общий. По всей таблице проверяются только возможные попадания.
     """
     try:
+        candidates = await uuid_filter.maybe_present(request.uuids)
+        
         # Найти существующие UUID
-        stmt = select(Event.uuid).where(Event.uuid.in_(request.uuids))
-        result = await db.execute(stmt)
-        existing_uuids = [str(row[0]) for row in result.fetchall()]
+        existing_uuids = []
+        if candidates:
+            # event_uuids - те же uuid, по которым дедуплицирует ingest;
+            # один PK вместо пробы индекса каждой секции events
+            stmt = select(EventUUID.uuid).where(EventUUID.uuid.in_(candidates))
+            result = await db.execute(stmt)
+            existing_uuids = [str(row[0]) for row in result.fetchall()]
+            if uuid_filter.ready:
+                uuid_filter.record_false_positives(len(candidates) - len(existing_uuids))
         
         return VerifyUUIDResponse(
             ok=True,
@@ -145,32 +227,43 @@ async def verify_uuids(
 @router.post("/remove", response_model=RemoveResponse)
 async def remove_item(
     request: RemoveItemRequest,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Удалить товар из короба
     
-    Создает событие REMOVE для аудита
+    Создает событие REMOVE для аудита (через ingest insert_rows,
+    поэтому событие сразу учитывается в дневных агрегатах)
+    
+    С read репликой отдает заголовок X-Read-After: передав его в GET
+    dashboard/export, клиент прочитает данные не старше удаления.
     """
     try:
+        now = datetime.now(timezone.utc)
+        
         # Создать событие удаления
-        remove_event = Event(
-            uuid=uuid_lib.uuid4(),
-            ts=datetime.now(timezone.utc),
-            type="REMOVE",
-            operator=request.operator,
-            client=request.box.split('/')[0] if '/' in request.box else '',
-            city='',
-            box=request.box,
-            code=request.code,
-            details=request.reason or "Удалено через dashboard",
-            source="dashboard",
-            received_at=datetime.now(timezone.utc)
-        )
+        remove_row = {
+            "uuid": uuid_lib.uuid4(),
+            "ts": now,
+            "type": "REMOVE",
+            "operator": request.operator,
+            "client": request.box.split('/')[0] if '/' in request.box else '',
+            "city": '',
+            "box": request.box,
+            "code": request.code,
+            "details": request.reason or "Удалено через dashboard",
+            "source": "dashboard",
+            "received_at": now,
+            "created_at": now,
+        }
         
-        db.add(remove_event)
+        _, txid = await insert_rows(db, [remove_row])
         await db.commit()
+        await after_commit([remove_row], txid)
+        if read_router.enabled:
+            response.headers[TOKEN_HEADER] = await write_token(db)
         
         logger.info(f"✅ Item removed: box={request.box}, code={request.code}")
         
@@ -189,60 +282,88 @@ async def remove_item(
 @router.post("/bulk-remove", response_model=RemoveResponse)
 async def bulk_remove_items(
     request: BulkRemoveRequest,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Массовое удаление товаров по UUID
     
-    Создает событие BULK_REMOVE для аудита
+    - BULK_REMOVE_MODE="tombstone": UPDATE ... SET deleted_at (физическое
+      удаление делает фоновый purge в off-peak окне)
+    - BULK_REMOVE_MODE="delete": DELETE сразу (uuid освобождаются в event_uuids)
+    - Количество берется из RETURNING, без выборки строк
+    - Затронутые группы дневных агрегатов и сводки коробов пересчитываются
+      в той же транзакции, снимки прошедших дней инвалидируются, live
+      состояние воркеров перечитывается после commit
+    - Создает событие BULK_REMOVE для аудита
+    - С read репликой - заголовок X-Read-After (read-your-writes, см. /remove)
     """
     try:
-        # Найти события для удаления
-        stmt = select(Event).where(Event.uuid.in_(request.uuids))
-        result = await db.execute(stmt)
-        events_to_remove = result.scalars().all()
+        now = datetime.now(timezone.utc)
+        
+        if settings.BULK_REMOVE_MODE == "delete":
+            stmt = delete(Event).where(Event.uuid.in_(request.uuids))
+        else:
+            stmt = (
+                update(Event)
+                .where(Event.uuid.in_(request.uuids), Event.deleted_at.is_(None))
+                .values(deleted_at=now)
+            )
+        result = await db.execute(
+            stmt.returning(Event.uuid, Event.ts, Event.operator, Event.client, Event.city, Event.box)
+        )
+        removed = result.mappings().all()
+        removed_count = len(removed)
         
-        if not events_to_remove:
+        if removed_count and settings.BULK_REMOVE_MODE == "delete":
+            await db.execute(delete(EventUUID).where(EventUUID.uuid.in_([row["uuid"] for row in removed])))
+        
+        if not removed_count:
+            await db.rollback()
             return RemoveResponse(
                 ok=False,
                 message="Не найдены события с указанными UUID",
                 removed_count=0
             )
         
-        # Удалить события (ВАЖНО: это физическое удаление из БД!)
-        # Альтернатива: добавить поле deleted_at и делать soft delete
-        delete_stmt = delete(Event).where(Event.uuid.in_(request.uuids))
-        await db.execute(delete_stmt)
+        await rollups.refresh_groups(db, (rollups.group_key(row) for row in removed))
+        await rollups.refresh_boxes(db, (rollups.box_key(row) for row in removed))
+        await day_snapshots.invalidate(db, data_version.row_days(removed))
         
         # Создать аудит событие
-        audit_event = Event(
-            uuid=uuid_lib.uuid4(),
-            ts=datetime.now(timezone.utc),
-            type="BULK_REMOVE",
-            operator=request.operator,
-            client='',
-            city='',
-            box='',
-            code=f"Удалено {len(events_to_remove)} товаров",
-            details=request.reason or "Массовое удаление через dashboard",
-            source="dashboard",
-            received_at=datetime.now(timezone.utc)
-        )
+        audit_row = {
+            "uuid": uuid_lib.uuid4(),
+            "ts": now,
+            "type": "BULK_REMOVE",
+            "operator": request.operator,
+            "client": '',
+            "city": '',
+            "box": '',
+            "code": f"Удалено {removed_count} товаров",
+            "details": request.reason or "Массовое удаление через dashboard",
+            "source": "dashboard",
+            "received_at": now,
+            "created_at": now,
+        }
         
-        db.add(audit_event)
+        _, txid = await insert_rows(db, [audit_row])
         await db.commit()
+        await after_commit([audit_row], txid)
+        await live_state.publish_resync(txid)
+        await data_version.bump(data_version.row_days(removed))
+        if read_router.enabled:
+            response.headers[TOKEN_HEADER] = await write_token(db)
         
-        logger.info(f"✅ Bulk removed {len(events_to_remove)} events")
+        logger.info(f"✅ Bulk removed {removed_count} events ({settings.BULK_REMOVE_MODE})")
         
         return RemoveResponse(
             ok=True,
-            message=f"Удалено {len(events_to_remove)} товаров",
-            removed_count=len(events_to_remove)
+            message=f"Удалено {removed_count} товаров",
+            removed_count=removed_count
         )
     
     except Exception as e:
         logger.error(f"❌ Error in bulk_remove: {e}")
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-
@@ -1,37 +1,330 @@
 """
-API endpoints для экспорта данных в CSV
+API endpoints для экспорта данных в CSV и XLSX
 GET /csv - экспорт в CSV
+GET /boxes-csv - экспорт по коробам
+GET /xlsx, /boxes-xlsx - то же в Excel
+GET /parquet, /arrow - типизированные колонки для аналитики
+
+Ответы потоковые: строки читаются server-side курсором частями по
+EXPORT_CHUNK_ROWS и сразу уходят клиенту, память воркера не зависит от
+объема дня, первый байт - сразу после начала запроса.
+
+Диапазон date..date_end читается по дням параллельно
+(app.services.export_stream), output=gzip|zip сжимает на лету.
+
+XLSX собирается openpyxl (write-only) во временный файл с теми же
+server-side курсорами и отдается из файла; штрихкоды - текстовые ячейки.
+
+POST /jobs - те же выгрузки в фоне (app.services.export_jobs): статус и
+прогресс - GET /jobs/{id}, файл - GET /jobs/{id}/download.
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from typing import Optional
-from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from uuid import UUID
 from io import StringIO
+from itertools import groupby
 import csv
 import logging
+import os
+import tempfile
 
+from app.config import settings
 from app.database import get_db
-from app.models.event import Event
+from app.schemas.export import ExportJobRequest, ExportJobResponse
+from app.services.read_routing import get_read_db
+from app.services import queries
+from app.services import columnar_export
+from app.services.export_jobs import export_jobs
+from app.services.day_snapshots import SnapshotSource
+from app.services.export_stream import (
+    export_days, day_chunks, gzip_stream, zip_stream, write_stream, write_xlsx, xlsx_datetime,
+    XLSX_TEXT, XLSX_DATETIME
+)
 from app.api.events import verify_api_key
-from app.api.dashboard import parse_date, format_datetime, extract_box_number
+from app.api.dashboard import parse_date_range, format_datetime, extract_box_number
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+CSV_HEADER = [
+    'uuid', 'ts', 'type', 'operator', 'client',
+    'city', 'box', 'code', 'details', 'received_at', 'source'
+]
+BOXES_CSV_HEADER = ['Клиент', 'Город', 'Короб', 'ШК', 'Время скана', 'Оператор']
+EXPORT_OUTPUTS = ("csv", "gzip", "zip")
+EXPORT_SPLITS = ("day", "client")
+JOB_KINDS = ("csv", "boxes-csv", "xlsx", "boxes-xlsx", "parquet", "arrow")
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Колонки XLSX: {индекс: формат ячейки} и ширины
+EVENTS_XLSX_FORMATS = {1: XLSX_DATETIME, 7: XLSX_TEXT, 9: XLSX_DATETIME}
+EVENTS_XLSX_WIDTHS = [38, 20, 8, 16, 16, 16, 20, 18, 30, 20, 8]
+BOXES_XLSX_FORMATS = {2: XLSX_TEXT, 3: XLSX_TEXT, 4: XLSX_DATETIME}
+BOXES_XLSX_WIDTHS = [20, 20, 10, 18, 20, 16]
+
+
+def event_csv_row(event) -> list:
+    """Строка /export/csv"""
+    return [
+        str(event.uuid),
+        format_datetime(event.ts),
+        event.type,
+        event.operator or '',
+        event.client or '',
+        event.city or '',
+        event.box or '',
+        # Защита от научной записи в Excel: ="код"
+        f'="{event.code}"' if event.code else '',
+        event.details or '',
+        format_datetime(event.received_at),
+        event.source
+    ]
+
+
+def box_csv_row(event) -> list:
+    """Строка /export/boxes-csv"""
+    return [
+        event.client or '—',
+        event.city or '—',
+        extract_box_number(event.box or ''),
+        f'="{event.code}"' if event.code else '',
+        format_datetime(event.ts),
+        event.operator or ''
+    ]
+
+
+def event_xlsx_row(event) -> list:
+    """Строка /export/xlsx: даты - ячейки даты (UTC), код - текст; пустые ячейки не пишутся"""
+    return [
+        str(event.uuid),
+        xlsx_datetime(event.ts),
+        event.type,
+        event.operator or None,
+        event.client or None,
+        event.city or None,
+        event.box or None,
+        event.code or None,
+        event.details or None,
+        xlsx_datetime(event.received_at),
+        event.source
+    ]
+
+
+def box_xlsx_row(event) -> list:
+    """Строка /export/boxes-xlsx"""
+    return [
+        event.client or '—',
+        event.city or '—',
+        extract_box_number(event.box or ''),
+        event.code or None,
+        xlsx_datetime(event.ts),
+        event.operator or None
+    ]
+
+
+def csv_bytes(rows: List[list]) -> bytes:
+    """Кусок CSV (разделитель ';', как ожидает Excel в ru локали)"""
+    output = StringIO()
+    csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL).writerows(rows)
+    return output.getvalue().encode('utf-8')
+
+
+def file_part(value: Optional[str]) -> str:
+    """Значение как часть имени файла в архиве"""
+    return (value or '—').replace('/', '_').replace('\\', '_')
+
+
+async def counted(chunks: AsyncIterator[tuple], label: str) -> AsyncIterator[tuple]:
+    """Лог числа выгруженных строк (или места обрыва)"""
+    count = 0
+    try:
+        async for day, rows in chunks:
+            yield day, rows
+            count += len(rows)
+    except Exception as e:
+        logger.error(f"❌ {label} interrupted after {count} rows: {e}")
+        raise
+    logger.info(f"✅ {label}: {count} rows")
+
+
+async def stream_csv(chunks: AsyncIterator[tuple], header: list, render_row: Callable) -> AsyncIterator[bytes]:
+    """
+    Один CSV: BOM + заголовок, дальше кусок на каждые EXPORT_CHUNK_ROWS строк
+
+    Генератор работает после return эндпоинта: сессия get_read_db
+    закрывается только после отправки ответа (FastAPI 0.104).
+    Ошибка посреди выгрузки обрывает ответ (статус уже отправлен).
+    """
+    # BOM для корректного отображения UTF-8 в Excel
+    yield '\ufeff'.encode('utf-8') + csv_bytes([header])
+    async for _, rows in chunks:
+        yield csv_bytes([render_row(row) for row in rows])
+
+
+async def csv_entries(
+    chunks: AsyncIterator[tuple], header: list, render_row: Callable, entry_name: Callable
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """(имя файла в zip, кусок CSV); у каждого нового файла - BOM и заголовок"""
+    name = None
+    async for day, rows in chunks:
+        for entry, group in groupby(rows, key=lambda row: entry_name(day, row)):
+            data = csv_bytes([render_row(row) for row in group])
+            if entry != name:
+                name = entry
+                data = '\ufeff'.encode('utf-8') + csv_bytes([header]) + data
+            yield entry, data
+
+
+def export_range(date: Optional[str], date_end: Optional[str]) -> Tuple[list, str]:
+    """Дни диапазона date..date_end (не больше EXPORT_MAX_DAYS) и дата для имени файла"""
+    start_date, end_date = parse_date_range(date, date_end)
+    days = export_days(start_date, end_date)
+    if len(days) > settings.EXPORT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {settings.EXPORT_MAX_DAYS} days")
+
+    date_part = start_date.date().isoformat()
+    if len(days) > 1:
+        date_part += f"_{end_date.date().isoformat()}"
+    return days, date_part
+
+
+def check_output(output: str, split: str) -> None:
+    if output not in EXPORT_OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"Invalid output. Use one of: {', '.join(EXPORT_OUTPUTS)}")
+    if split not in EXPORT_SPLITS:
+        raise HTTPException(status_code=400, detail=f"Invalid split. Use one of: {', '.join(EXPORT_SPLITS)}")
+
+
+def check_columnar(output: str) -> None:
+    if columnar_export.pa is None:
+        raise HTTPException(status_code=501, detail=f"{output} export is not available (pyarrow not installed)")
+
+
+def events_stmt(operator: Optional[str], client: Optional[str], type_filter: Optional[str], by_client: bool = False):
+    """make_stmt(start, end) для колонок /csv (только колонки файла, без ORM объектов)"""
+    def make_stmt(start, end):
+        where = queries.event_filters(start, end, operator=operator, client=client, event_type=type_filter)
+        return queries.export_statement(where, by_client=by_client)
+    return make_stmt
+
+
+def boxes_stmt(client: Optional[str]):
+    """make_stmt(start, end) для /boxes-*"""
+    def make_stmt(start, end):
+        return queries.box_export_statement(queries.event_filters(start, end, client=client))
+    return make_stmt
+
+
+def events_snapshot(
+    operator: Optional[str], client: Optional[str], type_filter: Optional[str], by_client: bool = False
+) -> Optional[SnapshotSource]:
+    """Снимки прошедших дней для events_stmt (порядок по клиенту - только SQL)"""
+    if by_client:
+        return None
+    return SnapshotSource("events", operator=operator, client=client, event_type=type_filter)
+
+
+def boxes_snapshot(client: Optional[str]) -> SnapshotSource:
+    """Снимки прошедших дней для boxes_stmt"""
+    return SnapshotSource("boxes", client=client)
+
+
+def export_chunks(
+    db: AsyncSession, days: list, make_stmt: Callable, label: str, snapshot: Optional[SnapshotSource] = None
+) -> AsyncIterator[tuple]:
+    """(день, строки) диапазона с логом итога; прошедшие дни - из снимков, если есть"""
+    return counted(
+        day_chunks(db, days, make_stmt, settings.EXPORT_PARALLEL_DAYS, settings.EXPORT_CHUNK_ROWS, snapshot), label
+    )
+
+
+def csv_body(
+    chunks: AsyncIterator[tuple], header: list, render_row: Callable,
+    prefix: str, date_part: str, output: str, split: str
+) -> Tuple[AsyncIterator[bytes], str, str]:
+    """
+    (поток байт, имя файла, media type) CSV экспорта
+
+    output: csv - один файл, gzip - тот же CSV в .csv.gz, zip - файл на
+    день (split=day) или на день и клиента (split=client).
+    """
+    if output == "zip":
+        if split == "client":
+            def entry_name(day, row):
+                return f"{day.date().isoformat()}/{file_part(row.client)}.csv"
+        else:
+            def entry_name(day, row):
+                return f"{prefix}_{day.date().isoformat()}.csv"
+        body = zip_stream(csv_entries(chunks, header, render_row, entry_name), settings.EXPORT_COMPRESS_LEVEL)
+        return body, f"{prefix}_{date_part}.zip", "application/zip"
+    if output == "gzip":
+        body = gzip_stream(stream_csv(chunks, header, render_row), settings.EXPORT_COMPRESS_LEVEL)
+        return body, f"{prefix}_{date_part}.csv.gz", "application/gzip"
+    return stream_csv(chunks, header, render_row), f"{prefix}_{date_part}.csv", "text/csv; charset=utf-8"
+
+
+def columnar_body(chunks: AsyncIterator[tuple], output: str, date_part: str) -> Tuple[AsyncIterator[bytes], str, str]:
+    """(поток байт, имя файла, media type) Parquet / Arrow IPC"""
+    body = columnar_export.columnar_stream(
+        chunks, output, settings.EXPORT_COLUMNAR_COMPRESSION, settings.EXPORT_PARQUET_ROW_GROUP_ROWS
+    )
+    return body, f"scanner_logs_{date_part}.{columnar_export.EXTENSIONS[output]}", columnar_export.MEDIA_TYPES[output]
+
+
+def streaming_response(body: AsyncIterator[bytes], filename: str, media_type: str) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+async def xlsx_file(
+    chunks: AsyncIterator[tuple], path: str, boxes: bool, date_part: str
+) -> Tuple[str, str]:
+    """Книга XLSX событий или коробов в path: (имя файла, media type)"""
+    if boxes:
+        await write_xlsx(chunks, path, "Короба", BOXES_CSV_HEADER, box_xlsx_row, BOXES_XLSX_FORMATS, BOXES_XLSX_WIDTHS)
+        return f"boxes_{date_part}.xlsx", XLSX_MEDIA_TYPE
+    await write_xlsx(chunks, path, "События", CSV_HEADER, event_xlsx_row, EVENTS_XLSX_FORMATS, EVENTS_XLSX_WIDTHS)
+    return f"scanner_logs_{date_part}.xlsx", XLSX_MEDIA_TYPE
+
+
+async def xlsx_response(chunks: AsyncIterator[tuple], boxes: bool, date_part: str) -> FileResponse:
+    """
+    XLSX ответ: книга собирается во временный файл, ответ - из файла
+
+    Ошибка сборки - 500 до начала ответа; файл удаляется после отправки.
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx", dir=settings.EXPORT_TEMP_DIR or None)
+    os.close(fd)
+    try:
+        filename, media_type = await xlsx_file(chunks, path, boxes, date_part)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return FileResponse(path, media_type=media_type, filename=filename, background=BackgroundTask(os.unlink, path))
+
 
 @router.get("/csv")
 async def export_csv(
     date: Optional[str] = Query(None, description="Дата в формате YYYY-MM-DD"),
+    date_end: Optional[str] = Query(None, description="Конец диапазона YYYY-MM-DD (включительно)"),
     operator: Optional[str] = Query(None),
     client: Optional[str] = Query(None),
     type_filter: Optional[str] = Query(None, alias="type"),
-    db: AsyncSession = Depends(get_db),
+    output: str = Query("csv", description="csv | gzip | zip"),
+    split: str = Query("day", description="Файлы zip: day | client"),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Экспорт данных в CSV формат
-    
+
     CSV поля:
     - uuid
     - ts (dd.MM.yyyy HH:mm:ss)
@@ -46,78 +339,19 @@ async def export_csv(
     - source
     """
     try:
-        # Парсинг даты
-        start_date, end_date = parse_date(date)
-        
-        # Базовый запрос
-        stmt = select(Event).where(
-            and_(
-                Event.ts >= start_date,
-                Event.ts <= end_date
-            )
-        ).order_by(Event.ts.asc())
-        
-        # Фильтры
-        if operator:
-            stmt = stmt.where(Event.operator == operator)
-        if client:
-            stmt = stmt.where(Event.client == client)
-        if type_filter:
-            stmt = stmt.where(Event.type == type_filter)
-        
-        # Выполнить запрос
-        result = await db.execute(stmt)
-        events = result.scalars().all()
-        
-        # Создание CSV в памяти
-        output = StringIO()
-        # BOM для корректного отображения UTF-8 в Excel
-        output.write('\ufeff')
-        
-        writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-        
-        # Header
-        writer.writerow([
-            'uuid', 'ts', 'type', 'operator', 'client',
-            'city', 'box', 'code', 'details', 'received_at', 'source'
-        ])
-        
-        # Rows
-        for event in events:
-            writer.writerow([
-                str(event.uuid),
-                format_datetime(event.ts),
-                event.type,
-                event.operator or '',
-                event.client or '',
-                event.city or '',
-                event.box or '',
-                # Защита от научной записи в Excel: ="код"
-                f'="{event.code}"' if event.code else '',
-                event.details or '',
-                format_datetime(event.received_at),
-                event.source
-            ])
-        
-        # Получить CSV строку
-        csv_content = output.getvalue()
-        output.close()
-        
-        # Формирование имени файла
-        date_part = date or datetime.now(timezone.utc).date().isoformat()
-        filename = f"scanner_logs_{date_part}.csv"
-        
-        logger.info(f"✅ CSV export: {len(events)} events, date={date_part}")
-        
-        # Возврат CSV файла
-        return Response(
-            content=csv_content,
-            media_type="text/csv; charset=utf-8",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
+        check_output(output, split)
+        days, date_part = export_range(date, date_end)
+        by_client = output == "zip" and split == "client"
+        chunks = export_chunks(
+            db, days, events_stmt(operator, client, type_filter, by_client), f"CSV export {date_part} output={output}",
+            events_snapshot(operator, client, type_filter, by_client)
         )
-    
+        return streaming_response(
+            *csv_body(chunks, CSV_HEADER, event_csv_row, "scanner_logs", date_part, output, split)
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in export_csv: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -126,70 +360,311 @@ async def export_csv(
 @router.get("/boxes-csv")
 async def export_boxes_csv(
     date: Optional[str] = Query(None),
+    date_end: Optional[str] = Query(None, description="Конец диапазона YYYY-MM-DD (включительно)"),
     client: Optional[str] = Query(None),
-    db: AsyncSession = Depends(get_db),
+    output: str = Query("csv", description="csv | gzip | zip"),
+    split: str = Query("day", description="Файлы zip: day | client"),
+    db: AsyncSession = Depends(get_read_db),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Экспорт по коробам (плоская таблица):
     Клиент | Город | Короб | ШК | Время скана | Оператор
+
+    ITEM события с одинаковым uuid (повторная отправка с другим ts)
+    выгружаются один раз - дедупликация в SQL (queries.box_export_statement),
+    в пределах дня.
     """
     try:
-        start_date, end_date = parse_date(date)
-        
-        stmt = select(Event).where(
-            and_(
-                Event.ts >= start_date,
-                Event.ts <= end_date,
-                Event.type == 'ITEM'
-            )
-        ).order_by(Event.client, Event.city, Event.box, Event.ts)
-        
-        if client:
-            stmt = stmt.where(Event.client == client)
-        
-        result = await db.execute(stmt)
-        events = result.scalars().all()
-        
-        # Создание CSV
-        output = StringIO()
-        output.write('\ufeff')  # BOM
-        
-        writer = csv.writer(output, delimiter=';')
-        writer.writerow(['Клиент', 'Город', 'Короб', 'ШК', 'Время скана', 'Оператор'])
-        
-        # Дедупликация по UUID
-        seen_uuids = set()
-        for event in events:
-            uuid_str = str(event.uuid)
-            if uuid_str in seen_uuids:
-                continue
-            seen_uuids.add(uuid_str)
-            
-            writer.writerow([
-                event.client or '—',
-                event.city or '—',
-                extract_box_number(event.box or ''),
-                f'="{event.code}"' if event.code else '',
-                format_datetime(event.ts),
-                event.operator or ''
-            ])
-        
-        csv_content = output.getvalue()
-        output.close()
-        
-        date_part = date or datetime.now(timezone.utc).date().isoformat()
-        filename = f"boxes_{date_part}.csv"
-        
-        logger.info(f"✅ Boxes CSV export: {len(seen_uuids)} items")
-        
-        return Response(
-            content=csv_content,
-            media_type="text/csv; charset=utf-8",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        check_output(output, split)
+        days, date_part = export_range(date, date_end)
+        chunks = export_chunks(
+            db, days, boxes_stmt(client), f"Boxes CSV export {date_part} output={output}", boxes_snapshot(client)
+        )
+        return streaming_response(
+            *csv_body(chunks, BOXES_CSV_HEADER, box_csv_row, "boxes", date_part, output, split)
         )
-    
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in export_boxes_csv: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/xlsx")
+async def export_xlsx(
+    date: Optional[str] = Query(None, description="Дата в формате YYYY-MM-DD"),
+    date_end: Optional[str] = Query(None, description="Конец диапазона YYYY-MM-DD (включительно)"),
+    operator: Optional[str] = Query(None),
+    client: Optional[str] = Query(None),
+    type_filter: Optional[str] = Query(None, alias="type"),
+    db: AsyncSession = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Экспорт в Excel: те же колонки, что /csv
+
+    ts и received_at - даты Excel (UTC), code - текстовая ячейка (без
+    научной записи и без ="код").
+    """
+    try:
+        days, date_part = export_range(date, date_end)
+        chunks = export_chunks(
+            db, days, events_stmt(operator, client, type_filter), f"XLSX export {date_part}",
+            events_snapshot(operator, client, type_filter)
+        )
+        return await xlsx_response(chunks, False, date_part)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in export_xlsx: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/boxes-xlsx")
+async def export_boxes_xlsx(
+    date: Optional[str] = Query(None),
+    date_end: Optional[str] = Query(None, description="Конец диапазона YYYY-MM-DD (включительно)"),
+    client: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Экспорт по коробам в Excel:
+    Клиент | Город | Короб | ШК | Время скана | Оператор
+
+    Короб и ШК - текстовые ячейки, время скана - дата Excel (UTC).
+    """
+    try:
+        days, date_part = export_range(date, date_end)
+        chunks = export_chunks(db, days, boxes_stmt(client), f"Boxes XLSX export {date_part}", boxes_snapshot(client))
+        return await xlsx_response(chunks, True, date_part)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in export_boxes_xlsx: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def columnar_response(
+    db: AsyncSession, date: Optional[str], date_end: Optional[str],
+    operator: Optional[str], client: Optional[str], type_filter: Optional[str], output: str
+) -> StreamingResponse:
+    """Потоковый Parquet / Arrow IPC за день или диапазон (колонки /csv)"""
+    check_columnar(output)
+    days, date_part = export_range(date, date_end)
+    chunks = export_chunks(
+        db, days, events_stmt(operator, client, type_filter), f"{output} export {date_part}",
+        events_snapshot(operator, client, type_filter)
+    )
+    return streaming_response(*columnar_body(chunks, output, date_part))
+
+
+@router.get("/parquet")
+async def export_parquet(
+    date: Optional[str] = Query(None, description="Дата в формате YYYY-MM-DD"),
+    date_end: Optional[str] = Query(None, description="Конец диапазона YYYY-MM-DD (включительно)"),
+    operator: Optional[str] = Query(None),
+    client: Optional[str] = Query(None),
+    type_filter: Optional[str] = Query(None, alias="type"),
+    db: AsyncSession = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Экспорт в Parquet (колонки /csv, типизированные)
+
+    ts, received_at - timestamp UTC; type, operator, client, city, box,
+    source - словарные колонки. pandas: pd.read_parquet(path).
+    """
+    try:
+        return columnar_response(db, date, date_end, operator, client, type_filter, "parquet")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in export_parquet: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/arrow")
+async def export_arrow(
+    date: Optional[str] = Query(None, description="Дата в формате YYYY-MM-DD"),
+    date_end: Optional[str] = Query(None, description="Конец диапазона YYYY-MM-DD (включительно)"),
+    operator: Optional[str] = Query(None),
+    client: Optional[str] = Query(None),
+    type_filter: Optional[str] = Query(None, alias="type"),
+    db: AsyncSession = Depends(get_read_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Экспорт в Arrow IPC (stream формат), схема как у /parquet
+
+    pandas: pyarrow.ipc.open_stream(path).read_pandas().
+    """
+    try:
+        return columnar_response(db, date, date_end, operator, client, type_filter, "arrow")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in export_arrow: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def job_params(request: ExportJobRequest) -> Tuple[dict, list]:
+    """
+    Проверенные параметры задачи и дни диапазона
+
+    Параметры нормализованы (даты - ISO, неиспользуемые фильтры не
+    попадают), чтобы одинаковые выгрузки давали один ключ кэша.
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Invalid kind. Use one of: {', '.join(JOB_KINDS)}")
+    days, _ = export_range(request.date, request.date_end)
+
+    params = {
+        "kind": request.kind,
+        "date": days[0][0].date().isoformat(),
+        "date_end": days[-1][0].date().isoformat(),
+        "client": request.client or None,
+    }
+    if not request.kind.startswith("boxes"):
+        params["operator"] = request.operator or None
+        params["type"] = request.type or None
+    if request.kind in ("csv", "boxes-csv"):
+        check_output(request.output, request.split)
+        params["output"] = request.output
+        params["split"] = request.split if request.output == "zip" else "day"
+    if request.kind in ("parquet", "arrow"):
+        check_columnar(request.kind)
+    return params, [start.date() for start, _ in days]
+
+
+async def tracked(chunks: AsyncIterator[tuple], progress: Callable) -> AsyncIterator[tuple]:
+    """(день, строки) с отметкой прогресса фоновой задачи"""
+    async for day, rows in chunks:
+        progress(day, len(rows))
+        yield day, rows
+
+
+async def build_job_file(db: AsyncSession, params: dict, path: str, progress: Callable) -> Tuple[str, str]:
+    """Файл фонового экспорта в path: (имя файла, media type); те же выгрузки, что GET эндпоинты"""
+    kind = params["kind"]
+    boxes = kind.startswith("boxes")
+    days, date_part = export_range(params["date"], params["date_end"])
+    if boxes:
+        make_stmt, snapshot = boxes_stmt(params["client"]), boxes_snapshot(params["client"])
+    else:
+        by_client = params.get("output") == "zip" and params.get("split") == "client"
+        filters = (params["operator"], params["client"], params["type"], by_client)
+        make_stmt, snapshot = events_stmt(*filters), events_snapshot(*filters)
+    chunks = tracked(export_chunks(db, days, make_stmt, f"Export job {kind} {date_part}", snapshot), progress)
+
+    if kind in ("xlsx", "boxes-xlsx"):
+        return await xlsx_file(chunks, path, boxes, date_part)
+    if kind in ("parquet", "arrow"):
+        body, filename, media_type = columnar_body(chunks, kind, date_part)
+    elif boxes:
+        body, filename, media_type = csv_body(
+            chunks, BOXES_CSV_HEADER, box_csv_row, "boxes", date_part, params["output"], params["split"]
+        )
+    else:
+        body, filename, media_type = csv_body(
+            chunks, CSV_HEADER, event_csv_row, "scanner_logs", date_part, params["output"], params["split"]
+        )
+    await write_stream(body, path)
+    return filename, media_type
+
+
+def job_response(job) -> ExportJobResponse:
+    return ExportJobResponse(
+        id=str(job.id),
+        kind=job.kind,
+        status=job.status,
+        cached=job.cached,
+        daysTotal=job.days_total,
+        daysDone=job.days_done,
+        rowsDone=job.rows_done,
+        bytes=job.bytes,
+        filename=job.filename,
+        error=job.error,
+        createdAt=job.created_at.isoformat() if job.created_at else None,
+        finishedAt=job.finished_at.isoformat() if job.finished_at else None,
+        downloadUrl=f"/api/v1/export/jobs/{job.id}/download" if job.status == "done" else None,
+    )
+
+
+@router.post("/jobs", response_model=ExportJobResponse, status_code=202)
+async def submit_export_job(
+    request: ExportJobRequest,
+    db: AsyncSession = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Фоновый экспорт: параметры как у GET /csv, /boxes-csv, /xlsx,
+    /boxes-xlsx, /parquet, /arrow (kind), без ограничения по времени запроса
+
+    Если такой файл уже собран для текущей версии данных - задача сразу
+    done (cached=true); такая же задача в очереди - возвращается она.
+    """
+    try:
+        if not settings.EXPORT_JOBS_ENABLED:
+            raise HTTPException(status_code=503, detail="Export jobs are disabled")
+        params, days = job_params(request)
+        job = await export_jobs.submit(db, request.kind, params, days)
+        return job_response(job)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in submit_export_job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """Статус и прогресс фонового экспорта (обновляется раз в EXPORT_JOB_HEARTBEAT_SECONDS)"""
+    try:
+        job = await export_jobs.get(db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Export job not found")
+        return job_response(job)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in get_export_job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """Готовый файл задачи; 409 - еще не готов, 410 - файл уже вычищен (отправьте задачу заново)"""
+    try:
+        job = await export_jobs.get(db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Export job not found")
+        if job.status != "done":
+            raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+
+        path = export_jobs.path(job.artifact)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=410, detail="Export file expired, submit the job again")
+        return FileResponse(path, media_type=job.media_type, filename=job.filename)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error in download_export_job: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
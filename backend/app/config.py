@@ -14,8 +14,17 @@ class Settings(BaseSettings):
     DATABASE_POOL_SIZE: int = 20
     DATABASE_MAX_OVERFLOW: int = 10
     
+    # Read реплика для GET dashboard/export (app.services.read_routing); пусто - все на primary
+    DATABASE_READ_URL: str = ""
+    DATABASE_READ_POOL_SIZE: int = 20
+    DATABASE_READ_MAX_OVERFLOW: int = 10
+    READ_REPLICA_MAX_LAG_SECONDS: float = 5.0  # отставание больше - читаем с primary
+    READ_REPLICA_CHECK_SECONDS: float = 1.0  # как часто воркер замеряет отставание
+    READ_YOUR_WRITES_SECONDS: int = 60  # сколько действует токен X-Read-After после /remove
+    
     # API Security
     API_KEY: str = "your_secret_api_key"
+    STREAM_TOKEN_TTL_SECONDS: int = 60  # токен EventSource (/dashboard/stream) вместо ключа в URL
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:8080,https://your-pwa-domain.com"
     
     @property
@@ -46,10 +55,91 @@ class Settings(BaseSettings):
     
     # Batch Settings
     MAX_BATCH_SIZE: int = 100
+
+    # Group commit для /batch (объединение параллельных запросов в одну транзакцию)
+    INGEST_GROUP_COMMIT_ENABLED: bool = True
+    INGEST_FLUSH_WINDOW_MS: int = 5  # окно сбора группы
+    INGEST_MAX_GROUP_SIZE: int = 2000  # макс. событий в одном INSERT/COMMIT
+    INGEST_DURABILITY: str = "on"  # synchronous_commit: on | remote_write | local | off
+    
+    # Потоковый NDJSON прием (/stream)
+    INGEST_STREAM_CHUNK_SIZE: int = 500  # событий на один INSERT/ACK
+    INGEST_STREAM_MAX_LINE_BYTES: int = 65536
+    
+    # Сжатые тела запросов (Content-Encoding: gzip) - защита от zip-бомб
+    INGEST_MAX_DECOMPRESSED_BYTES: int = 10 * 1024 * 1024
+    
+    # Bloom фильтр UUID для /verify
+    UUID_FILTER_ENABLED: bool = True
+    UUID_FILTER_BACKEND: str = "memory"  # memory | redis (общий для всех воркеров)
+    UUID_FILTER_MEMORY_BYTES: int = 16 * 1024 * 1024  # бюджет памяти (~14M UUID при 1% FP)
+    UUID_FILTER_FP_RATE: float = 0.01
+    UUID_FILTER_SYNC_SECONDS: float = 2.0  # memory: как часто подтягивать вставки других воркеров
+    
+    # Удаление (/bulk-remove)
+    BULK_REMOVE_MODE: str = "tombstone"  # tombstone (deleted_at + фоновый purge) | delete
+    TOMBSTONE_PURGE_ENABLED: bool = True
+    TOMBSTONE_PURGE_WINDOW: str = "01:00-05:00"  # off-peak окно (TIMEZONE)
+    TOMBSTONE_RETENTION_HOURS: int = 24  # сколько хранить tombstone до физического удаления
+    TOMBSTONE_PURGE_CHUNK_SIZE: int = 1000
+    TOMBSTONE_PURGE_PAUSE_MS: int = 200  # пауза между чанками
+    TOMBSTONE_PURGE_INTERVAL_SECONDS: int = 600
+    
+    # Секционирование events по месяцам (app.services.partitions)
+    EVENTS_PARTITION_ENABLED: bool = True  # false - секциями управляют снаружи (pg_partman, cron)
+    EVENTS_PARTITION_PREMAKE_MONTHS: int = 3  # секции на N месяцев вперед
+    EVENTS_PARTITION_CHECK_SECONDS: int = 3600
+    EVENTS_PARTITION_LOCK_TIMEOUT_MS: int = 5000  # ATTACH/DETACH не ждут блокировку дольше
+    EVENTS_RETENTION_MONTHS: int = 0  # 0 - хранить все; иначе секции старше N месяцев
+    EVENTS_RETENTION_ACTION: str = "detach"  # detach (таблица остается для архива) | drop
+    
+    # Live состояние "сегодня" в памяти воркера (LISTEN/NOTIFY между воркерами)
+    LIVE_STATE_ENABLED: bool = True
+    LIVE_STATE_CHANNEL: str = "scanner_live"
+    LIVE_STATE_FEED_SIZE: int = 1000  # кольцевой буфер последних событий
+    LIVE_STREAM_QUEUE_SIZE: int = 200  # сообщений в очереди SSE клиента до сброса
+    LIVE_STREAM_HEARTBEAT_SECONDS: int = 15
+    LIVE_STREAM_STATUS_SECONDS: int = 10  # проверка смены онлайн-статуса операторов
+
+    # Экспорт (потоковый CSV)
+    EXPORT_CHUNK_ROWS: int = 5000  # строк на один fetch server-side курсора и один кусок ответа
+    EXPORT_MAX_DAYS: int = 93  # макс. дней в диапазоне date..date_end
+    EXPORT_PARALLEL_DAYS: int = 4  # дней диапазона, читаемых одновременно (соединений на запрос)
+    EXPORT_COMPRESS_LEVEL: int = 6  # zlib уровень для output=gzip|zip
+    EXPORT_TEMP_DIR: str = ""  # каталог временных XLSX (пусто - системный tmp)
+    EXPORT_COLUMNAR_COMPRESSION: str = "zstd"  # Parquet / Arrow IPC (zstd, lz4, snappy для Parquet)
+    EXPORT_PARQUET_ROW_GROUP_ROWS: int = 100000
+    
+    # Фоновые экспорты (POST /export/jobs): файлы на диске, кэш по версии данных
+    EXPORT_JOBS_ENABLED: bool = True
+    EXPORT_JOBS_DIR: str = "/tmp/scanner_exports"  # готовые файлы (общий каталог воркеров)
+    EXPORT_JOB_WORKERS: int = 1  # одновременных задач на uvicorn воркер
+    EXPORT_JOB_POLL_SECONDS: float = 2.0  # опрос очереди (задачи других воркеров)
+    EXPORT_JOB_HEARTBEAT_SECONDS: float = 2.0  # heartbeat и прогресс задачи
+    EXPORT_JOB_STALE_SECONDS: int = 60  # без heartbeat дольше - задача перезапускается
+    EXPORT_JOB_MAX_ATTEMPTS: int = 2
+    EXPORT_JOB_OPEN_DAY_MAX_AGE_SECONDS: int = 60  # диапазон с сегодняшним днем: макс. возраст готового файла
+    EXPORT_JOBS_MAX_BYTES: int = 5 * 1024 ** 3  # размер каталога, сверх - удаляются самые старые файлы
+    EXPORT_JOBS_MAX_AGE_SECONDS: int = 2 * 24 * 3600  # меньше TTL версий данных (7 дней)
+    EXPORT_JOBS_EVICT_SECONDS: int = 300
+    
+    # Снимки закрытых дней для экспорта (app.services.day_snapshots)
+    DAY_SNAPSHOTS_ENABLED: bool = True
+    DAY_SNAPSHOT_DAYS: int = 93  # снимки строятся для стольких последних закрытых дней
+    DAY_SNAPSHOT_SETTLE_HOURS: int = 6  # день снимается не раньше, чем через N часов после конца (офлайн досылка)
+    DAY_SNAPSHOT_BUILD_SECONDS: int = 900  # интервал фоновой сборки (новые и инвалидированные дни)
+    DAY_SNAPSHOT_BUILDS_PER_RUN: int = 20  # снимков за один проход (первое заполнение - постепенно)
     
     # Dashboard
     ONLINE_THRESHOLD_SECONDS: int = 300  # 5 минут
     DASHBOARD_CACHE_TTL: int = 10  # секунды
+    DASHBOARD_CACHE_ENABLED: bool = True  # Redis кэш ответов /state, /boxes, /raw
+    DASHBOARD_CACHE_SWR_SECONDS: int = 60  # отдавать устаревший ответ, пересчитывая в фоне
+    DASHBOARD_CACHE_STALE_IF_ERROR_SECONDS: int = 600  # отдавать устаревший ответ при ошибке БД
+    DASHBOARD_SINGLE_FLIGHT_ENABLED: bool = True  # одно вычисление на одинаковые одновременные запросы
+    DASHBOARD_SINGLE_FLIGHT_MODE: str = "local"  # local (в воркере) | redis (между воркерами, нужен Redis)
+    DASHBOARD_SINGLE_FLIGHT_WAIT_SECONDS: float = 15.0  # redis: сколько ждать результат другого воркера
+    DASHBOARD_DELTA_OVERLAP_SECONDS: int = 5  # запас since при delta-sync /state (разница между воркерами)
     
     class Config:
         env_file = ".env"
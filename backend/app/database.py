@@ -26,6 +26,24 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+# Read реплика (опционально): GET dashboard/export через
+# app.services.read_routing.get_read_db, с учетом отставания
+read_engine = create_async_engine(
+    settings.DATABASE_READ_URL,
+    echo=settings.DEBUG,
+    pool_size=settings.DATABASE_READ_POOL_SIZE,
+    max_overflow=settings.DATABASE_READ_MAX_OVERFLOW,
+    pool_pre_ping=True,
+) if settings.DATABASE_READ_URL else None
+
+ReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False
+) if read_engine is not None else None
+
 # Base класс для моделей
 Base = declarative_base()
 
@@ -7,12 +7,23 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from prometheus_client import make_asgi_app
+import asyncio
 import time
 import logging
 
 from app.config import settings
-from app.database import engine, create_tables
+from app.database import engine, read_engine, create_tables
 from app.api import events, dashboard, export_router
+from app.services.ingest_queue import ingest_queue
+from app.services.uuid_filter import uuid_filter
+from app.services.tombstones import purge_loop
+from app.services.partitions import ensure_partitions, partition_loop
+from app.services.live_state import live_state
+from app.services.live_stream import live_hub
+from app.services.read_routing import TOKEN_HEADER, read_router
+from app.services.export_jobs import export_jobs
+from app.services.day_snapshots import snapshot_loop
+from app.redis_client import close_redis
 
 # Настройка логирования
 logging.basicConfig(
@@ -28,16 +39,64 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Scanner Logger API...")
     logger.info(f"📊 Database: {settings.DATABASE_URL.split('@')[1]}")
+    if settings.DATABASE_READ_URL:
+        logger.info(f"📖 Read replica: {settings.DATABASE_READ_URL.split('@')[1]}")
     logger.info(f"🌍 CORS Origins: {settings.cors_origins_list}")
     
     # Создать таблицы если их нет
     await create_tables()
     
+    # Месячные секции events (текущий месяц и вперед) до первой вставки
+    if settings.EVENTS_PARTITION_ENABLED:
+        await ensure_partitions()
+    
+    # Group commit очередь для /batch
+    if settings.INGEST_GROUP_COMMIT_ENABLED:
+        await ingest_queue.start()
+    
+    # Bloom фильтр UUID для /verify (rebuild из БД в фоне)
+    await uuid_filter.start()
+    
+    # Live состояние "сегодня" для /dashboard/state (LISTEN + гидратация в фоне)
+    await live_state.start()
+    await live_hub.start()
+    
+    # Замеры отставания read реплики (GET dashboard/export)
+    await read_router.start()
+    
+    # Фоновые экспорты (/export/jobs): воркеры и чистка готовых файлов
+    if settings.EXPORT_JOBS_ENABLED:
+        await export_jobs.start(export_router.build_job_file)
+    
+    # Фоновый purge tombstone-ов (/bulk-remove) в off-peak окне
+    purge_task = asyncio.create_task(purge_loop()) if settings.TOMBSTONE_PURGE_ENABLED else None
+    
+    # Секции events вперед и retention
+    partition_task = asyncio.create_task(partition_loop()) if settings.EVENTS_PARTITION_ENABLED else None
+    
+    # Снимки прошедших дней для экспорта
+    snapshot_task = asyncio.create_task(snapshot_loop()) if settings.DAY_SNAPSHOTS_ENABLED else None
+    
     yield
     
     # Shutdown
     logger.info("👋 Shutting down Scanner Logger API...")
+    if purge_task:
+        purge_task.cancel()
+    if partition_task:
+        partition_task.cancel()
+    if snapshot_task:
+        snapshot_task.cancel()
+    await export_jobs.stop()
+    await ingest_queue.stop()
+    await live_hub.stop()
+    await live_state.stop()
+    await uuid_filter.stop()
+    await read_router.stop()
+    await close_redis()
     await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
 
 
 # Инициализация приложения
@@ -57,6 +116,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Токен read-your-writes из /remove должен быть виден JS клиенту
+    expose_headers=[TOKEN_HEADER],
 )
 
 
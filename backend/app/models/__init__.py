@@ -1,4 +1,7 @@
-from app.models.event import Event
-
-__all__ = ["Event"]
+from app.models.event import Event, EventUUID
+from app.models.stats import EventDailyStats, BoxDailyStats
+from app.models.export_job import ExportJob
+from app.models.day_snapshot import DaySnapshotEpoch, DaySnapshot, DaySnapshotPart
 
+__all__ = ["Event", "EventUUID", "EventDailyStats", "BoxDailyStats", "ExportJob",
+           "DaySnapshotEpoch", "DaySnapshot", "DaySnapshotPart"]
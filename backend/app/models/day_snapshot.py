@@ -0,0 +1,69 @@
+"""
+SQLAlchemy модели снимков закрытых дней (day_snapshots)
+"""
+from sqlalchemy import (
+    Column, String, Date, DateTime, Integer, BigInteger, LargeBinary, ForeignKeyConstraint, func
+)
+
+from app.database import Base
+
+
+class DaySnapshotEpoch(Base):
+    """
+    Эпоха дня: +1 в транзакции каждого изменения событий прошлого дня
+
+    Снимок действителен, пока его epoch совпадает с эпохой дня (строки
+    нет - эпоха 0). Поддерживается app.services.day_snapshots.invalidate
+    (ingest путь, /bulk-remove).
+    """
+
+    __tablename__ = "day_snapshot_epochs"
+
+    day = Column(Date, primary_key=True, comment="Дата события (UTC)")
+    epoch = Column(BigInteger, nullable=False, default=0)
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<DaySnapshotEpoch(day={self.day}, epoch={self.epoch})>"
+
+
+class DaySnapshot(Base):
+    """
+    Снимок выгрузки закрытого дня: строки queries.export_statement (kind=events)
+    или queries.box_export_statement (kind=boxes) без фильтров
+
+    Сами строки - в day_snapshot_parts (сжатые части по EXPORT_CHUNK_ROWS).
+    """
+
+    __tablename__ = "day_snapshots"
+
+    day = Column(Date, primary_key=True, comment="Дата события (UTC)")
+    kind = Column(String(20), primary_key=True, comment="events, boxes")
+    epoch = Column(BigInteger, nullable=False, comment="Эпоха дня, на которой снят снимок")
+    rows = Column(Integer, nullable=False, default=0)
+    parts = Column(Integer, nullable=False, default=0)
+    bytes = Column(BigInteger, nullable=False, default=0, comment="Размер сжатых частей")
+    built_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    def __repr__(self):
+        return f"<DaySnapshot(day={self.day}, kind={self.kind}, epoch={self.epoch}, rows={self.rows})>"
+
+
+class DaySnapshotPart(Base):
+    """Часть снимка: msgpack строк, сжатый zlib"""
+
+    __tablename__ = "day_snapshot_parts"
+
+    day = Column(Date, primary_key=True)
+    kind = Column(String(20), primary_key=True)
+    part = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ['day', 'kind'], ['day_snapshots.day', 'day_snapshots.kind'], ondelete='CASCADE'
+        ),
+    )
+
+    def __repr__(self):
+        return f"<DaySnapshotPart(day={self.day}, kind={self.kind}, part={self.part})>"
@@ -1,21 +1,37 @@
 """
-SQLAlchemy модель для таблицы events
+SQLAlchemy модели для таблиц events и event_uuids
 """
-from sqlalchemy import Column, String, Text, DateTime, Index
+from sqlalchemy import Column, String, Text, DateTime, Index, case, func, literal_column
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql.elements import Grouping
 from datetime import datetime, timezone
 import uuid
 
 from app.database import Base
 
 
+def box_no_sql(box):
+    """
+    Номер короба в SQL (как dashboard.extract_box_number): часть после '/', '—' для пустого
+
+    Константы - литералы, а не bind параметры: выражение должно совпадать
+    с индексом idx_events_box_items и с GROUP BY.
+    """
+    empty, slash = literal_column("''"), literal_column("'/'")
+    return case(
+        (func.coalesce(box, empty) == empty, literal_column("'—'")),
+        (func.strpos(box, slash) > literal_column("0"), func.split_part(box, slash, literal_column("2"))),
+        else_=box,
+    )
+
+
 class Event(Base):
     """
     Модель события сканирования
     
     Соответствует структуре из Google Sheets:
-    - uuid: уникальный идентификатор (первичный ключ)
-    - ts: время события (timestamp)
+    - uuid: уникальный идентификатор (первичный ключ вместе с ts)
+    - ts: время события (timestamp), ключ секционирования
     - type: тип события (ITEM, BOX, CLOSE, CITY, ERROR и т.д.)
     - operator: имя сотрудника
     - client: клиент
@@ -25,6 +41,15 @@ class Event(Base):
     - details: дополнительная информация
     - received_at: время получения сервером
     - source: источник (pwa, dashboard)
+    - deleted_at: время soft delete (tombstone), NULL для живых событий
+
+    Таблица секционирована по месяцам ts (app.services.partitions), поэтому
+    первичный ключ - (uuid, ts): уникальность в секционированной таблице
+    обязана включать ключ секционирования. Уникальность самого uuid держит
+    несекционированная event_uuids (EventUUID): ingest (app.services.ingest)
+    вставляет в events только строки, чей uuid удалось в ней занять, - тот же
+    uuid с другим ts (повторный ввод, исправленные часы клиента) пропускается
+    как дубликат.
     """
     
     __tablename__ = "events"
@@ -39,29 +64,26 @@ class Event(Base):
     
     ts = Column(
         DateTime(timezone=True),
+        primary_key=True,
         nullable=False,
-        index=True,
         comment="Время события (от клиента)"
     )
     
     type = Column(
         String(50),
         nullable=False,
-        index=True,
         comment="Тип события: ITEM, BOX, CLOSE, CITY, ERROR и т.д."
     )
     
     operator = Column(
         String(100),
         nullable=False,
-        index=True,
         comment="Имя сотрудника"
     )
     
     client = Column(
         String(100),
         nullable=True,
-        index=True,
         comment="Клиент"
     )
     
@@ -74,7 +96,6 @@ class Event(Base):
     box = Column(
         String(100),
         nullable=True,
-        index=True,
         comment="Короб (формат: client/number)"
     )
     
@@ -94,7 +115,6 @@ class Event(Base):
         DateTime(timezone=True),
         nullable=False,
         default=lambda: datetime.now(timezone.utc),
-        index=True,
         comment="Время получения сервером"
     )
     
@@ -112,18 +132,41 @@ class Event(Base):
         comment="Время создания записи в БД"
     )
     
-    # Индексы (определены через Index для более гибкой настройки)
+    deleted_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="Время soft delete (tombstone); строки удаляются фоновым purge"
+    )
+    
+    # Индексы по формам запросов (app.services.queries), миграция 0006.
+    # Все запросы dashboard/экспорта содержат deleted_at IS NULL (event_filters),
+    # поэтому составные индексы частичные. На секционированной events каждый
+    # индекс - набор индексов секций.
     __table_args__ = (
-        # Составной индекс для dashboard запросов
+        # Диапазоны ts (экспорт, пересчет агрегатов): ts растет вместе с
+        # порядком вставки, BRIN в тысячи раз меньше btree
+        Index('idx_events_ts_brin', 'ts', postgresql_using='brin', postgresql_with={'pages_per_range': 32}),
+        # Лента /state и keyset /raw: ORDER BY received_at DESC, uuid DESC LIMIT
+        Index('idx_events_feed', 'received_at', 'uuid', postgresql_where=deleted_at.is_(None)),
+        # Фильтры operator / client (+city) / type за период
+        Index('idx_events_operator_ts', 'operator', 'ts', postgresql_where=deleted_at.is_(None)),
+        Index('idx_events_client_city_ts', 'client', 'city', 'ts', postgresql_where=deleted_at.is_(None)),
+        Index('idx_events_type_ts', 'type', 'ts', postgresql_where=deleted_at.is_(None)),
+        # Товары короба (/boxes/items): client, city, номер короба, ORDER BY ts
+        # (CASE в списке колонок индекса Postgres принимает только в скобках)
         Index(
-            'idx_dashboard',
-            'operator', 'client', 'ts',
-            postgresql_where=(ts > datetime.now(timezone.utc)),  # Partial index для последних 24ч
+            'idx_events_box_items',
+            'client', 'city', Grouping(box_no_sql(box)), 'ts',
+            postgresql_where=(type == 'ITEM') & deleted_at.is_(None),
         ),
-        # Индекс по дате для быстрых выборок за день
-        Index('idx_events_date', 'ts', 'operator'),
-        # Индекс для сортировки по received_at
-        Index('idx_received_at_desc', received_at.desc()),
+        # Tombstone-ы для фонового purge (partial: живые строки не индексируются)
+        Index(
+            'idx_events_deleted_at',
+            'deleted_at',
+            postgresql_where=(deleted_at.isnot(None)),
+        ),
+        # Месячные секции events_pYYYYMM создает app.services.partitions
+        {"postgresql_partition_by": "RANGE (ts)"},
     )
     
     def __repr__(self):
@@ -146,6 +189,27 @@ class Event(Base):
             "details": self.details,
             "received_at": self.received_at.isoformat() if self.received_at else None,
             "source": self.source,
-            "created_at": self.created_at.isoformat() if self.created_at else None
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "deleted_at": self.deleted_at.isoformat() if self.deleted_at else None
         }
 
+
+
+class EventUUID(Base):
+    """
+    Занятые uuid событий: глобальная уникальность uuid для секционированной events
+
+    Строка вставляется в той же транзакции, что и событие, и удаляется
+    вместе с ним (purge tombstone-ов, BULK_REMOVE_MODE="delete", retention
+    секций - по диапазону ts). ts - ts события.
+    """
+
+    __tablename__ = "event_uuids"
+
+    uuid = Column(UUID(as_uuid=True), primary_key=True, comment="uuid события")
+    ts = Column(DateTime(timezone=True), nullable=False, comment="ts события (для retention)")
+
+    __table_args__ = (
+        # Retention удаляет диапазон ts месяца; ts растет с порядком вставки
+        Index('idx_event_uuids_ts_brin', 'ts', postgresql_using='brin'),
+    )
@@ -0,0 +1,54 @@
+"""
+SQLAlchemy модель для таблицы export_jobs (фоновые экспорты)
+"""
+from sqlalchemy import Column, String, Text, DateTime, Integer, BigInteger, Boolean, Index, func
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+import uuid
+
+from app.database import Base
+
+
+class ExportJob(Base):
+    """
+    Фоновый экспорт (app.services.export_jobs)
+
+    Статусы: queued → running → done | failed. Задачи забирают воркеры
+    любого uvicorn процесса (FOR UPDATE SKIP LOCKED), прогресс и
+    heartbeat пишутся в строку задачи. Результат - файл artifact в
+    EXPORT_JOBS_DIR; cache_key = hash(параметры, версии данных дней), по
+    нему готовый файл переиспользуется повторными задачами.
+    """
+
+    __tablename__ = "export_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String(20), nullable=False, comment="csv, boxes-csv, xlsx, boxes-xlsx, parquet, arrow")
+    params = Column(JSONB, nullable=False, comment="Нормализованные фильтры и формат")
+    cache_key = Column(String(64), nullable=False, comment="sha1(params, версии данных)")
+    status = Column(String(20), nullable=False, default="queued")
+    cached = Column(Boolean, nullable=False, default=False, comment="Готовый файл взят из кэша")
+    attempts = Column(Integer, nullable=False, default=0)
+
+    days_total = Column(Integer, nullable=False, default=0)
+    days_done = Column(Integer, nullable=False, default=0)
+    rows_done = Column(BigInteger, nullable=False, default=0)
+    bytes = Column(BigInteger, nullable=True, comment="Размер готового файла")
+
+    artifact = Column(String(200), nullable=True, comment="Имя файла в EXPORT_JOBS_DIR")
+    filename = Column(String(200), nullable=True, comment="Имя файла для скачивания")
+    media_type = Column(String(100), nullable=True)
+    error = Column(Text, nullable=True)
+    worker = Column(String(100), nullable=True, comment="host:pid воркера")
+
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('idx_export_jobs_queue', 'created_at', postgresql_where=(status.in_(['queued', 'running']))),
+        Index('idx_export_jobs_cache_key', 'cache_key', 'finished_at'),
+    )
+
+    def __repr__(self):
+        return f"<ExportJob(id={self.id}, kind={self.kind}, status={self.status})>"
@@ -0,0 +1,86 @@
+"""
+SQLAlchemy модель для таблицы event_daily_stats (дневные агрегаты)
+"""
+from sqlalchemy import Column, String, Date, DateTime, Integer, Index
+
+from app.database import Base
+
+
+class EventDailyStats(Base):
+    """
+    Дневной агрегат событий по (день, оператор, клиент, город)
+
+    Из него без обращения к events считаются:
+    - статистика операторов (сумма по клиентам/городам, последний визит)
+    - статистика клиентов (сумма по операторам/городам)
+    - сводка и списки для фильтров
+
+    День - дата ts в UTC (как границы дня в parse_date_range).
+    NULL client/city хранятся как '' (часть первичного ключа).
+    Поддерживается ingest путем (app.services.rollups) в той же транзакции,
+    что и вставка событий.
+    """
+
+    __tablename__ = "event_daily_stats"
+
+    day = Column(Date, primary_key=True, comment="Дата события (UTC)")
+    operator = Column(String(100), primary_key=True, comment="Имя сотрудника")
+    client = Column(String(100), primary_key=True, default='', comment="Клиент ('' если не указан)")
+    city = Column(String(100), primary_key=True, default='', comment="Город ('' если не указан)")
+
+    items = Column(Integer, nullable=False, default=0, comment="ITEM события")
+    boxes_open = Column(Integer, nullable=False, default=0, comment="BOX события")
+    boxes_close = Column(Integer, nullable=False, default=0, comment="CLOSE события")
+    errors = Column(Integer, nullable=False, default=0, comment="ERROR события")
+    events = Column(Integer, nullable=False, default=0, comment="Все события")
+
+    last_received_at = Column(DateTime(timezone=True), nullable=False, comment="Последнее событие группы")
+    last_box = Column(String(100), nullable=True, comment="Короб последнего события группы")
+
+    __table_args__ = (
+        Index('idx_daily_stats_day_client', 'day', 'client', 'city'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<EventDailyStats(day={self.day}, operator={self.operator}, "
+            f"client={self.client}, city={self.city}, items={self.items})>"
+        )
+
+
+class BoxDailyStats(Base):
+    """
+    Дневная сводка короба по (день, клиент, город, номер короба, оператор)
+
+    Из нее без обращения к events строится /dashboard/boxes: число товаров,
+    первый/последний скан и операторы короба за любой период. Товары короба
+    читаются из events отдельным запросом при раскрытии.
+
+    Номер короба - как dashboard.extract_box_number ('—' без короба).
+    Оператор в ключе: фильтр /boxes по оператору остается точным, список
+    операторов короба - ключи его строк.
+    """
+
+    __tablename__ = "box_daily_stats"
+
+    day = Column(Date, primary_key=True, comment="Дата события (UTC)")
+    client = Column(String(100), primary_key=True, default='', comment="Клиент ('' если не указан)")
+    city = Column(String(100), primary_key=True, default='', comment="Город ('' если не указан)")
+    box_no = Column(String(100), primary_key=True, comment="Номер короба (после /)")
+    operator = Column(String(100), primary_key=True, comment="Имя сотрудника")
+
+    items = Column(Integer, nullable=False, default=0, comment="ITEM события")
+    closes = Column(Integer, nullable=False, default=0, comment="CLOSE события")
+    events = Column(Integer, nullable=False, default=0, comment="Все события")
+    first_ts = Column(DateTime(timezone=True), nullable=False, comment="Первое событие")
+    last_ts = Column(DateTime(timezone=True), nullable=False, comment="Последнее событие")
+
+    __table_args__ = (
+        Index('idx_box_stats_day_client', 'day', 'client', 'city'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<BoxDailyStats(day={self.day}, client={self.client}, city={self.city}, "
+            f"box_no={self.box_no}, operator={self.operator}, items={self.items})>"
+        )
@@ -0,0 +1,36 @@
+"""
+Подключение к Redis (опционально)
+
+Redis нужен только для режимов, разделяемых между uvicorn воркерами
+(фильтр UUID, кэш, pub/sub). Если пакет redis не установлен или REDIS_URL
+пустой, get_redis() возвращает None и вызывающий код работает локально.
+"""
+from typing import Optional
+import logging
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # опциональная зависимость
+    redis_asyncio = None
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_redis = None
+
+
+def get_redis() -> Optional["redis_asyncio.Redis"]:
+    """Ленивый singleton клиента Redis (или None, если Redis недоступен)"""
+    global _redis
+    if _redis is None and redis_asyncio is not None and settings.REDIS_URL:
+        _redis = redis_asyncio.from_url(settings.REDIS_URL)
+    return _redis
+
+
+async def close_redis():
+    """Закрыть соединения (shutdown)"""
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
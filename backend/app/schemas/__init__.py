@@ -1,5 +1,6 @@
 from app.schemas.event import *
 from app.schemas.dashboard import *
+from app.schemas.export import *
 
 __all__ = [
     # Event schemas
@@ -12,6 +13,9 @@ __all__ = [
     "OperatorStats", "ClientStats", "FeedEvent", "Summary",
     "DashboardStateResponse", "BoxDetails", "BoxItem",
     "CityBoxes", "ClientBoxes", "BoxesStateResponse",
-    "RawLogEvent", "RawLogsResponse"
+    "RawLogEvent", "RawLogsResponse",
+    
+    # Export schemas
+    "ExportJobRequest", "ExportJobResponse"
 ]
 
@@ -38,6 +38,7 @@ class FeedEvent(BaseModel):
     city: str
     box: str
     code: str
+    uuid: Optional[str] = Field(None, description="UUID события (для дедупликации live потока)")
 
 
 class Summary(BaseModel):
@@ -59,6 +60,27 @@ class DashboardStateResponse(BaseModel):
     operatorsList: List[str] = Field(..., description="Список всех операторов за день")
     clientsList: List[str] = Field(..., description="Список всех клиентов за день")
     citiesList: List[str] = Field(..., description="Список всех городов за день")
+    version: Optional[int] = Field(None, description="Версия снимка (мс); передать как since для дельты")
+    delta: bool = Field(False, description="True - только изменения после since (operators, clients, feed)")
+
+
+class LiveDelta(BaseModel):
+    """Событие delta live потока /dashboard/stream"""
+    feed: List[FeedEvent] = Field(..., description="Новые события (новые первыми)")
+    operators: List[OperatorStats] = Field(..., description="Операторы с новыми событиями (полные значения)")
+    clients: List[ClientStats] = Field(..., description="Клиенты с новыми событиями (полные значения)")
+    summary: Summary
+
+
+class LiveStatus(BaseModel):
+    """Событие status live потока: смена онлайн-статуса"""
+    operators: List[OperatorStats]
+
+
+class StreamTokenResponse(BaseModel):
+    """Токен подключения к /dashboard/stream"""
+    token: str = Field(..., description="Передать параметром token")
+    expiresIn: int = Field(..., description="Срок действия, секунд")
 
 
 class BoxItem(BaseModel):
@@ -75,10 +97,11 @@ class BoxDetails(BaseModel):
     city: str
     boxNo: str = Field(..., description="Номер короба (после /)")
     itemsCount: int = Field(..., description="Количество товаров")
+    closed: bool = Field(False, description="Есть событие CLOSE")
     firstAt: str = Field(..., description="Первый скан (dd.MM.yyyy HH:mm:ss)")
     lastAt: str = Field(..., description="Последний скан (dd.MM.yyyy HH:mm:ss)")
     operators: List[str] = Field(..., description="Список операторов работавших с коробом")
-    items: List[BoxItem] = Field(..., description="Список товаров")
+    items: List[BoxItem] = Field(default_factory=list, description="Товары (в /boxes пусто, см. /boxes/items)")
 
 
 class CityBoxes(BaseModel):
@@ -102,6 +125,17 @@ class BoxesStateResponse(BaseModel):
     generatedAt: str
     filters: Optional[Dict] = None
     clients: List[ClientBoxes]
+    totalGroups: int = Field(0, description="Групп (клиент, город) за период")
+    nextOffset: Optional[int] = Field(None, description="offset следующей страницы групп (None - последняя)")
+
+
+class BoxItemsResponse(BaseModel):
+    """Ответ dashboard/boxes/items: товары одного короба"""
+    client: str
+    city: str
+    boxNo: str
+    items: List[BoxItem]
+    total: int
 
 
 class RawLogEvent(BaseModel):
@@ -124,5 +158,7 @@ class RawLogEvent(BaseModel):
 class RawLogsResponse(BaseModel):
     """Ответ logs/raw"""
     logs: List[RawLogEvent]
-    total: int
+    total: int = Field(..., description="Записей на странице")
+    nextCursor: Optional[str] = Field(None, description="Курсор следующей страницы (None - последняя)")
+    totalEstimate: Optional[int] = Field(None, description="Оценка общего числа записей (estimate_total=true)")
 
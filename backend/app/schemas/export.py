@@ -0,0 +1,34 @@
+"""
+Pydantic схемы для фоновых экспортов (/export/jobs)
+"""
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class ExportJobRequest(BaseModel):
+    """Запрос фонового экспорта: параметры как у GET /export/{kind}"""
+    kind: str = Field("csv", description="csv, boxes-csv, xlsx, boxes-xlsx, parquet, arrow")
+    date: Optional[str] = Field(None, description="Дата YYYY-MM-DD (по умолчанию сегодня)")
+    date_end: Optional[str] = Field(None, description="Конец диапазона YYYY-MM-DD (включительно)")
+    operator: Optional[str] = Field(None, max_length=100)
+    client: Optional[str] = Field(None, max_length=100)
+    type: Optional[str] = Field(None, description="Тип события", max_length=50)
+    output: str = Field("csv", description="csv | gzip | zip (для csv, boxes-csv)")
+    split: str = Field("day", description="Файлы zip: day | client")
+
+
+class ExportJobResponse(BaseModel):
+    """Статус фонового экспорта"""
+    id: str
+    kind: str
+    status: str = Field(..., description="queued, running, done, failed")
+    cached: bool = Field(False, description="Готовый файл взят из кэша (те же параметры и версия данных)")
+    daysTotal: int
+    daysDone: int
+    rowsDone: int
+    bytes: Optional[int] = Field(None, description="Размер готового файла")
+    filename: Optional[str] = None
+    error: Optional[str] = None
+    createdAt: Optional[str] = Field(None, description="ISO")
+    finishedAt: Optional[str] = Field(None, description="ISO")
+    downloadUrl: Optional[str] = Field(None, description="Ссылка на файл (status=done)")
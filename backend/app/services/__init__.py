@@ -0,0 +1 @@
+# Сервисный слой (бизнес-логика вне HTTP роутеров)
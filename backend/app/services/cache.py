@@ -0,0 +1,290 @@
+"""
+Redis кэш ответов dashboard (/state, /boxes, /raw)
+
+Ключ - нормализованный кортеж фильтров (эндпоинт, дни периода, operator,
+client, city, type, limit). Запись хранит готовый JSON ответа, время
+расчета и версии данных всех дней периода (app.services.data_version):
+
+- версии совпадают и возраст <= DASHBOARD_CACHE_TTL        → hit
+- иначе, возраст <= DASHBOARD_CACHE_SWR_SECONDS             → stale: отдаем
+  запись и пересчитываем в фоне (один воркер, Redis SET NX)
+- иначе считаем в запросе (miss); если БД не ответила, а запись моложе
+  DASHBOARD_CACHE_STALE_IF_ERROR_SECONDS                     → stale_error
+
+Без Redis (или при DASHBOARD_CACHE_ENABLED=false) ответ всегда считается
+(bypass).
+
+ETag ответа - хэш ключа и версий данных, по которым посчитано тело. Если
+If-None-Match совпадает с ETag текущих версий, отвечаем 304 без чтения
+записи. Без Redis ETag не выдается: локальные версии не видят изменений
+других воркеров.
+
+Одинаковые одновременные расчеты объединяются (single-flight,
+DASHBOARD_SINGLE_FLIGHT_*): в воркере - app.services.single_flight, а в
+режиме "redis" еще и между воркерами: расчет ключа и версий ведет один
+воркер (SET NX), остальные ждут его запись в кэше.
+
+Сессия с действующим токеном read-your-writes (read_routing, после
+/remove) всегда считает ответ на primary и перезаписывает запись: запись
+могла быть посчитана на отстающей реплике.
+"""
+from fastapi.responses import Response
+from prometheus_client import Counter
+from typing import Awaitable, Callable, List, Optional, Set
+from datetime import date
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from app.config import settings
+from app.redis_client import get_redis
+from app.services import data_version
+from app.services.read_routing import FRESH_READ, read_router
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "scanner:cache:"
+LOCK_PREFIX = "scanner:cache:lock:"
+LOCK_SECONDS = 30
+FLIGHT_PREFIX = "scanner:cache:flight:"
+FLIGHT_POLL_SECONDS = 0.05
+
+CACHE_REQUESTS = Counter(
+    "response_cache_requests_total", "Запросы к кэшу ответов dashboard", ["endpoint", "result"]
+)
+CACHE_REVALIDATIONS = Counter(
+    "response_cache_revalidations_total", "Фоновые пересчеты устаревших записей", ["endpoint", "result"]
+)
+# computed - посчитал сам; coalesced - ждал расчет в своем воркере;
+# remote - ждал расчет другого воркера (redis); timeout - не дождался и посчитал сам
+SINGLE_FLIGHT = Counter(
+    "response_single_flight_total", "Расчеты ответов dashboard и объединенные с ними запросы", ["endpoint", "result"]
+)
+
+# compute(db) → pydantic модель ответа или готовое JSON тело (bytes)
+Compute = Callable[[object], Awaitable[object]]
+
+
+def serialize(result) -> bytes:
+    """Тело ответа: bytes отдаются как есть (например, orjson), модель - model_dump_json"""
+    if isinstance(result, bytes):
+        return result
+    return result.model_dump_json().encode()
+
+
+def json_response(body: bytes, cache_result: str, etag: Optional[str] = None) -> Response:
+    headers = {"X-Cache": cache_result}
+    if etag:
+        headers["ETag"] = etag
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match: список ETag через запятую, слабые (W/) сравниваются как сильные"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """Кэш JSON ответов с версиями данных и stale-while-revalidate"""
+
+    def __init__(self, ttl: int, swr_seconds: int, stale_if_error_seconds: int, enabled: bool = True,
+                 single_flight: bool = True, flight_mode: str = "local", flight_wait_seconds: float = 15.0):
+        self.ttl = ttl
+        self.swr_seconds = swr_seconds
+        self.stale_if_error_seconds = stale_if_error_seconds
+        self.enabled = enabled
+        self.single_flight = single_flight
+        self.flight_mode = flight_mode
+        self.flight_wait_seconds = flight_wait_seconds
+        self._flights = SingleFlight()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def key(endpoint: str, *parts) -> str:
+        """Ключ по нормализованным фильтрам (None и '' - одно и то же)"""
+        normalized = json.dumps([endpoint, *[p if p not in (None, '') else None for p in parts]], default=str)
+        return KEY_PREFIX + endpoint + ":" + hashlib.sha1(normalized.encode()).hexdigest()
+
+    @staticmethod
+    def etag(key: str, versions: str) -> str:
+        return '"' + hashlib.sha1(f"{key}|{versions}".encode()).hexdigest() + '"'
+
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        key: str,
+        days: List[date],
+        compute: Compute,
+        db,
+        if_none_match: Optional[str] = None,
+    ) -> Response:
+        """Ответ из кэша или compute(db) с сохранением (304, если If-None-Match актуален)"""
+        redis = get_redis() if self.enabled else None
+        if redis is None:
+            CACHE_REQUESTS.labels(endpoint, "bypass").inc()
+            return json_response(await self._coalesced(endpoint, key, lambda: self._compute(endpoint, compute, db)), "bypass")
+
+        try:
+            versions = ",".join(map(str, await data_version.get(days)))
+            entry = await redis.hgetall(key)
+        except Exception as e:
+            logger.warning(f"⚠️ Response cache unavailable: {e}")
+            CACHE_REQUESTS.labels(endpoint, "bypass").inc()
+            return json_response(await self._coalesced(endpoint, key, lambda: self._compute(endpoint, compute, db)), "bypass")
+
+        current_etag = self.etag(key, versions)
+        if db.info.get(FRESH_READ):
+            body = await self._compute_store(key, versions, compute, db)
+            CACHE_REQUESTS.labels(endpoint, "read_your_writes").inc()
+            return json_response(body, "miss", current_etag)
+
+        if etag_matches(if_none_match, current_etag):
+            CACHE_REQUESTS.labels(endpoint, "not_modified").inc()
+            return Response(status_code=304, headers={"ETag": current_etag, "X-Cache": "not_modified"})
+
+        age = None
+        if entry:
+            age = time.time() - float(entry[b"t"])
+            body = entry[b"b"]
+            # ETag устаревшей записи - по ее версиям, а не по текущим
+            entry_etag = self.etag(key, entry[b"v"].decode())
+            if entry[b"v"].decode() == versions and age <= self.ttl:
+                CACHE_REQUESTS.labels(endpoint, "hit").inc()
+                return json_response(body, "hit", entry_etag)
+            if age <= self.swr_seconds:
+                CACHE_REQUESTS.labels(endpoint, "stale").inc()
+                self._revalidate(endpoint, key, versions, compute)
+                return json_response(body, "stale", entry_etag)
+
+        try:
+            body = await self._coalesced(
+                endpoint, f"{key}|{versions}", lambda: self._compute_shared(endpoint, key, versions, compute, db)
+            )
+        except Exception as e:
+            if age is not None and age <= self.stale_if_error_seconds:
+                logger.warning(f"⚠️ {endpoint}: serving stale cache ({age:.0f}s) after error: {e}")
+                CACHE_REQUESTS.labels(endpoint, "stale_error").inc()
+                return json_response(entry[b"b"], "stale", entry_etag)
+            raise
+
+        CACHE_REQUESTS.labels(endpoint, "miss").inc()
+        return json_response(body, "miss", current_etag)
+
+    async def _coalesced(self, endpoint: str, flight_key: str, fn: Callable[[], Awaitable[bytes]]) -> bytes:
+        """fn() один раз на flight_key для одновременных запросов воркера"""
+        if not self.single_flight:
+            return await fn()
+        body, shared = await self._flights.do(flight_key, fn)
+        if shared:
+            SINGLE_FLIGHT.labels(endpoint, "coalesced").inc()
+        return body
+
+    async def _compute(self, endpoint: str, compute: Compute, db) -> bytes:
+        SINGLE_FLIGHT.labels(endpoint, "computed").inc()
+        return serialize(await compute(db))
+
+    async def _compute_shared(self, endpoint: str, key: str, versions: str, compute: Compute, db) -> bytes:
+        """
+        Посчитать и сохранить ответ; в режиме "redis" - один воркер на (ключ, версии)
+
+        Остальные воркеры ждут, пока в кэше появится запись с этими
+        версиями. Лидер упал или не успел за flight_wait_seconds -
+        считаем сами.
+        """
+        if not self.single_flight or self.flight_mode != "redis":
+            SINGLE_FLIGHT.labels(endpoint, "computed").inc()
+            return await self._compute_store(key, versions, compute, db)
+
+        redis = get_redis()
+        lock_key = FLIGHT_PREFIX + key[len(KEY_PREFIX):] + ":" + hashlib.sha1(versions.encode()).hexdigest()
+        deadline = time.monotonic() + self.flight_wait_seconds
+        while True:
+            try:
+                locked = await redis.set(lock_key, 1, nx=True, ex=max(1, int(self.flight_wait_seconds)))
+            except Exception as e:
+                logger.warning(f"⚠️ Single-flight lock unavailable: {e}")
+                locked = True
+            if locked:
+                SINGLE_FLIGHT.labels(endpoint, "computed").inc()
+                try:
+                    return await self._compute_store(key, versions, compute, db)
+                finally:
+                    try:
+                        await redis.delete(lock_key)
+                    except Exception:
+                        pass
+
+            # Ждем запись лидера; лок пропал без записи - лидер упал, пробуем сами
+            while time.monotonic() < deadline:
+                await asyncio.sleep(FLIGHT_POLL_SECONDS)
+                try:
+                    entry_versions, body = await redis.hmget(key, "v", "b")
+                    if entry_versions is not None and entry_versions.decode() == versions:
+                        SINGLE_FLIGHT.labels(endpoint, "remote").inc()
+                        return body
+                    if not await redis.exists(lock_key):
+                        break
+                except Exception as e:
+                    logger.warning(f"⚠️ Single-flight wait failed: {e}")
+                    deadline = 0
+            else:
+                SINGLE_FLIGHT.labels(endpoint, "timeout").inc()
+                return await self._compute_store(key, versions, compute, db)
+
+    async def _compute_store(self, key: str, versions: str, compute: Compute, db) -> bytes:
+        """
+        Посчитать и сохранить ответ
+
+        versions прочитаны до расчета: если данные изменятся во время
+        расчета, запись сразу будет устаревшей, а не "свежей" со старыми данными.
+        """
+        body = serialize(await compute(db))
+        try:
+            redis = get_redis()
+            pipe = redis.pipeline(transaction=True)
+            pipe.hset(key, mapping={"t": time.time(), "v": versions, "b": body})
+            pipe.expire(key, self.stale_if_error_seconds)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Response cache store failed: {e}")
+        return body
+
+    def _revalidate(self, endpoint: str, key: str, versions: str, compute: Compute) -> None:
+        task = asyncio.create_task(self._revalidate_task(endpoint, key, versions, compute))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _revalidate_task(self, endpoint: str, key: str, versions: str, compute: Compute) -> None:
+        redis = get_redis()
+        lock_key = LOCK_PREFIX + key[len(KEY_PREFIX):]
+        try:
+            if not await redis.set(lock_key, 1, nx=True, ex=LOCK_SECONDS):
+                return
+            try:
+                async with read_router.session() as db:
+                    await self._compute_store(key, versions, compute, db)
+                CACHE_REVALIDATIONS.labels(endpoint, "ok").inc()
+            finally:
+                await redis.delete(lock_key)
+        except Exception as e:
+            CACHE_REVALIDATIONS.labels(endpoint, "error").inc()
+            logger.warning(f"⚠️ {endpoint}: cache revalidation failed: {e}")
+
+
+# Singleton
+response_cache = ResponseCache(
+    ttl=settings.DASHBOARD_CACHE_TTL,
+    swr_seconds=settings.DASHBOARD_CACHE_SWR_SECONDS,
+    stale_if_error_seconds=settings.DASHBOARD_CACHE_STALE_IF_ERROR_SECONDS,
+    enabled=settings.DASHBOARD_CACHE_ENABLED,
+    single_flight=settings.DASHBOARD_SINGLE_FLIGHT_ENABLED,
+    flight_mode=settings.DASHBOARD_SINGLE_FLIGHT_MODE,
+    flight_wait_seconds=settings.DASHBOARD_SINGLE_FLIGHT_WAIT_SECONDS,
+)
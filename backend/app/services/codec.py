@@ -0,0 +1,237 @@
+"""
+Декодирование компактных тел запроса для POST /batch
+
+Поддерживаемые форматы:
+- Content-Type: application/msgpack (или application/x-msgpack)
+- Content-Encoding: gzip (для любого Content-Type, в т.ч. JSON)
+
+Раскладка msgpack payload (любая из двух):
+
+    # построчная - как JSON {events: [...]}
+    {"events": [{"uuid": ..., "ts": ..., "type": ..., ...}, ...]}
+
+    # колоночная - общие для батча поля передаются один раз
+    {
+        "shared":  {"operator": "Иван", "client": "OZON", "city": "Москва", "source": "pwa"},
+        "columns": {"uuid": [...], "ts": [...], "type": [...], "box": [...], "code": [...]}
+    }
+
+Колонки валидируются одним проходом по массивам (без EventCreate на
+строку), а граница "ts не в будущем" вычисляется один раз на батч.
+Результат - готовые строки для app.services.ingest.insert_rows.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import time
+import uuid as uuid_lib
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # опциональная зависимость
+    msgpack = None
+
+from app.config import settings
+
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Допуск на расхождение часов клиента (как в EventBase.validate_timestamp)
+FUTURE_TOLERANCE_MS = 60000
+
+# field → (обязательное, max_length, тип)
+FIELDS: Dict[str, Tuple[bool, Optional[int], type]] = {
+    "uuid": (False, None, str),  # проверяется отдельно в parse_uuid
+    "ts": (True, None, int),
+    "type": (True, 50, str),
+    "operator": (True, 100, str),
+    "client": (False, 100, str),
+    "city": (False, 100, str),
+    "box": (False, 100, str),
+    "code": (False, 500, str),
+    "details": (False, None, str),
+    "source": (False, 50, str),
+}
+
+
+class PayloadError(ValueError):
+    """Некорректное тело запроса (→ HTTP 400/415/422)"""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in MSGPACK_CONTENT_TYPES
+
+
+def decompress(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """Снять Content-Encoding (gzip/deflate) с ограничением размера распакованных данных"""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return body
+    if encoding not in ("gzip", "deflate"):
+        raise PayloadError(f"Unsupported Content-Encoding: {encoding}", status_code=415)
+
+    limit = settings.INGEST_MAX_DECOMPRESSED_BYTES
+    # wbits: 16+ - gzip заголовок, 0+ - zlib заголовок (deflate)
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, limit)
+    except zlib.error as e:
+        raise PayloadError(f"Invalid {encoding} body: {e}", status_code=400)
+    if decompressor.unconsumed_tail:
+        raise PayloadError(f"Decompressed body exceeds {limit} bytes", status_code=413)
+    return data
+
+
+def unpack_msgpack(body: bytes) -> Any:
+    if msgpack is None:
+        raise PayloadError("msgpack payloads are not supported (msgpack not installed)", status_code=415)
+    try:
+        return msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise PayloadError(f"Invalid msgpack body: {e}", status_code=400)
+
+
+def to_columns(payload: Any) -> Tuple[int, Dict[str, Any], Dict[str, list]]:
+    """Привести построчную или колоночную раскладку к (n, shared, columns)"""
+    if not isinstance(payload, dict):
+        raise PayloadError("Payload must be a map")
+
+    if "columns" in payload:
+        shared = payload.get("shared") or {}
+        columns = payload["columns"]
+        if not isinstance(shared, dict) or not isinstance(columns, dict):
+            raise PayloadError("'shared' and 'columns' must be maps")
+        lengths = {len(col) for col in columns.values() if isinstance(col, list)}
+        if len(lengths) != 1 or len(columns) != sum(isinstance(c, list) for c in columns.values()):
+            raise PayloadError("All columns must be arrays of the same length")
+        return lengths.pop(), shared, columns
+
+    events = payload.get("events")
+    if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+        raise PayloadError("'events' must be an array of maps")
+    columns = {
+        name: [e.get(name) for e in events]
+        for name in FIELDS
+        if any(name in e for e in events)
+    }
+    return len(events), {}, columns
+
+
+def parse_uuid(value: Any) -> uuid_lib.UUID:
+    """UUID4 из строки или 16 байт (msgpack bin)"""
+    if isinstance(value, (bytes, bytearray)):
+        result = uuid_lib.UUID(bytes=bytes(value))
+    else:
+        result = uuid_lib.UUID(value)
+    if result.version != 4:
+        raise ValueError("UUID version 4 expected")
+    return result
+
+
+def check_value(name: str, value: Any) -> Any:
+    """Проверка одного значения по FIELDS (None допускается для необязательных)"""
+    required, max_length, kind = FIELDS[name]
+    if value is None:
+        if required:
+            raise ValueError("Field required")
+        return None
+    if kind is int:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError("Input should be a non-negative integer")
+        return value
+    if not isinstance(value, str):
+        raise ValueError("Input should be a valid string")
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f"String should have at most {max_length} characters")
+    return value
+
+
+def decode_rows(payload: Any, received_at: Optional[datetime] = None) -> List[dict]:
+    """
+    Провалидировать payload и вернуть строки для вставки
+
+    Raises:
+        PayloadError - с указанием индекса события и поля
+    """
+    n, shared, columns = to_columns(payload)
+    if n == 0:
+        raise PayloadError("Batch must contain at least one event")
+    if n > settings.MAX_BATCH_SIZE:
+        raise PayloadError(f"Batch size cannot exceed {settings.MAX_BATCH_SIZE} events")
+
+    unknown = (set(shared) | set(columns)) - set(FIELDS)
+    if unknown:
+        raise PayloadError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    # Одна граница на весь батч вместо datetime.now() на каждое событие
+    max_ts = int(time.time() * 1000) + FUTURE_TOLERANCE_MS
+    received_at = received_at or datetime.now(timezone.utc)
+
+    values: Dict[str, list] = {}
+    for name in FIELDS:
+        if name == "uuid":  # строка или bin(16), см. parse_uuid
+            continue
+        if name in columns:
+            column = columns[name]
+            try:
+                values[name] = [check_value(name, v) for v in column]
+            except ValueError as e:
+                raise PayloadError(f"events[{_first_invalid(name, column)}].{name}: {e}")
+        else:
+            try:
+                values[name] = [check_value(name, shared.get(name))] * n
+            except ValueError as e:
+                raise PayloadError(f"shared.{name}: {e}")
+
+    for idx, ts in enumerate(values["ts"]):
+        if ts > max_ts:
+            raise PayloadError(f"events[{idx}].ts: Timestamp cannot be in the future")
+
+    uuids = []
+    for idx, value in enumerate(columns.get("uuid") or [shared.get("uuid")] * n):
+        if value is None:
+            uuids.append(uuid_lib.uuid4())
+            continue
+        try:
+            uuids.append(parse_uuid(value))
+        except (ValueError, TypeError, AttributeError) as e:
+            raise PayloadError(f"events[{idx}].uuid: {e}")
+
+    fromtimestamp = datetime.fromtimestamp
+    utc = timezone.utc
+    return [
+        {
+            "uuid": uuids[i],
+            "ts": fromtimestamp(values["ts"][i] / 1000, tz=utc),
+            "type": values["type"][i],
+            "operator": values["operator"][i],
+            "client": values["client"][i],
+            "city": values["city"][i],
+            "box": values["box"][i],
+            "code": values["code"][i],
+            "details": values["details"][i],
+            "source": values["source"][i] or "pwa",
+            # Разные возрастающие received_at: порядок батча в ленте и /raw (см. ingest.build_rows)
+            "received_at": received_at + timedelta(microseconds=i),
+            "created_at": received_at + timedelta(microseconds=i),
+        }
+        for i in range(n)
+    ]
+
+
+def _first_invalid(name: str, column: list) -> int:
+    """Индекс первого невалидного значения в колонке (только для сообщения об ошибке)"""
+    for idx, value in enumerate(column):
+        try:
+            check_value(name, value)
+        except ValueError:
+            return idx
+    return -1
+
+
+def decode_batch(body: bytes, content_encoding: Optional[str] = None) -> List[dict]:
+    """Тело msgpack запроса (возможно, сжатое) → строки для вставки"""
+    return decode_rows(unpack_msgpack(decompress(body, content_encoding)))
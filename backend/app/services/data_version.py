@@ -0,0 +1,68 @@
+"""
+Версии данных по дням (UTC) для инвалидации кэшей dashboard
+
+Каждый commit, меняющий события дня (ingest, /remove, /bulk-remove),
+увеличивает счетчик этого дня: INCR scanner:data_version:{YYYY-MM-DD}.
+Кэш ответа за период хранит версии всех дней периода и считается
+устаревшим, как только любая из них изменилась.
+
+Версии хранятся в Redis (общие для всех воркеров). Без Redis - в памяти
+процесса: инвалидация видит только изменения своего воркера.
+"""
+from typing import Dict, Iterable, List
+from datetime import date, timedelta, timezone
+import logging
+
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "scanner:data_version:"
+# Версии переживают любые закэшированные ответы
+KEY_TTL_SECONDS = 7 * 24 * 3600
+
+_local: Dict[str, int] = {}
+
+
+def days_between(start: date, end: date) -> List[date]:
+    """Дни периода включительно"""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def row_days(rows: Iterable[dict]) -> set:
+    """Дни (UTC) событий по их ts"""
+    return set(row["ts"].astimezone(timezone.utc).date() for row in rows)
+
+
+async def bump(days: Iterable[date]) -> None:
+    """Увеличить версии дней (после commit)"""
+    keys = sorted(KEY_PREFIX + day.isoformat() for day in set(days))
+    if not keys:
+        return
+
+    redis = get_redis()
+    if redis is None:
+        for key in keys:
+            _local[key] = _local.get(key, 0) + 1
+        return
+
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(key)
+            pipe.expire(key, KEY_TTL_SECONDS)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Data version bump failed: {e}")
+
+
+async def get(days: Iterable[date]) -> List[int]:
+    """Текущие версии дней (0 - день не менялся)"""
+    keys = [KEY_PREFIX + day.isoformat() for day in days]
+
+    redis = get_redis()
+    if redis is None:
+        return [_local.get(key, 0) for key in keys]
+
+    values = await redis.mget(keys)
+    return [int(v) if v is not None else 0 for v in values]
@@ -0,0 +1,303 @@
+"""
+Снимки закрытых дней для экспорта
+
+Прошедший день почти не меняется, а каждая выгрузка за прошлый период
+заново читает его строки из events. Снимок дня - результат выгрузки без
+фильтров (queries.export_statement - kind=events,
+queries.box_export_statement - kind=boxes), сохраненный в
+day_snapshot_parts частями по EXPORT_CHUNK_ROWS строк (msgpack + zlib).
+Выгрузка диапазона берет действующие снимки дней и читает из events
+только остальные; фильтры эндпоинта (operator, client, type) применяются
+к строкам снимка в Python, порядок строк - тот же, что у SQL.
+
+/dashboard/state и /dashboard/boxes снимков не требуют: они уже
+складывают дневные агрегаты (app.services.rollups).
+
+Инвалидация - эпоха дня (day_snapshot_epochs): каждое изменение событий
+прошлого дня (ingest досылки, /bulk-remove, retention) увеличивает ее в
+своей транзакции. Снимок действителен, пока его epoch равна эпохе дня.
+Сборка читает эпоху и строки в одной REPEATABLE READ транзакции, поэтому
+изменение, закоммиченное во время сборки, сразу делает снимок устаревшим.
+
+Снимки строит фоновая задача (один воркер, advisory lock): последние
+DAY_SNAPSHOT_DAYS дней, не раньше DAY_SNAPSHOT_SETTLE_HOURS после конца
+дня, заново - после инвалидации.
+"""
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from prometheus_client import Counter
+from collections import namedtuple
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+from datetime import date, datetime, time, timedelta, timezone
+import asyncio
+import logging
+import zlib
+import uuid as uuid_lib
+
+try:
+    import msgpack
+except ImportError:  # опциональная зависимость
+    msgpack = None
+
+from app.config import settings
+from app.database import engine
+from app.models.day_snapshot import DaySnapshotEpoch, DaySnapshot, DaySnapshotPart
+from app.services import queries
+from app.services.data_version import days_between
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock: снимки строит только один воркер
+SNAPSHOT_LOCK_ID = 0x5CA7_0003
+
+COMPRESS_LEVEL = 6
+
+# Строки снимков: те же атрибуты, что у строк SQL выгрузки
+EventRow = namedtuple("EventRow", [column.key for column in queries.EXPORT_COLUMNS])
+BoxRow = namedtuple("BoxRow", "client city box code ts operator")
+KINDS = ("events", "boxes")
+
+SNAPSHOT_DAYS = Counter(
+    "day_snapshot_days_total", "Закрытые дни выгрузок: из снимка (hit) или из events (miss)", ["kind", "result"]
+)
+SNAPSHOT_BUILDS = Counter("day_snapshot_builds_total", "Собранные снимки дней", ["result"])
+SNAPSHOT_INVALIDATIONS = Counter("day_snapshot_invalidations_total", "Инвалидации эпох прошлых дней")
+
+
+def enabled() -> bool:
+    return settings.DAY_SNAPSHOTS_ENABLED and msgpack is not None
+
+
+def closed_days(days: Iterable[date]) -> List[date]:
+    """Прошедшие дни (UTC): у сегодняшнего снимков нет"""
+    today = datetime.now(timezone.utc).date()
+    return sorted(set(day for day in days if day < today))
+
+
+def snapshot_statement(kind: str, day: date):
+    """Выгрузка дня без фильтров (границы дня - как export_days)"""
+    start = datetime.combine(day, time.min).replace(tzinfo=timezone.utc)
+    end = datetime.combine(day, time.max).replace(tzinfo=timezone.utc)
+    where = queries.event_filters(start, end)
+    if kind == "boxes":
+        return queries.box_export_statement(where)
+    return queries.export_statement(where)
+
+
+def encode_part(kind: str, rows: list) -> bytes:
+    if kind == "events":
+        values = [(row.uuid.bytes, *row[1:]) for row in rows]
+    else:
+        values = [tuple(row) for row in rows]
+    return zlib.compress(msgpack.packb(values, datetime=True), COMPRESS_LEVEL)
+
+
+def decode_part(kind: str, data: bytes) -> list:
+    values = msgpack.unpackb(zlib.decompress(data), timestamp=3)
+    if kind == "events":
+        return [EventRow(uuid_lib.UUID(bytes=value[0]), *value[1:]) for value in values]
+    return [BoxRow(*value) for value in values]
+
+
+async def invalidate(db, days: Iterable[date]) -> None:
+    """
+    Эпоха +1 для прошедших дней (вызывать в транзакции изменения)
+
+    Сегодняшние дни пропускаются: ingest текущего дня не пишет в таблицу.
+    Дни сортируются - параллельные транзакции блокируют строки в одном порядке.
+    """
+    days = closed_days(days)
+    if not days:
+        return
+
+    stmt = pg_insert(DaySnapshotEpoch).values([{"day": day, "epoch": 1} for day in days])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DaySnapshotEpoch.day],
+        set_={"epoch": DaySnapshotEpoch.epoch + 1, "changed_at": func.now()},
+    )
+    await db.execute(stmt)
+    SNAPSHOT_INVALIDATIONS.inc(len(days))
+
+
+async def drop_days(db, start: date, end: date) -> None:
+    """Снимки дней [start, end) больше не действительны (retention секций events)"""
+    await invalidate(db, days_between(start, end - timedelta(days=1)))
+    await db.execute(delete(DaySnapshot).where(DaySnapshot.day >= start, DaySnapshot.day < end))
+
+
+async def valid_days(db, kind: str, days: Iterable[date]) -> Set[date]:
+    """Дни, у которых есть действующий снимок kind"""
+    days = closed_days(days)
+    if not days or not enabled():
+        return set()
+
+    stmt = (
+        select(DaySnapshot.day)
+        .outerjoin(DaySnapshotEpoch, DaySnapshotEpoch.day == DaySnapshot.day)
+        .where(
+            DaySnapshot.kind == kind,
+            DaySnapshot.day.in_(days),
+            DaySnapshot.epoch == func.coalesce(DaySnapshotEpoch.epoch, 0),
+        )
+    )
+    valid = set((await db.execute(stmt)).scalars())
+    SNAPSHOT_DAYS.labels(kind, "hit").inc(len(valid))
+    SNAPSHOT_DAYS.labels(kind, "miss").inc(len(days) - len(valid))
+    return valid
+
+
+async def read(db, kind: str, day: date) -> AsyncIterator[list]:
+    """Строки снимка дня частями (часть - одна строка day_snapshot_parts)"""
+    stmt = (
+        select(DaySnapshotPart.data)
+        .where(DaySnapshotPart.day == day, DaySnapshotPart.kind == kind)
+        .order_by(DaySnapshotPart.part)
+    )
+    async for parts in queries.stream_rows(db, stmt, 1):
+        for (data,) in parts:
+            yield await asyncio.to_thread(decode_part, kind, data)
+
+
+class SnapshotSource:
+    """
+    Чтение дней выгрузки из снимков (export_stream.day_chunks)
+
+    Фильтры - те же, что queries.event_filters эндпоинта; фильтр не меняет
+    порядок строк снимка.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        operator: Optional[str] = None,
+        client: Optional[str] = None,
+        event_type: Optional[str] = None,
+    ):
+        self.kind = kind
+        self.operator = operator
+        self.client = client
+        self.event_type = event_type
+
+    async def valid_days(self, db, days: Iterable[date]) -> Set[date]:
+        return await valid_days(db, self.kind, days)
+
+    def matches(self, row) -> bool:
+        if self.client and row.client != self.client:
+            return False
+        if self.kind == "boxes":
+            return True
+        if self.operator and row.operator != self.operator:
+            return False
+        return not self.event_type or row.type == self.event_type
+
+    async def rows(self, db, day: date) -> AsyncIterator[list]:
+        filtered = bool(self.client or self.operator or self.event_type)
+        async for rows in read(db, self.kind, day):
+            if filtered:
+                rows = [row for row in rows if self.matches(row)]
+            if rows:
+                yield rows
+
+
+async def build_day(day: date, chunk_rows: int = settings.EXPORT_CHUNK_ROWS) -> Dict[str, int]:
+    """
+    Снять снимки дня (все KINDS) на primary одной транзакцией
+
+    Returns: {kind: строк в снимке}
+    """
+    counts = {}
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+        async with conn.begin():
+            epoch = (await conn.execute(
+                select(DaySnapshotEpoch.epoch).where(DaySnapshotEpoch.day == day)
+            )).scalar() or 0
+            await conn.execute(delete(DaySnapshot).where(DaySnapshot.day == day))
+
+            for kind in KINDS:
+                await conn.execute(insert(DaySnapshot).values(day=day, kind=kind, epoch=epoch))
+                parts = rows = size = 0
+                result = await conn.stream(snapshot_statement(kind, day).execution_options(yield_per=chunk_rows))
+                async for chunk in result.partitions():
+                    data = await asyncio.to_thread(encode_part, kind, chunk)
+                    await conn.execute(
+                        insert(DaySnapshotPart).values(day=day, kind=kind, part=parts, data=data)
+                    )
+                    parts += 1
+                    rows += len(chunk)
+                    size += len(data)
+                await conn.execute(
+                    update(DaySnapshot)
+                    .where(DaySnapshot.day == day, DaySnapshot.kind == kind)
+                    .values(rows=rows, parts=parts, bytes=size)
+                )
+                counts[kind] = rows
+    return counts
+
+
+async def pending_days(conn, now: Optional[datetime] = None) -> List[date]:
+    """Закрытые дни окна DAY_SNAPSHOT_DAYS без действующих снимков, новые первыми"""
+    now = now or datetime.now(timezone.utc)
+    last = (now - timedelta(hours=settings.DAY_SNAPSHOT_SETTLE_HOURS)).date() - timedelta(days=1)
+    first = last - timedelta(days=settings.DAY_SNAPSHOT_DAYS - 1)
+
+    valid = (await conn.execute(
+        select(DaySnapshot.day)
+        .outerjoin(DaySnapshotEpoch, DaySnapshotEpoch.day == DaySnapshot.day)
+        .where(
+            DaySnapshot.day >= first,
+            DaySnapshot.day <= last,
+            DaySnapshot.epoch == func.coalesce(DaySnapshotEpoch.epoch, 0),
+        )
+        .group_by(DaySnapshot.day)
+        .having(func.count() == len(KINDS))
+    )).scalars().all()
+    valid = set(valid)
+    return [day for day in reversed(days_between(first, last)) if day not in valid]
+
+
+async def build_pending(conn) -> int:
+    """Собрать до DAY_SNAPSHOT_BUILDS_PER_RUN снимков и удалить снимки за окном"""
+    days = (await pending_days(conn))[:settings.DAY_SNAPSHOT_BUILDS_PER_RUN]
+    await conn.commit()
+
+    built = 0
+    for day in days:
+        try:
+            counts = await build_day(day)
+            built += 1
+            SNAPSHOT_BUILDS.labels("ok").inc()
+            logger.info(f"📸 Day snapshot {day}: {counts}")
+        except Exception as e:
+            SNAPSHOT_BUILDS.labels("error").inc()
+            logger.error(f"❌ Day snapshot {day} failed: {e}", exc_info=True)
+
+    # Снимки и эпохи старше окна не читаются и не пересобираются
+    first = datetime.now(timezone.utc).date() - timedelta(days=settings.DAY_SNAPSHOT_DAYS + 1)
+    await conn.execute(delete(DaySnapshot).where(DaySnapshot.day < first))
+    await conn.execute(delete(DaySnapshotEpoch).where(DaySnapshotEpoch.day < first))
+    await conn.commit()
+    return built
+
+
+async def snapshot_loop():
+    """Фоновая задача: раз в DAY_SNAPSHOT_BUILD_SECONDS снимает новые и инвалидированные дни"""
+    while True:
+        await asyncio.sleep(settings.DAY_SNAPSHOT_BUILD_SECONDS)
+        try:
+            async with engine.connect() as conn:
+                locked = (await conn.execute(
+                    text("SELECT pg_try_advisory_lock(:id)"), {"id": SNAPSHOT_LOCK_ID}
+                )).scalar()
+                await conn.commit()
+                if not locked:
+                    continue
+                try:
+                    await build_pending(conn)
+                finally:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SNAPSHOT_LOCK_ID})
+                    await conn.commit()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Day snapshot loop failed: {e}", exc_info=True)
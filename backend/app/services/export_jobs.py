@@ -0,0 +1,394 @@
+"""
+Фоновые экспорты: POST /export/jobs → статус/прогресс → скачивание файла
+
+Большой диапазон не укладывается в proxy_read_timeout nginx, поэтому
+файл собирается вне HTTP запроса. Очередь - таблица export_jobs: любой
+uvicorn воркер забирает задачу (FOR UPDATE SKIP LOCKED), пишет heartbeat
+и прогресс в ее строку; задача без heartbeat дольше
+EXPORT_JOB_STALE_SECONDS (воркер упал/перезапущен) забирается снова, до
+EXPORT_JOB_MAX_ATTEMPTS попыток.
+
+Готовые файлы лежат в EXPORT_JOBS_DIR под именем cache_key =
+sha1(нормализованные параметры, версии данных дней диапазона). Повторная
+задача с тем же ключом сразу получает готовый файл (cached=True), такая
+же задача в очереди - возвращается она же. Диапазон с сегодняшним днем
+переиспользуется не старше EXPORT_JOB_OPEN_DAY_MAX_AGE_SECONDS: чтение
+идет с реплики, и файл мог собраться до того, как она догнала версию.
+
+Без Redis версии данных - в памяти процесса (app.services.data_version):
+изменения, сделанные другим воркером, ключ не меняют.
+
+Каталог чистится по возрасту (EXPORT_JOBS_MAX_AGE_SECONDS, меньше TTL
+версий) и размеру (EXPORT_JOBS_MAX_BYTES, сначала самые старые).
+"""
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from prometheus_client import Counter, Gauge, Histogram
+from typing import Awaitable, Callable, List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid as uuid_lib
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.export_job import ExportJob
+from app.services import data_version
+from app.services.read_routing import read_router
+
+logger = logging.getLogger(__name__)
+
+# build(db, params, path, progress) → (имя файла, media type); progress(день, строк)
+Build = Callable[[AsyncSession, dict, str, Callable[[datetime, int], None]], Awaitable[Tuple[str, str]]]
+
+# === Метрики ===
+JOBS = Counter(
+    "export_jobs_total",
+    "Фоновые экспорты: submitted, cached, coalesced, done, failed",
+    ["kind", "result"],
+)
+JOB_SECONDS = Histogram(
+    "export_job_seconds",
+    "Время сборки файла фонового экспорта",
+    ["kind"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+ARTIFACTS_BYTES = Gauge("export_artifacts_bytes", "Размер готовых файлов в EXPORT_JOBS_DIR")
+
+
+def cache_key(params: dict, versions: List[int]) -> str:
+    """Ключ готового файла: параметры + версии дней"""
+    payload = json.dumps({"params": params, "versions": versions}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def extension(filename: str) -> str:
+    """'scanner_logs_2025-11-01.csv.gz' → '.csv.gz'"""
+    return "." + filename.split(".", 1)[1] if "." in filename else ""
+
+
+class ExportJobs:
+    """
+    Очередь фоновых экспортов в БД + воркеры этого процесса
+
+    Usage:
+        await export_jobs.start(build)
+        job = await export_jobs.submit(db, "csv", params, days)
+        await export_jobs.stop()
+    """
+
+    def __init__(
+        self,
+        directory: str = settings.EXPORT_JOBS_DIR,
+        workers: int = settings.EXPORT_JOB_WORKERS,
+        poll_seconds: float = settings.EXPORT_JOB_POLL_SECONDS,
+        heartbeat_seconds: float = settings.EXPORT_JOB_HEARTBEAT_SECONDS,
+        stale_seconds: int = settings.EXPORT_JOB_STALE_SECONDS,
+        max_attempts: int = settings.EXPORT_JOB_MAX_ATTEMPTS,
+        open_day_max_age: int = settings.EXPORT_JOB_OPEN_DAY_MAX_AGE_SECONDS,
+        max_bytes: int = settings.EXPORT_JOBS_MAX_BYTES,
+        max_age: int = settings.EXPORT_JOBS_MAX_AGE_SECONDS,
+        evict_seconds: int = settings.EXPORT_JOBS_EVICT_SECONDS,
+    ):
+        self.directory = directory
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.open_day_max_age = open_day_max_age
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_seconds = evict_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._build: Optional[Build] = None
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def path(self, artifact: str) -> str:
+        return os.path.join(self.directory, artifact)
+
+    async def start(self, build: Build):
+        """Запустить воркеры и чистку каталога"""
+        if self.running:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._build = build
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._evict_loop()))
+        logger.info(f"✅ Export jobs started: workers={self.workers}, dir={self.directory}")
+
+    async def stop(self):
+        """
+        Остановить воркеры
+
+        Прерванная задача остается running без heartbeat и через
+        EXPORT_JOB_STALE_SECONDS забирается другим воркером.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def get(self, db: AsyncSession, job_id: uuid_lib.UUID) -> Optional[ExportJob]:
+        return await db.get(ExportJob, job_id)
+
+    async def submit(self, db: AsyncSession, kind: str, params: dict, days: List[date]) -> ExportJob:
+        """
+        Новая задача, готовый файл из кэша или такая же задача из очереди
+
+        days - дни диапазона (UTC), params - нормализованные
+        параметры (одинаковые запросы дают одинаковый dict).
+        """
+        versions = await data_version.get(days)
+        key = cache_key(params, versions)
+        closed = days[-1] < datetime.now(timezone.utc).date()
+
+        done = (await db.execute(
+            select(ExportJob)
+            .where(ExportJob.cache_key == key, ExportJob.status == "done")
+            .order_by(ExportJob.finished_at.desc())
+            .limit(1)
+        )).scalar_one_or_none()
+        if done is not None and self._reusable(done.artifact, closed):
+            now = datetime.now(timezone.utc)
+            job = ExportJob(
+                id=uuid_lib.uuid4(), kind=kind, params=params, cache_key=key, status="done", cached=True,
+                days_total=len(days), days_done=len(days), rows_done=done.rows_done, bytes=done.bytes,
+                artifact=done.artifact, filename=done.filename, media_type=done.media_type,
+                started_at=now, finished_at=now,
+            )
+            db.add(job)
+            await db.commit()
+            JOBS.labels(kind, "cached").inc()
+            logger.info(f"📦 Export job {job.id} ({kind}): cached {done.artifact}")
+            return job
+
+        pending = (await db.execute(
+            select(ExportJob)
+            .where(ExportJob.cache_key == key, ExportJob.status.in_(["queued", "running"]))
+            .order_by(ExportJob.created_at)
+            .limit(1)
+        )).scalar_one_or_none()
+        if pending is not None:
+            JOBS.labels(kind, "coalesced").inc()
+            return pending
+
+        job = ExportJob(
+            id=uuid_lib.uuid4(), kind=kind, params=params, cache_key=key, status="queued",
+            days_total=len(days),
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        JOBS.labels(kind, "submitted").inc()
+        logger.info(f"📝 Export job {job.id} ({kind}) queued: {len(days)} days")
+        # Свой воркер - сразу, воркеры других процессов - при следующем опросе
+        self._wakeup.set()
+        return job
+
+    def _reusable(self, artifact: Optional[str], closed: bool) -> bool:
+        """Файл на месте (не вычищен) и, для диапазона с сегодняшним днем, свежий"""
+        if not artifact:
+            return False
+        try:
+            mtime = os.stat(self.path(artifact)).st_mtime
+        except FileNotFoundError:
+            return False
+        return closed or time.time() - mtime <= self.open_day_max_age
+
+    async def _claim(self) -> Optional[tuple]:
+        """Взять старейшую задачу из очереди (или брошенную упавшим воркером)"""
+        stale = datetime.now(timezone.utc) - timedelta(seconds=self.stale_seconds)
+        candidate = (
+            select(ExportJob.id)
+            .where(or_(
+                ExportJob.status == "queued",
+                and_(ExportJob.status == "running", ExportJob.heartbeat_at < stale),
+            ))
+            .order_by(ExportJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(
+                update(ExportJob)
+                .where(ExportJob.id == candidate)
+                .values(
+                    status="running", attempts=ExportJob.attempts + 1, worker=self.worker_id,
+                    started_at=func.now(), heartbeat_at=func.now(),
+                )
+                .returning(ExportJob.id, ExportJob.kind, ExportJob.params, ExportJob.cache_key, ExportJob.attempts)
+            )).first()
+            await db.commit()
+        return job
+
+    async def _finish(self, job_id: uuid_lib.UUID, **values):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ExportJob).where(ExportJob.id == job_id).values(finished_at=func.now(), **values)
+            )
+            await db.commit()
+
+    async def _heartbeat(self, job_id: uuid_lib.UUID, progress: dict):
+        """heartbeat_at и прогресс, пока идет сборка"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(ExportJob)
+                        .where(ExportJob.id == job_id, ExportJob.status == "running")
+                        .values(
+                            heartbeat_at=func.now(), rows_done=progress["rows"],
+                            # текущий день еще читается
+                            days_done=max(len(progress["days"]) - 1, 0),
+                        )
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"⚠️ Export job {job_id} heartbeat failed: {e}")
+
+    async def _run(self, job: tuple):
+        """Собрать файл задачи во временный файл и переименовать в {cache_key}{ext}"""
+        if job.attempts > self.max_attempts:
+            await self._finish(job.id, status="failed", error=f"Worker lost {self.max_attempts} times")
+            JOBS.labels(job.kind, "failed").inc()
+            logger.error(f"❌ Export job {job.id} ({job.kind}) failed: attempts exhausted")
+            return
+
+        progress = {"rows": 0, "days": set()}
+
+        def on_chunk(day: datetime, rows: int):
+            progress["rows"] += rows
+            progress["days"].add(day)
+
+        started = time.perf_counter()
+        tmp_path = self.path(f"{job.cache_key}.{job.id}.tmp")
+        heartbeat = asyncio.create_task(self._heartbeat(job.id, progress))
+        try:
+            logger.info(f"🏗️ Export job {job.id} ({job.kind}) started, attempt {job.attempts}")
+            async with read_router.session() as db:
+                filename, media_type = await self._build(db, job.params, tmp_path, on_chunk)
+
+            artifact = job.cache_key + extension(filename)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self.path(artifact))
+            await self._finish(
+                job.id, status="done", artifact=artifact, filename=filename, media_type=media_type,
+                bytes=size, rows_done=progress["rows"], days_done=ExportJob.days_total, error=None,
+            )
+            JOBS.labels(job.kind, "done").inc()
+            JOB_SECONDS.labels(job.kind).observe(time.perf_counter() - started)
+            logger.info(f"✅ Export job {job.id} ({job.kind}): {progress['rows']} rows, {size} bytes")
+
+        except Exception as e:
+            logger.error(f"❌ Export job {job.id} ({job.kind}) failed: {e}", exc_info=True)
+            JOBS.labels(job.kind, "failed").inc()
+            try:
+                await self._finish(job.id, status="failed", error=str(e), rows_done=progress["rows"])
+            except Exception as finish_error:
+                logger.error(f"❌ Export job {job.id}: failed to save status: {finish_error}")
+
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Export job claim failed: {e}")
+                job = None
+
+            if job is not None:
+                await self._run(job)
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def evict(self) -> Tuple[int, int]:
+        """
+        Удалить файлы старше max_age, затем самые старые сверх max_bytes
+
+        Returns: (удалено файлов, байт осталось)
+        """
+        now = time.time()
+        files = []
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.endswith(".tmp"):
+                # недописанный файл упавшего воркера
+                if now - stat.st_mtime > self.max_age:
+                    self._unlink(entry.path)
+                    removed += 1
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+            removed += 1
+
+        ARTIFACTS_BYTES.set(total)
+        return removed, total
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass  # уже удален другим воркером
+
+    async def _evict_loop(self):
+        """Фоновая задача: чистка каталога и старых строк export_jobs"""
+        while True:
+            try:
+                removed, total = await asyncio.to_thread(self.evict)
+                if removed:
+                    logger.info(f"🧹 Export artifacts evicted: {removed} files, {total} bytes left")
+
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.max_age)
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        delete(ExportJob).where(
+                            ExportJob.status.in_(["done", "failed"]), ExportJob.finished_at < cutoff
+                        )
+                    )
+                    await db.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Export artifacts eviction failed: {e}", exc_info=True)
+
+            await asyncio.sleep(self.evict_seconds)
+
+
+export_jobs = ExportJobs()
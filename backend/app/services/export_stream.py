@@ -0,0 +1,242 @@
+"""
+Экспорт за диапазон дат: дни читаются параллельно, ответ сжимается на лету
+
+Отчет клиенту за месяц - это 30 дней по server-side курсору. Дни
+читаются одновременно (до EXPORT_PARALLEL_DAYS, каждый своей сессией на
+той же базе, что и запрос), но в ответ уходят строго по порядку дат:
+у каждого дня своя очередь на пару кусков, следующий день стартует,
+когда освобождается место в окне. Память - окно × 2 × EXPORT_CHUNK_ROWS
+строк, сколько бы дней ни было в диапазоне.
+Прошедшие дни с действующим снимком (app.services.day_snapshots)
+читаются из снимка, а не из events.
+
+Сжатие (gzip одного CSV или zip с файлом на день / день+клиент) идет по
+мере генерации, zlib работает в потоке, не блокируя event loop воркера.
+
+XLSX: openpyxl в write-only режиме (строки сразу пишутся во временный
+XML, строки - inline, без таблицы shared strings), книга сохраняется во
+временный файл и отдается из него.
+"""
+from collections import deque
+from datetime import datetime, timedelta, time
+from sqlalchemy.ext.asyncio import AsyncSession
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import zipfile
+import zlib
+
+from app.services import queries
+
+# Строк на листе Excel (с заголовком); дальше - следующий лист
+XLSX_MAX_ROWS = 1_048_576
+XLSX_TEXT = "@"
+XLSX_DATETIME = "DD.MM.YYYY HH:MM:SS"
+
+
+def export_days(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    """Границы дней диапазона parse_date_range (start, end включительно)"""
+    days = []
+    day = start
+    while day <= end:
+        days.append((day, datetime.combine(day.date(), time.max).replace(tzinfo=day.tzinfo)))
+        day += timedelta(days=1)
+    return days
+
+
+async def day_chunks(
+    db: AsyncSession,
+    days: List[Tuple[datetime, datetime]],
+    make_stmt: Callable,
+    parallel: int,
+    chunk_rows: int,
+    snapshot=None,
+) -> AsyncIterator[Tuple[datetime, list]]:
+    """
+    (начало дня, строки) по дням в порядке дат
+
+    Один день читается сессией запроса; для нескольких - до parallel дней
+    одновременно, каждый в своей сессии на db.bind (реплика или primary,
+    как выбрал get_read_db). При закрытии генератора (клиент отключился)
+    незавершенные чтения отменяются.
+
+    snapshot (day_snapshots.SnapshotSource): дни с действующим снимком
+    читаются из него, а не make_stmt.
+    """
+    snapshot_days = await snapshot.valid_days(db, [start.date() for start, _ in days]) if snapshot else set()
+
+    def day_rows(session: AsyncSession, start: datetime, end: datetime) -> AsyncIterator[list]:
+        if start.date() in snapshot_days:
+            return snapshot.rows(session, start.date())
+        return queries.stream_rows(session, make_stmt(start, end), chunk_rows)
+
+    if len(days) == 1:
+        start, end = days[0]
+        async for rows in day_rows(db, start, end):
+            yield start, rows
+        return
+
+    async def read_day(start: datetime, end: datetime, queue: asyncio.Queue):
+        try:
+            async with AsyncSession(db.bind, expire_on_commit=False) as day_db:
+                async for rows in day_rows(day_db, start, end):
+                    await queue.put(rows)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(None)
+
+    window = deque()
+    next_day = 0
+    try:
+        while window or next_day < len(days):
+            # Окно дней: первый в окне - тот, что сейчас отдается, поэтому
+            # он всегда читается и очереди следующих не блокируют его
+            while next_day < len(days) and len(window) < parallel:
+                start, end = days[next_day]
+                queue = asyncio.Queue(maxsize=2)
+                window.append((start, queue, asyncio.create_task(read_day(start, end, queue))))
+                next_day += 1
+
+            start, queue, task = window[0]
+            while True:
+                rows = await queue.get()
+                if rows is None:
+                    break
+                if isinstance(rows, Exception):
+                    raise rows
+                yield start, rows
+            await task
+            window.popleft()
+    finally:
+        tasks = [task for _, _, task in window]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def gzip_stream(body: AsyncIterator[bytes], level: int) -> AsyncIterator[bytes]:
+    """gzip (один файл) поверх потока байт"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for data in body:
+        chunk = await asyncio.to_thread(compressor.compress, data)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+class _ZipSink:
+    """Выход zipfile без seek: записанные байты забираются после каждой записи"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+async def zip_stream(entries: AsyncIterator[Tuple[str, bytes]], level: int) -> AsyncIterator[bytes]:
+    """
+    zip архив из (имя файла, байты): подряд идущие куски с одним именем - один файл
+
+    Архив пишется без seek (размеры файлов - в data descriptor после данных).
+    """
+    sink = _ZipSink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level)
+    name, entry = None, None
+    async for entry_name, data in entries:
+        if entry_name != name:
+            if entry is not None:
+                await asyncio.to_thread(entry.close)
+            name, entry = entry_name, archive.open(entry_name, "w")
+        await asyncio.to_thread(entry.write, data)
+        chunk = sink.take()
+        if chunk:
+            yield chunk
+    if entry is not None:
+        await asyncio.to_thread(entry.close)
+    archive.close()
+    yield sink.take()
+
+
+async def write_stream(body: AsyncIterator[bytes], path: str) -> int:
+    """Поток байт ответа в файл (фоновые экспорты); возвращает размер"""
+    size = 0
+    with open(path, "wb") as f:
+        async for data in body:
+            await asyncio.to_thread(f.write, data)
+            size += len(data)
+    return size
+
+
+def xlsx_datetime(value: Optional[datetime]) -> Optional[datetime]:
+    """datetime для ячейки Excel (без tzinfo, время UTC)"""
+    return value.replace(tzinfo=None) if value is not None else None
+
+
+async def write_xlsx(
+    chunks: AsyncIterator[Tuple[datetime, list]],
+    path: str,
+    title: str,
+    header: List[str],
+    render_row: Callable,
+    formats: Dict[int, str],
+    widths: List[int],
+) -> int:
+    """
+    Книга write-only из (день, строки) в path, возвращает число строк
+
+    formats: {индекс колонки: number_format} - штрихкоды и номера коробов
+    пишутся строками с форматом "@" (текст), даты - как даты Excel.
+    Строки добавляются в потоке: event loop не ждет openpyxl.
+    """
+    workbook = Workbook(write_only=True)
+    sheets = []
+    state = {"sheet": None, "cells": {}, "rows": 0, "total": 0}
+
+    def new_sheet():
+        number = len(sheets) + 1
+        sheet = workbook.create_sheet(title if number == 1 else f"{title} {number}")
+        for index, width in enumerate(widths, start=1):
+            sheet.column_dimensions[get_column_letter(index)].width = width
+        sheet.freeze_panes = "A2"
+        sheet.append(header)
+        sheets.append(sheet)
+        # Ячейки с форматом создаются один раз на лист: append пишет строку
+        # в XML сразу, ячейку можно заполнять заново для следующей строки
+        cells = {}
+        for index, number_format in formats.items():
+            cells[index] = WriteOnlyCell(sheet)
+            cells[index].number_format = number_format
+        state.update(sheet=sheet, cells=cells, rows=1)
+
+    def append(rows):
+        for row in rows:
+            if state["sheet"] is None or state["rows"] >= XLSX_MAX_ROWS:
+                new_sheet()
+            values = render_row(row)
+            for index, cell in state["cells"].items():
+                if values[index] is not None:
+                    cell.value = values[index]
+                    values[index] = cell
+            state["sheet"].append(values)
+            state["rows"] += 1
+        state["total"] += len(rows)
+
+    async for _, rows in chunks:
+        await asyncio.to_thread(append, rows)
+    if state["sheet"] is None:
+        new_sheet()
+    await asyncio.to_thread(workbook.save, path)
+    return state["total"]
@@ -0,0 +1,209 @@
+"""
+Ingest engine: вставка батча событий
+
+INSERT INTO event_uuids (uuid, ts) VALUES ... ON CONFLICT (uuid) DO NOTHING
+RETURNING uuid
+
+INSERT INTO events (...) VALUES (...), (...), ...   -- только занятые uuid
+ON CONFLICT (uuid, ts) DO NOTHING
+RETURNING uuid, txid_current()
+
+Дедупликация и вставка выполняются двумя statement на уровне SQLAlchemy Core,
+без ORM unit-of-work и без предварительного SELECT. Первичный ключ
+секционированной events - (uuid, ts), поэтому уникальность uuid держит
+event_uuids: тот же uuid с другим ts не занимает его второй раз и
+пропускается как дубликат. Параллельные ретраи одного и того же батча не
+приводят к IntegrityError: повторные UUID просто пропускаются базой.
+
+В той же транзакции обновляются дневные агрегаты event_daily_stats
+(app.services.rollups) - только по реально вставленным строкам. NOTIFY для
+live состояния (app.services.live_state) отправляется после commit
+(after_commit) с txid вставки: NOTIFY внутри транзакции сериализовал бы
+commit-ы всех воркеров на блокировке очереди уведомлений.
+"""
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Iterable, List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+import uuid as uuid_lib
+
+from app.models.event import Event, EventUUID
+from app.schemas.event import EventCreate, EventBatchResponse
+from app.services.uuid_filter import uuid_filter
+from app.services import data_version
+from app.services import rollups
+from app.services import day_snapshots
+from app.services.live_state import live_state
+
+events_table = Event.__table__
+event_uuids_table = EventUUID.__table__
+
+# Занять uuid: RETURNING - uuid, которые раньше не встречались
+claim_uuids_stmt = (
+    pg_insert(event_uuids_table)
+    .on_conflict_do_nothing(index_elements=[event_uuids_table.c.uuid])
+    .returning(event_uuids_table.c.uuid)
+)
+
+# INSERT ... ON CONFLICT (uuid, ts) DO NOTHING RETURNING uuid (PK секционированной events);
+# txid транзакции - тем же round-trip, для NOTIFY после commit
+insert_events_stmt = (
+    pg_insert(events_table)
+    .on_conflict_do_nothing(index_elements=[events_table.c.uuid, events_table.c.ts])
+    .returning(events_table.c.uuid, func.txid_current())
+)
+
+
+def event_to_row(event_data: EventCreate, received_at: datetime) -> dict:
+    """Конвертация EventCreate в строку для Core INSERT (ts: ms → datetime)"""
+    return {
+        "uuid": event_data.uuid or uuid_lib.uuid4(),
+        "ts": datetime.fromtimestamp(event_data.ts / 1000, tz=timezone.utc),
+        "type": event_data.type,
+        "operator": event_data.operator,
+        "client": event_data.client,
+        "city": event_data.city,
+        "box": event_data.box,
+        "code": event_data.code,
+        "details": event_data.details,
+        "source": event_data.source or "pwa",
+        "received_at": received_at,
+        "created_at": received_at,
+    }
+
+
+def dedup_rows(rows: Iterable[dict]) -> Tuple[List[dict], List[str]]:
+    """
+    Убрать повторы UUID внутри батча (первое вхождение выигрывает)
+
+    Returns:
+        (rows, batch_duplicates) - уникальные строки и UUID,
+        повторяющиеся внутри самого батча
+    """
+    unique = []
+    batch_duplicates = []
+    seen = set()
+
+    for row in rows:
+        uuid_str = str(row["uuid"])
+        if uuid_str in seen:
+            batch_duplicates.append(uuid_str)
+            continue
+        seen.add(uuid_str)
+        unique.append(row)
+
+    return unique, batch_duplicates
+
+
+def build_rows(
+    events: Iterable[EventCreate],
+    received_at: Optional[datetime] = None
+) -> Tuple[List[dict], List[str]]:
+    """
+    Подготовка строк для вставки из EventCreate (см. dedup_rows)
+
+    received_at - время получения батча + индекс события в микросекундах:
+    у событий батча разные и возрастающие received_at, лента и /raw
+    (ORDER BY received_at DESC) отдают их в порядке батча.
+    """
+    received_at = received_at or datetime.now(timezone.utc)
+    return dedup_rows(
+        event_to_row(e, received_at + timedelta(microseconds=i)) for i, e in enumerate(events)
+    )
+
+
+async def insert_rows(db, rows: List[dict]) -> Tuple[Set[str], Optional[int]]:
+    """
+    Занять uuid в event_uuids и вставить строки с занятыми uuid одним
+    multi-row INSERT ... ON CONFLICT DO NOTHING
+
+    db - AsyncSession или AsyncConnection. Список параметров передается как
+    executemany: SQLAlchemy (insertmanyvalues) рендерит его в один
+    VALUES (...), (...) statement на каждые 1000 строк. uuid занимаются в
+    порядке сортировки - параллельные батчи с общими uuid ждут друг друга
+    на одних и тех же ключах в одном порядке, без deadlock.
+
+    Вставленные строки сразу учитываются в дневных агрегатах (тот же db,
+    та же транзакция - при rollback агрегаты не видят откаченных событий).
+    Досылка за прошедшие дни инвалидирует их снимки выгрузок.
+
+    Returns:
+        (set UUID (str), которые реально были вставлены, txid транзакции
+        или None, если ничего не вставлено) - после commit передать в
+        after_commit()
+    """
+    if not rows:
+        return set(), None
+
+    claims = sorted(({"uuid": row["uuid"], "ts": row["ts"]} for row in rows), key=lambda c: str(c["uuid"]))
+    claimed = set(str(row[0]) for row in (await db.execute(claim_uuids_stmt, claims)).fetchall())
+    rows = [row for row in rows if str(row["uuid"]) in claimed]
+    if not rows:
+        return set(), None
+
+    result = await db.execute(insert_events_stmt, rows)
+    returned = result.fetchall()
+    inserted_uuids = set(str(row[0]) for row in returned)
+    inserted = inserted_rows(rows, inserted_uuids)
+    await rollups.add_rows(db, inserted)
+    await day_snapshots.invalidate(db, data_version.row_days(inserted))
+    return inserted_uuids, returned[0][1] if returned else None
+
+
+def summarize(
+    rows: List[dict],
+    batch_duplicates: List[str],
+    inserted_uuids: Set[str]
+) -> EventBatchResponse:
+    """Сформировать EventBatchResponse по результату вставки"""
+    duplicates = [
+        str(row["uuid"]) for row in rows
+        if str(row["uuid"]) not in inserted_uuids
+    ]
+    duplicates.extend(batch_duplicates)
+
+    return EventBatchResponse(
+        ok=True,
+        inserted=len(inserted_uuids),
+        skipped=len(duplicates),
+        duplicates=duplicates,
+        errors=[]
+    )
+
+
+def inserted_rows(rows: List[dict], inserted_uuids: Set[str]) -> List[dict]:
+    """Строки, которые реально были вставлены (для агрегатов и after_commit)"""
+    return [row for row in rows if str(row["uuid"]) in inserted_uuids]
+
+
+async def after_commit(rows: List[dict], txid: Optional[int]) -> None:
+    """
+    Обновить in-process структуры и версии данных после commit вставки
+
+    rows - только реально вставленные строки (см. inserted_rows),
+    txid - транзакция вставки (из insert_rows)
+    """
+    await uuid_filter.add_committed(row["uuid"] for row in rows)
+    # Инвалидация кэша ответов dashboard за затронутые дни
+    await data_version.bump(data_version.row_days(rows))
+    await live_state.publish(rows, txid)
+
+
+async def ingest_rows(db, rows: Iterable[dict]) -> Tuple[EventBatchResponse, List[dict], Optional[int]]:
+    """
+    Дедупликация + вставка готовых строк за один round-trip к БД (без commit)
+
+    Returns:
+        (response, inserted_rows, txid) - после commit вызывающий код
+        передает inserted_rows и txid в after_commit()
+    """
+    rows, batch_duplicates = dedup_rows(rows)
+    inserted_uuids, txid = await insert_rows(db, rows)
+    return summarize(rows, batch_duplicates, inserted_uuids), inserted_rows(rows, inserted_uuids), txid
+
+
+async def ingest_events(db, events: Iterable[EventCreate]) -> Tuple[EventBatchResponse, List[dict], Optional[int]]:
+    """Дедупликация + вставка батча за один round-trip к БД (без commit), см. ingest_rows"""
+    rows, batch_duplicates = build_rows(events)
+    inserted_uuids, txid = await insert_rows(db, rows)
+    return summarize(rows, batch_duplicates, inserted_uuids), inserted_rows(rows, inserted_uuids), txid
@@ -0,0 +1,262 @@
+"""
+Group-commit очередь для POST /batch
+
+Вместо отдельной транзакции на каждый запрос события от параллельных
+запросов копятся INGEST_FLUSH_WINDOW_MS миллисекунд (или до
+INGEST_MAX_GROUP_SIZE событий) и пишутся одним multi-row INSERT в одной
+транзакции. Каждый запрос получает ответ только после commit группы.
+
+Очередь живет внутри процесса: у каждого uvicorn воркера своя.
+"""
+from sqlalchemy import text
+from prometheus_client import Histogram, Counter
+from typing import Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.database import engine
+from app.schemas.event import EventCreate, EventBatchResponse
+from app.services.ingest import (
+    after_commit, build_rows, dedup_rows, insert_rows, inserted_rows, summarize
+)
+
+logger = logging.getLogger(__name__)
+
+# Допустимые значения synchronous_commit для INGEST_DURABILITY
+DURABILITY_MODES = ("on", "remote_write", "local", "off")
+
+# === Метрики ===
+GROUP_SIZE = Histogram(
+    "ingest_group_size_events",
+    "Количество событий в одном group commit",
+    buckets=(1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000),
+)
+GROUP_REQUESTS = Histogram(
+    "ingest_group_requests",
+    "Количество /batch запросов, объединенных в один group commit",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100),
+)
+COMMIT_LATENCY = Histogram(
+    "ingest_commit_latency_seconds",
+    "Время INSERT + COMMIT одной группы",
+)
+WAIT_LATENCY = Histogram(
+    "ingest_queue_wait_seconds",
+    "Время ожидания запроса в очереди до начала flush",
+)
+GROUP_ERRORS = Counter(
+    "ingest_group_errors_total",
+    "Количество group commit, завершившихся ошибкой",
+)
+
+
+class IngestQueue:
+    """
+    In-process asyncio очередь с group commit
+
+    Usage:
+        await ingest_queue.start()
+        response = await ingest_queue.ingest(request.events)
+        await ingest_queue.stop()
+    """
+
+    def __init__(
+        self,
+        flush_window_ms: int = settings.INGEST_FLUSH_WINDOW_MS,
+        max_group_size: int = settings.INGEST_MAX_GROUP_SIZE,
+        durability: str = settings.INGEST_DURABILITY,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"INGEST_DURABILITY must be one of: {', '.join(DURABILITY_MODES)}")
+
+        self.flush_window = flush_window_ms / 1000
+        self.max_group_size = max_group_size
+        self.durability = durability
+
+        # (rows, enqueued_at, future)
+        self._pending: List[Tuple[List[dict], float, asyncio.Future]] = []
+        self._pending_rows = 0
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Запустить фоновый flush loop"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"✅ Ingest queue started: window={self.flush_window * 1000:.0f}ms, "
+                f"max_group={self.max_group_size}, durability={self.durability}"
+            )
+
+    async def stop(self):
+        """Остановить loop, дописав все, что осталось в очереди"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._pending:
+            await self._flush(self._take_group())
+
+    async def submit(self, rows: List[dict]) -> Set[str]:
+        """Поставить строки в очередь и дождаться commit группы"""
+        if not rows:
+            return set()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((rows, time.perf_counter(), future))
+        self._pending_rows += len(rows)
+
+        if self._pending_rows >= self.max_group_size:
+            self._full.set()
+        self._wakeup.set()
+
+        return await future
+
+    async def ingest(self, events: Iterable[EventCreate]) -> EventBatchResponse:
+        """Аналог ingest_events(), но через group commit (commit включен)"""
+        rows, batch_duplicates = build_rows(events)
+        inserted_uuids = await self.submit(rows)
+        return summarize(rows, batch_duplicates, inserted_uuids)
+
+    async def ingest_rows(self, rows: Iterable[dict]) -> EventBatchResponse:
+        """Аналог ingest.ingest_rows(), но через group commit (commit включен)"""
+        rows, batch_duplicates = dedup_rows(rows)
+        inserted_uuids = await self.submit(rows)
+        return summarize(rows, batch_duplicates, inserted_uuids)
+
+    def _take_group(self) -> List[Tuple[List[dict], float, asyncio.Future]]:
+        """Забрать из очереди запросы суммарно не больше max_group_size событий"""
+        group = []
+        size = 0
+        while self._pending:
+            rows = self._pending[0][0]
+            if group and size + len(rows) > self.max_group_size:
+                break
+            group.append(self._pending.pop(0))
+            size += len(rows)
+
+        self._pending_rows -= size
+        if self._pending_rows < self.max_group_size:
+            self._full.clear()
+        if not self._pending:
+            self._wakeup.clear()
+        return group
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+
+            # Окно сбора: ждем flush_window или пока группа не заполнится
+            if not self._full.is_set():
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_window)
+                except asyncio.TimeoutError:
+                    pass
+
+            group = self._take_group()
+            if group:
+                await self._flush(group)
+
+    async def _commit(self, rows: List[dict]) -> Tuple[Set[str], Optional[int]]:
+        """INSERT строк одной транзакцией; возвращает вставленные UUID и txid"""
+        async with engine.begin() as conn:
+            if self.durability != "on":
+                await conn.execute(text(f"SET LOCAL synchronous_commit = {self.durability}"))
+            return await insert_rows(conn, rows)
+
+    async def _flush(self, group: List[Tuple[List[dict], float, asyncio.Future]]):
+        """Записать группу одним INSERT в одной транзакции и разбудить всех ждущих"""
+        try:
+            await self._flush_group(group)
+        finally:
+            # Отмена (stop) или BaseException посреди flush: ни один запрос
+            # не должен ждать ответа вечно. Повтор безопасен - ON CONFLICT.
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(RuntimeError("Group commit interrupted"))
+
+    async def _flush_group(self, group: List[Tuple[List[dict], float, asyncio.Future]]):
+        started = time.perf_counter()
+
+        # Одинаковый UUID может прийти от нескольких запросов сразу (ретраи):
+        # вставляем его один раз, "владелец" - первый запрос
+        rows = []
+        owners = {}
+        for idx, (request_rows, enqueued_at, _) in enumerate(group):
+            WAIT_LATENCY.observe(started - enqueued_at)
+            for row in request_rows:
+                uuid_str = str(row["uuid"])
+                if uuid_str not in owners:
+                    owners[uuid_str] = idx
+                    rows.append(row)
+
+        try:
+            inserted_uuids, txid = await self._commit(rows)
+        except Exception as e:
+            GROUP_ERRORS.inc()
+            logger.error(f"❌ Group commit failed ({len(rows)} events): {e}", exc_info=True)
+            error = e
+        else:
+            error = None
+
+        if error is not None:
+            if len(group) > 1:
+                await self._flush_each(group)
+            for _, _, future in group:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        COMMIT_LATENCY.observe(time.perf_counter() - started)
+        GROUP_SIZE.observe(len(rows))
+        GROUP_REQUESTS.observe(len(group))
+
+        try:
+            await after_commit(inserted_rows(rows, inserted_uuids), txid)
+        except Exception as e:
+            logger.error(f"❌ after_commit failed: {e}", exc_info=True)
+
+        for idx, (request_rows, _, future) in enumerate(group):
+            if future.done():  # запрос отменен (клиент отключился)
+                continue
+            future.set_result({
+                str(row["uuid"]) for row in request_rows
+                if owners[str(row["uuid"])] == idx and str(row["uuid"]) in inserted_uuids
+            })
+
+    async def _flush_each(self, group: List[Tuple[List[dict], float, asyncio.Future]]):
+        """
+        Fallback после ошибки группы: каждый запрос отдельной транзакцией,
+        чтобы данные одного запроса не отклоняли остальные
+        """
+        for request_rows, _, future in group:
+            if future.done():
+                continue
+            try:
+                inserted_uuids, txid = await self._commit(request_rows)
+            except Exception as e:
+                logger.error(f"❌ Commit failed ({len(request_rows)} events): {e}", exc_info=True)
+                future.set_exception(e)
+                continue
+
+            try:
+                await after_commit(inserted_rows(request_rows, inserted_uuids), txid)
+            except Exception as e:
+                logger.error(f"❌ after_commit failed: {e}", exc_info=True)
+            if not future.done():
+                future.set_result(inserted_uuids)
+
+
+# Singleton instance (запускается в lifespan при INGEST_GROUP_COMMIT_ENABLED)
+ingest_queue = IngestQueue()
@@ -0,0 +1,500 @@
+"""
+Live состояние "сегодня" в памяти воркера для GET /dashboard/state
+
+Почти все запросы dashboard - за текущий день (UTC). Вместо пересчета из БД
+каждый воркер держит в памяти:
+- группы (operator, client, city) за сегодня - те же счетчики, что
+  event_daily_stats (items, boxes_open, boxes_close, errors, последний короб)
+- кольцевой буфер последних LIVE_STATE_FEED_SIZE событий для ленты
+
+и отдает /state за сегодня за O(групп) без запросов к БД.
+
+Согласованность между uvicorn воркерами - Postgres LISTEN/NOTIFY:
+- после commit вставки (ingest.after_commit) pg_notify с вставленными за
+  сегодня событиями уходит отдельной короткой транзакцией: NOTIFY внутри
+  ingest транзакции берет на commit общую блокировку очереди уведомлений
+  и сериализует commit-ы всех воркеров. Откаченная вставка ничего не
+  отправляет; порядок сообщений может отличаться от порядка commit-ов -
+  применение не зависит от порядка (счетчики, последний короб по received_at)
+- все воркеры (включая отправителя) применяют события только из канала,
+  поэтому состояние во всех воркерах одинаковое
+- /bulk-remove отправляет "R" - воркеры перечитывают день из БД
+- если NOTIFY после commit не удался, воркеры не увидят события до
+  следующей гидратации (переподключение, "R", смена дня)
+
+Каждое сообщение помечено txid транзакции вставки. Гидратация (старт, переподключение,
+"R", смена дня) читает event_daily_stats и ленту в одном REPEATABLE READ
+снимке вместе с txid_current_snapshot(); сообщения транзакций, видимых в
+снимке, пропускаются - события не учитываются дважды.
+
+Подписчики (add_listener, например app.services.live_stream) получают
+применённые события после каждого сообщения и None после гидратации.
+
+Для delta-sync /state (since=<version>) группы и события ленты помечены
+временем применения в воркере (мс); версия ответа - время его построения.
+Изменения "после версии" - применённые позже since - overlap: разные воркеры
+применяют одно сообщение с разницей в миллисекунды. Если since раньше
+последней гидратации воркера, дельту посчитать нельзя - нужен полный ответ.
+"""
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from prometheus_client import Counter, Gauge
+from collections import deque, namedtuple
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import heapq
+import json
+import logging
+import time
+
+import asyncpg
+
+from app.config import settings
+from app.database import engine
+from app.models.event import Event
+from app.models.stats import EventDailyStats
+
+logger = logging.getLogger(__name__)
+
+# pg_notify payload ограничен 8000 байт
+MAX_PAYLOAD_BYTES = 7500
+RESYNC = "R"
+
+# Те же поля, что у строк app.services.queries
+OperatorRow = namedtuple("OperatorRow", "operator client city last_box last_received_at items errors")
+ClientRow = namedtuple("ClientRow", "client items boxes_open boxes_close errors")
+FeedRow = namedtuple("FeedRow", "received_at ts operator type client city box code uuid applied_ms")
+
+LIVE_GROUPS = Gauge("live_state_groups", "Группы (operator, client, city) за сегодня в памяти")
+LIVE_MESSAGES = Counter("live_state_messages_total", "Сообщения LISTEN/NOTIFY", ["result"])
+LIVE_PUBLISH_ERRORS = Counter("live_state_publish_errors_total", "Неудачные NOTIFY после commit")
+LIVE_HYDRATIONS = Counter("live_state_hydrations_total", "Перечитывания состояния из БД")
+LIVE_SERVED = Counter("live_state_served_total", "/state за сегодня", ["source"])
+
+# pg_notify для каждого чанка одним запросом; payload - "<txid вставки> <тело>"
+NOTIFY_SQL = text(
+    "SELECT pg_notify(:channel, p) FROM unnest(CAST(:payloads AS text[])) AS p"
+)
+
+
+def utc_today():
+    return datetime.now(timezone.utc).date()
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def to_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+def from_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def encode_rows(rows: List[dict]) -> List[str]:
+    """Сегодняшние строки → JSON массивы событий, не длиннее MAX_PAYLOAD_BYTES"""
+    today = utc_today()
+    payloads = []
+    chunk = []
+    size = 2
+    for row in rows:
+        if row["ts"].astimezone(timezone.utc).date() != today:
+            continue
+        item = json.dumps([
+            str(row["uuid"]), to_ms(row["ts"]), to_ms(row["received_at"]),
+            row["type"], row["operator"], row["client"] or '', row["city"] or '',
+            row["box"] or '', row["code"] or '',
+        ], ensure_ascii=False, separators=(",", ":"))
+        if chunk and size + len(item.encode("utf-8")) + 1 > MAX_PAYLOAD_BYTES:
+            payloads.append("[" + ",".join(chunk) + "]")
+            chunk, size = [], 2
+        chunk.append(item)
+        size += len(item.encode("utf-8")) + 1
+    if chunk:
+        payloads.append("[" + ",".join(chunk) + "]")
+    return payloads
+
+
+class Snapshot:
+    """txid_current_snapshot(): 'xmin:xmax:xip,...' - видимость транзакций"""
+
+    def __init__(self, value: str):
+        xmin, xmax, xip = value.split(":")
+        self.xmin = int(xmin)
+        self.xmax = int(xmax)
+        self.xip = set(int(x) for x in xip.split(",") if x)
+
+    def visible(self, txid: int) -> bool:
+        if txid < self.xmin:
+            return True
+        if txid >= self.xmax:
+            return False
+        return txid not in self.xip
+
+
+class LiveState:
+    """Состояние за сегодня в памяти воркера + слушатель LISTEN"""
+
+    def __init__(self, channel: str, feed_size: int, enabled: bool = True):
+        self.channel = channel
+        self.feed_size = feed_size
+        self.enabled = enabled
+
+        self.day = None
+        # (operator, client, city) → [items, boxes_open, boxes_close, errors, last_received_at, last_box,
+        #                             events, applied_ms]
+        self.groups: Dict[Tuple[str, str, str], list] = {}
+        self.feed: deque = deque(maxlen=feed_size)
+        # В буфере все события дня (ничего не вытеснено)
+        self.feed_complete = True
+        self.ready = False
+        # Время (мс) последней гидратации: дельты считаются только после него
+        self.synced_ms = 0
+
+        self._snapshot: Optional[Snapshot] = None
+        self._listeners: List[Callable[[Optional[List[FeedRow]]], None]] = []
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    # === публикация (после commit, своим соединением) ===
+
+    async def publish(self, rows: List[dict], txid: Optional[int]) -> None:
+        """pg_notify вставленных строк после commit транзакции txid"""
+        if not self.enabled or not rows or txid is None:
+            return
+        payloads = encode_rows(rows)
+        if payloads:
+            await self._send(txid, payloads)
+
+    async def publish_resync(self, txid: Optional[int]) -> None:
+        """Попросить все воркеры перечитать день из БД (после commit удаления txid)"""
+        if self.enabled and txid is not None:
+            await self._send(txid, [RESYNC])
+
+    async def _send(self, txid: int, payloads: List[str]) -> None:
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(NOTIFY_SQL, {
+                    "channel": self.channel,
+                    "payloads": [f"{txid} {payload}" for payload in payloads],
+                })
+                await conn.commit()
+        except Exception as e:
+            # Данные уже закоммичены - ответ клиенту не ломаем
+            LIVE_PUBLISH_ERRORS.inc()
+            logger.error(f"❌ Live state NOTIFY failed: {e}", exc_info=True)
+
+    # === чтение ===
+
+    def serves(self, start: datetime, end: datetime) -> bool:
+        """Можно ли ответить из памяти: готово и период - ровно сегодня"""
+        today = utc_today()
+        if start.date() != today or end.date() != today:
+            return False
+        ok = self.ready and self.day == today
+        LIVE_SERVED.labels("memory" if ok else "db").inc()
+        return ok
+
+    def _matches(self, key: Tuple[str, str, str], operator, client, city) -> bool:
+        return (
+            (not operator or key[0] == operator)
+            and (not client or key[1] == client)
+            and (not city or key[2] == city)
+        )
+
+    def operator_rows(self, operator=None, client=None, city=None) -> List[OperatorRow]:
+        result: Dict[str, list] = {}
+        for key, g in self.groups.items():
+            if not self._matches(key, operator, client, city):
+                continue
+            op = result.get(key[0])
+            if op is None:
+                result[key[0]] = [key, g, g[0], g[3]]
+                continue
+            if g[4] > op[1][4]:
+                op[0], op[1] = key, g
+            op[2] += g[0]
+            op[3] += g[3]
+        return [
+            OperatorRow(key[0], key[1], key[2], g[5], g[4], items, errors)
+            for key, g, items, errors in result.values()
+        ]
+
+    def client_rows(self, operator=None, client=None, city=None) -> List[ClientRow]:
+        result: Dict[str, list] = {}
+        for key, g in self.groups.items():
+            if not self._matches(key, operator, client, city):
+                continue
+            c = result.setdefault(key[1], [0, 0, 0, 0])
+            for i in range(4):
+                c[i] += g[i]
+        return [ClientRow(name, *counts) for name, counts in result.items()]
+
+    def city_list(self, operator=None, client=None, city=None) -> List[str]:
+        return sorted(set(
+            key[2] for key in self.groups
+            if key[2] and self._matches(key, operator, client, city)
+        ))
+
+    def feed_rows(self, operator=None, client=None, city=None, limit: int = 100) -> Optional[List[FeedRow]]:
+        """
+        Последние события по received_at
+
+        None - в буфере недостаточно событий под фильтр (часть дня вытеснена),
+        ленту нужно взять из БД.
+        """
+        rows = [
+            e for e in self.feed
+            if self._matches((e.operator, e.client, e.city), operator, client, city)
+        ]
+        if len(rows) < limit and not self.feed_complete:
+            return None
+        return heapq.nlargest(limit, rows, key=lambda e: e.received_at)
+
+    # === delta-sync ===
+
+    def can_sync_since(self, since_ms: int) -> bool:
+        """Известны ли все изменения после since_ms (не было гидратации позже)"""
+        return self.ready and since_ms >= self.synced_ms
+
+    def changed_keys(self, since_ms: int, operator=None, client=None, city=None) -> set:
+        """Группы под фильтр, изменившиеся после since_ms"""
+        return set(
+            key for key, g in self.groups.items()
+            if g[7] > since_ms and self._matches(key, operator, client, city)
+        )
+
+    def feed_since(self, since_ms: int, operator=None, client=None, city=None, limit: int = 100) -> List[FeedRow]:
+        """События ленты под фильтр, применённые после since_ms (новые первыми)"""
+        rows = []
+        for e in reversed(self.feed):
+            if e.applied_ms <= since_ms:
+                break
+            if self._matches((e.operator, e.client, e.city), operator, client, city):
+                rows.append(e)
+        return heapq.nlargest(limit, rows, key=lambda e: e.received_at)
+
+    def fingerprint(self, online_after: datetime, operator=None, client=None, city=None) -> str:
+        """
+        Отпечаток состояния под фильтр для ETag
+
+        Счетчики, последнее событие и онлайн операторы - одинаковы во всех
+        воркерах при одинаковых данных, поэтому ETag не зависит от воркера.
+        """
+        totals = [0, 0, 0, 0, 0]
+        last = None
+        online = set()
+        for key, g in self.groups.items():
+            if not self._matches(key, operator, client, city):
+                continue
+            for i, value in enumerate((g[0], g[1], g[2], g[3], g[6])):
+                totals[i] += value
+            if last is None or g[4] > last:
+                last = g[4]
+            if g[4] >= online_after:
+                online.add(key[0])
+        value = json.dumps(
+            [self.day, operator, client, city, totals, last, sorted(online)], default=str
+        )
+        return hashlib.sha1(value.encode()).hexdigest()
+
+    # === применение событий ===
+
+    def _reset(self, day) -> None:
+        self.day = day
+        self.groups = {}
+        self.feed = deque(maxlen=self.feed_size)
+        self.feed_complete = True
+
+    def add_listener(self, callback: Callable[[Optional[List[FeedRow]]], None]) -> None:
+        """
+        Подписаться на изменения состояния
+
+        callback(rows) - события, применённые сообщением канала;
+        callback(None) - состояние перечитано из БД целиком.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, rows: Optional[List[FeedRow]]) -> None:
+        for callback in self._listeners:
+            try:
+                callback(rows)
+            except Exception as e:
+                logger.error(f"❌ Live state listener callback failed: {e}", exc_info=True)
+
+    def _apply_event(self, item: list, applied_ms: int) -> FeedRow:
+        uuid, ts_ms, received_ms, event_type, operator, client, city, box, code = item
+        received_at = from_ms(received_ms)
+
+        key = (operator, client, city)
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = [0, 0, 0, 0, received_at, box or None, 0, applied_ms]
+        if event_type == "ITEM":
+            g[0] += 1
+        elif event_type == "BOX":
+            g[1] += 1
+        elif event_type == "CLOSE":
+            g[2] += 1
+        elif event_type == "ERROR":
+            g[3] += 1
+        if received_at >= g[4]:
+            g[4] = received_at
+            g[5] = box or None
+        g[6] += 1
+        g[7] = applied_ms
+
+        row = FeedRow(received_at, from_ms(ts_ms), operator, event_type, client, city, box, code, uuid, applied_ms)
+        if len(self.feed) == self.feed.maxlen:
+            self.feed_complete = False
+        self.feed.append(row)
+        return row
+
+    def apply_message(self, payload: str) -> bool:
+        """
+        Применить сообщение канала
+
+        Returns:
+            False, если нужна гидратация из БД (RESYNC или смена дня)
+        """
+        txid, body = payload.split(" ", 1)
+        if self._snapshot is not None and self._snapshot.visible(int(txid)):
+            LIVE_MESSAGES.labels("skipped").inc()
+            return True
+        if body == RESYNC:
+            LIVE_MESSAGES.labels("resync").inc()
+            return False
+        if self.day != utc_today():
+            return False
+
+        today_ms = to_ms(datetime.combine(self.day, datetime.min.time(), tzinfo=timezone.utc))
+        applied_ms = now_ms()
+        applied = [
+            self._apply_event(item, applied_ms)
+            for item in json.loads(body)
+            # Отправитель мог еще жить во вчерашнем дне
+            if today_ms <= item[1] < today_ms + 86_400_000
+        ]
+        LIVE_MESSAGES.labels("applied").inc()
+        LIVE_GROUPS.set(len(self.groups))
+        if applied:
+            self._notify(applied)
+        return True
+
+    # === гидратация и слушатель ===
+
+    async def hydrate(self) -> None:
+        """Перечитать сегодняшний день из БД в одном снимке"""
+        day = utc_today()
+        start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+            async with conn.begin():
+                snapshot = (await conn.execute(text("SELECT txid_current_snapshot()::text"))).scalar()
+                stats = (await conn.execute(
+                    select(
+                        EventDailyStats.operator, EventDailyStats.client, EventDailyStats.city,
+                        EventDailyStats.items, EventDailyStats.boxes_open, EventDailyStats.boxes_close,
+                        EventDailyStats.errors, EventDailyStats.last_received_at, EventDailyStats.last_box,
+                        EventDailyStats.events,
+                    ).where(EventDailyStats.day == day)
+                )).all()
+                feed = (await conn.execute(
+                    select(
+                        Event.received_at, Event.ts, Event.operator, Event.type,
+                        Event.client, Event.city, Event.box, Event.code, Event.uuid,
+                    )
+                    .where(Event.ts >= start, Event.deleted_at.is_(None))
+                    .order_by(Event.received_at.desc())
+                    .limit(self.feed_size)
+                )).all()
+
+        self._reset(day)
+        synced_ms = now_ms()
+        for row in stats:
+            self.groups[(row.operator, row.client, row.city)] = [
+                row.items, row.boxes_open, row.boxes_close, row.errors,
+                row.last_received_at, row.last_box, row.events, synced_ms,
+            ]
+        for row in reversed(feed):
+            if row.ts.astimezone(timezone.utc).date() != day:
+                continue
+            self.feed.append(FeedRow(
+                row.received_at, row.ts, row.operator, row.type, row.client or '',
+                row.city or '', row.box or '', row.code or '', str(row.uuid), synced_ms,
+            ))
+        self.feed_complete = len(feed) < self.feed_size
+        self._snapshot = Snapshot(snapshot)
+        self.synced_ms = synced_ms
+        self.ready = True
+
+        LIVE_HYDRATIONS.inc()
+        LIVE_GROUPS.set(len(self.groups))
+        self._notify(None)
+        logger.info(f"📡 Live state hydrated: {day}, {len(self.groups)} groups, {len(self.feed)} feed events")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._inbox.put_nowait(payload)
+
+    async def _listen_once(self) -> None:
+        """Одно подключение: LISTEN → гидратация → применение сообщений до обрыва"""
+        dsn = make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        conn = await asyncpg.connect(dsn)
+        try:
+            # LISTEN до гидратации: сообщения, пришедшие во время чтения снимка,
+            # ждут в очереди и фильтруются по снимку
+            await conn.add_listener(self.channel, self._on_notify)
+            await self.hydrate()
+
+            while not conn.is_closed():
+                try:
+                    payload = await asyncio.wait_for(self._inbox.get(), timeout=5)
+                except asyncio.TimeoutError:
+                    if self.day != utc_today():
+                        await self.hydrate()
+                    continue
+                if not self.apply_message(payload):
+                    await self.hydrate()
+        finally:
+            self.ready = False
+            if not conn.is_closed():
+                await conn.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Live state listener failed: {e}", exc_info=True)
+            # Пропущенные за время обрыва сообщения покроет новая гидратация
+            self._inbox = asyncio.Queue()
+            await asyncio.sleep(1)
+
+    async def start(self):
+        """Запустить слушатель (lifespan startup)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton
+live_state = LiveState(
+    channel=settings.LIVE_STATE_CHANNEL,
+    feed_size=settings.LIVE_STATE_FEED_SIZE,
+    enabled=settings.LIVE_STATE_ENABLED,
+)
@@ -0,0 +1,192 @@
+"""
+Live поток dashboard (Server-Sent Events) вместо опроса /state
+
+Источник изменений - app.services.live_state: каждый uvicorn воркер уже
+получает все вставки через LISTEN/NOTIFY, поэтому клиент может быть
+подключен к любому воркеру и видит изменения всех воркеров.
+
+Подписки группируются по фильтру (operator, client, city) - scope.
+Изменение считается один раз на scope (render_delta) и одной строкой bytes
+кладется в очереди всех подписчиков scope - стоимость не растет с числом
+открытых браузеров.
+
+Backpressure: у подписчика ограниченная очередь (LIVE_STREAM_QUEUE_SIZE).
+Если клиент не успевает читать и очередь заполнилась, она очищается,
+клиенту отправляется reset и поток закрывается - EventSource переподключится
+и получит свежий snapshot вместо накопленного хвоста.
+
+События SSE:
+- snapshot: полный DashboardStateResponse (при подключении)
+- delta:    новые события ленты, обновленные операторы/клиенты, сводка
+- status:   операторы, у которых сменился онлайн-статус
+- reset:    состояние перечитано из БД или клиент отстал - переподключиться
+"""
+from prometheus_client import Counter, Gauge
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+from app.config import settings
+from app.services.live_state import FeedRow, live_state
+
+logger = logging.getLogger(__name__)
+
+Filters = Tuple[Optional[str], Optional[str], Optional[str]]
+
+STREAM_SUBSCRIBERS = Gauge("live_stream_subscribers", "Подключенные SSE клиенты dashboard")
+STREAM_SCOPES = Gauge("live_stream_scopes", "Уникальные фильтры SSE подписок")
+STREAM_MESSAGES = Counter("live_stream_messages_total", "Сообщения SSE (на scope)", ["event"])
+STREAM_OVERFLOWS = Counter("live_stream_overflows_total", "Отключения медленных SSE клиентов")
+
+
+def sse(event: str, data: str) -> bytes:
+    """Одно событие text/event-stream (data - JSON в одну строку)"""
+    return f"event: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+RESET = sse("reset", "{}")
+PING = b": ping\n\n"
+# Пауза EventSource перед переподключением, мс
+RETRY = b"retry: 1000\n\n"
+
+
+class Scope:
+    """Подписчики с одинаковым фильтром"""
+
+    def __init__(self, filters: Filters):
+        self.filters = filters
+        self.subscribers: Set[asyncio.Queue] = set()
+        # Состояние renderer-а (например, последний онлайн-статус операторов)
+        self.state: dict = {}
+
+
+class LiveHub:
+    """Раздача изменений live_state подписчикам SSE внутри воркера"""
+
+    def __init__(self, queue_size: int, heartbeat_seconds: int, status_seconds: int):
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.status_seconds = status_seconds
+
+        self.scopes: Dict[Filters, Scope] = {}
+        # render_delta(scope, rows) / render_status(scope) → JSON или None
+        self.render_delta: Optional[Callable[[Scope, List[FeedRow]], Optional[str]]] = None
+        self.render_status: Optional[Callable[[Scope], Optional[str]]] = None
+
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(self, render_delta, render_status) -> None:
+        """Функции формирования сообщений (задает API слой)"""
+        self.render_delta = render_delta
+        self.render_status = render_status
+
+    # === подписки ===
+
+    def subscribe(self, filters: Filters) -> Tuple[Scope, asyncio.Queue]:
+        scope = self.scopes.get(filters)
+        if scope is None:
+            scope = self.scopes[filters] = Scope(filters)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        scope.subscribers.add(queue)
+        self._update_gauges()
+        return scope, queue
+
+    def unsubscribe(self, scope: Scope, queue: asyncio.Queue) -> None:
+        scope.subscribers.discard(queue)
+        if not scope.subscribers and self.scopes.get(scope.filters) is scope:
+            del self.scopes[scope.filters]
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        STREAM_SCOPES.set(len(self.scopes))
+        STREAM_SUBSCRIBERS.set(sum(len(s.subscribers) for s in self.scopes.values()))
+
+    # === рассылка ===
+
+    def _broadcast(self, scope: Scope, message: bytes) -> None:
+        for queue in list(scope.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Клиент отстал: хвост не нужен, пусть переподключится
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESET)
+                STREAM_OVERFLOWS.inc()
+
+    def on_change(self, rows: Optional[List[FeedRow]]) -> None:
+        """Слушатель live_state: rows - новые события, None - состояние перечитано"""
+        if rows is None:
+            for scope in list(self.scopes.values()):
+                self._broadcast(scope, RESET)
+            STREAM_MESSAGES.labels("reset").inc(len(self.scopes))
+            return
+
+        for scope in list(self.scopes.values()):
+            try:
+                data = self.render_delta(scope, rows)
+            except Exception as e:
+                # Ошибка одного фильтра не должна ломать остальные scope;
+                # его подписчики пропустили дельту - пусть перечитают snapshot
+                logger.error(f"❌ Live stream delta failed for {scope.filters}: {e}", exc_info=True)
+                self._broadcast(scope, RESET)
+                STREAM_MESSAGES.labels("reset").inc()
+                continue
+            if data is not None:
+                self._broadcast(scope, sse("delta", data))
+                STREAM_MESSAGES.labels("delta").inc()
+
+    async def _status_loop(self) -> None:
+        """Онлайн-статус меняется и без событий (оператор замолчал)"""
+        while True:
+            await asyncio.sleep(self.status_seconds)
+            for scope in list(self.scopes.values()):
+                try:
+                    data = self.render_status(scope)
+                except Exception as e:
+                    logger.error(f"❌ Live stream status failed: {e}", exc_info=True)
+                    continue
+                if data is not None:
+                    self._broadcast(scope, sse("status", data))
+                    STREAM_MESSAGES.labels("status").inc()
+
+    async def stream(self, scope: Scope, queue: asyncio.Queue, first: bytes) -> AsyncIterator[bytes]:
+        """Тело StreamingResponse: первое сообщение, затем очередь подписчика"""
+        try:
+            yield RETRY + first
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield PING
+                    continue
+                yield message
+                if message is RESET:
+                    return
+        finally:
+            self.unsubscribe(scope, queue)
+
+    # === lifespan ===
+
+    async def start(self):
+        """Подписаться на live_state и запустить проверку статусов (lifespan startup)"""
+        if live_state.enabled and self._task is None:
+            live_state.add_listener(self.on_change)
+            self._task = asyncio.create_task(self._status_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton
+live_hub = LiveHub(
+    queue_size=settings.LIVE_STREAM_QUEUE_SIZE,
+    heartbeat_seconds=settings.LIVE_STREAM_HEARTBEAT_SECONDS,
+    status_seconds=settings.LIVE_STREAM_STATUS_SECONDS,
+)
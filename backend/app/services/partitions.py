@@ -0,0 +1,247 @@
+"""
+Секционирование events по месяцам: PARTITION BY RANGE (ts)
+
+events - секционированная таблица: events_pYYYYMM на каждый месяц (UTC)
+и events_default для ts вне созданных секций (часы сканера ушли далеко в
+прошлое или будущее). Все dashboard/export запросы фильтруют по ts,
+поэтому Postgres читает только секции периода (partition pruning,
+проверка - scripts/check_partition_pruning.py).
+
+Обслуживание (один воркер, pg_advisory_lock) при старте и раз в
+EVENTS_PARTITION_CHECK_SECONDS:
+- секции на EVENTS_PARTITION_PREMAKE_MONTHS месяцев вперед и для прошлых
+  месяцев, строки которых попали в events_default (импорт истории). Секция
+  создается отдельной таблицей и подключается ATTACH PARTITION: это
+  SHARE UPDATE EXCLUSIVE на events, вставки сканеров не блокируются
+  (CREATE TABLE ... PARTITION OF берет ACCESS EXCLUSIVE). Строки этого
+  месяца из events_default переносятся в секцию в той же транзакции.
+- секции старше EVENTS_RETENTION_MONTHS отключаются (DETACH PARTITION);
+  при EVENTS_RETENTION_ACTION="drop" таблица удаляется, при "detach"
+  остается вне events для архива (pg_dump / ручной DROP). uuid событий
+  месяца освобождаются в event_uuids в той же транзакции.
+
+DDL выполняется с lock_timeout (EVENTS_PARTITION_LOCK_TIMEOUT_MS): если
+events занята долгим запросом, попытка повторится в следующем цикле.
+
+Агрегаты event_daily_stats / box_daily_stats за отключенные месяцы
+остаются: сводки /state и /boxes сохраняются, а лента, /raw и товары
+коробов за эти дни пустые.
+"""
+from sqlalchemy import delete, text
+from prometheus_client import Counter, Gauge
+from typing import Dict, List, Optional
+from datetime import date, datetime, timezone
+import asyncio
+import logging
+import re
+
+from app.config import settings
+from app.database import engine
+from app.models.event import EventUUID
+from app.services import data_version, day_snapshots
+
+logger = logging.getLogger(__name__)
+
+PARENT = "events"
+DEFAULT_PARTITION = "events_default"
+PARTITION_RE = re.compile(r"^events_p(\d{4})(\d{2})$")
+
+# Ключ pg_advisory_lock: секции обслуживает только один воркер
+PARTITION_LOCK_ID = 0x5CA7_0002
+
+PARTITIONS = Gauge("events_partitions", "Месячные секции events")
+PARTITIONS_CREATED = Counter("events_partitions_created_total", "Созданные секции events")
+PARTITIONS_DETACHED = Counter("events_partitions_detached_total", "Отключенные по retention секции events")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Секция месяца: events_pYYYYMM"""
+    return f"events_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """events_pYYYYMM → первое число месяца; None для прочих таблиц"""
+    match = PARTITION_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partition_bounds(month: date) -> tuple[datetime, datetime]:
+    """[начало месяца, начало следующего) в UTC"""
+    start = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+    end_month = add_months(month, 1)
+    return start, datetime(end_month.year, end_month.month, 1, tzinfo=timezone.utc)
+
+
+def partitions_for(start: datetime, end: datetime) -> List[str]:
+    """Секции, которые должен читать запрос с ts в [start, end]"""
+    month = month_start(start.astimezone(timezone.utc).date())
+    last = month_start(end.astimezone(timezone.utc).date())
+    names = []
+    while month <= last:
+        names.append(partition_name(month))
+        month = add_months(month, 1)
+    return names
+
+
+async def is_partitioned(conn) -> bool:
+    """events уже секционирована (миграция 0005 выполнена)"""
+    return bool((await conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:parent))"
+    ), {"parent": PARENT})).scalar())
+
+
+async def list_partitions(conn) -> List[str]:
+    """Подключенные к events секции (включая events_default)"""
+    rows = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:parent) ORDER BY c.relname"
+    ), {"parent": PARENT})
+    return [row[0] for row in rows]
+
+
+async def default_months(conn) -> List[date]:
+    """Месяцы, строки которых лежат в events_default (импорт истории, часы сканера)"""
+    rows = await conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', timezone('UTC', ts))::date FROM {DEFAULT_PARTITION}"
+    ))
+    return sorted(row[0] for row in rows)
+
+
+async def _lock_timeout(conn) -> None:
+    await conn.execute(text(f"SET LOCAL lock_timeout = {int(settings.EVENTS_PARTITION_LOCK_TIMEOUT_MS)}"))
+
+
+async def create_partition(conn, month: date) -> None:
+    """
+    Создать и подключить секцию месяца (одна транзакция)
+
+    Строки месяца, уже попавшие в events_default, переносятся в новую
+    таблицу до ATTACH - иначе ATTACH откажет (пересечение с DEFAULT).
+    """
+    name = partition_name(month)
+    start, end = partition_bounds(month)
+    async with conn.begin():
+        await _lock_timeout(conn)
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        ))
+        moved = await conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), {"start": start, "end": end})
+        await conn.execute(text(
+            f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+    PARTITIONS_CREATED.inc()
+    logger.info(f"🗂️ Partition {name} attached ({moved.rowcount or 0} rows moved from {DEFAULT_PARTITION})")
+
+
+async def detach_partition(conn, name: str, drop: bool) -> None:
+    """Отключить секцию от events (и удалить при drop)"""
+    start, end = partition_bounds(partition_month(name))
+    async with conn.begin():
+        await _lock_timeout(conn)
+        await conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+        if drop:
+            await conn.execute(text(f"DROP TABLE {name}"))
+        # uuid событий месяца больше не заняты (BRIN по ts)
+        await conn.execute(delete(EventUUID).where(EventUUID.ts >= start, EventUUID.ts < end))
+        await day_snapshots.drop_days(conn, start.date(), end.date())
+    PARTITIONS_DETACHED.inc()
+    logger.info(f"🗂️ Partition {name} {'dropped' if drop else 'detached'} (retention)")
+
+    # События месяца пропали из /raw, ленты и товаров коробов
+    await data_version.bump(data_version.days_between(start.date(), end.date()))
+
+
+async def maintain_partitions(conn, today: Optional[date] = None) -> Dict[str, List[str]]:
+    """
+    Создать недостающие секции и применить retention
+
+    conn - AsyncConnection без открытой транзакции: каждая операция
+    выполняется отдельной короткой транзакцией.
+    """
+    result: Dict[str, List[str]] = {"created": [], "detached": []}
+    if not await is_partitioned(conn):
+        logger.warning("⚠️ events is not partitioned yet (alembic upgrade head), skipping partition maintenance")
+        await conn.rollback()
+        return result
+
+    existing = set(await list_partitions(conn))
+    await conn.rollback()
+
+    if DEFAULT_PARTITION not in existing:
+        async with conn.begin():
+            await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+    current = month_start(today or datetime.now(timezone.utc).date())
+    horizon = add_months(current, settings.EVENTS_PARTITION_PREMAKE_MONTHS)
+    months = {add_months(current, offset) for offset in range(settings.EVENTS_PARTITION_PREMAKE_MONTHS + 1)}
+    # Прошлые месяцы из DEFAULT получают свои секции; будущее дальше горизонта
+    # (сбитые часы) остается в DEFAULT
+    months.update(month for month in await default_months(conn) if month <= horizon)
+    await conn.rollback()
+
+    for month in sorted(months):
+        if partition_name(month) not in existing:
+            await create_partition(conn, month)
+            result["created"].append(partition_name(month))
+
+    if settings.EVENTS_RETENTION_MONTHS > 0:
+        cutoff = add_months(current, -settings.EVENTS_RETENTION_MONTHS)
+        drop = settings.EVENTS_RETENTION_ACTION == "drop"
+        for name in sorted(existing):
+            month = partition_month(name)
+            if month is not None and month < cutoff:
+                await detach_partition(conn, name, drop)
+                result["detached"].append(name)
+
+    months = [name for name in existing if partition_month(name)]
+    PARTITIONS.set(len(months) + len(result["created"]) - len(result["detached"]))
+    return result
+
+
+async def _maintain_locked(blocking: bool) -> None:
+    async with engine.connect() as conn:
+        lock = "pg_advisory_lock" if blocking else "pg_try_advisory_lock"
+        locked = (await conn.execute(text(f"SELECT {lock}(:id)"), {"id": PARTITION_LOCK_ID})).scalar()
+        await conn.commit()
+        if not locked:
+            return
+        try:
+            await maintain_partitions(conn)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": PARTITION_LOCK_ID})
+            await conn.commit()
+
+
+async def ensure_partitions() -> None:
+    """При старте: секции текущего и следующих месяцев должны быть до первой вставки"""
+    try:
+        await _maintain_locked(blocking=True)
+    except Exception as e:
+        logger.error(f"❌ Partition maintenance failed: {e}", exc_info=True)
+
+
+async def partition_loop():
+    """Фоновая задача: раз в EVENTS_PARTITION_CHECK_SECONDS создает секции и применяет retention"""
+    while True:
+        await asyncio.sleep(settings.EVENTS_PARTITION_CHECK_SECONDS)
+        try:
+            await _maintain_locked(blocking=False)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Partition maintenance failed: {e}", exc_info=True)
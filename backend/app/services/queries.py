@@ -0,0 +1,405 @@
+"""
+Query layer для dashboard и экспортов: агрегация на стороне Postgres
+
+Эндпоинты получают уже сгруппированные строки и только нужные колонки
+(Row tuples, без ORM Event). Память и время Python не растут с диапазоном дат:
+- /state: агрегаты event_daily_stats (GROUP BY, DISTINCT ON operator)
+  + лента ORDER BY received_at DESC LIMIT 100
+- /boxes: сводки коробов из box_daily_stats (страница групп клиент/город),
+  товары короба - колонки ITEM строк отдельным запросом при раскрытии
+- /raw: keyset пагинация по (received_at, uuid) + оценка общего числа,
+  даты форматируются в SQL, строки сериализуются orjson без моделей
+- CSV: только колонки файла
+"""
+from sqlalchemy import select, func, cast, extract, literal_column, and_, or_, text, tuple_, BigInteger, Text
+from sqlalchemy.dialects import postgresql
+from datetime import datetime
+from typing import List, Optional, Tuple
+import base64
+import json
+import uuid as uuid_lib
+
+from app.models.event import Event, box_no_sql
+from app.models.stats import EventDailyStats, BoxDailyStats
+
+# Константы в выражениях GROUP BY рендерятся литералами, а не bind параметрами:
+# иначе Postgres не сопоставит выражение в SELECT с выражением в GROUP BY
+EMPTY = literal_column("''")
+DASH = literal_column("'—'")
+# Условие частичного индекса idx_events_box_items: литерал, чтобы индекс
+# подходил и generic плану prepared statement
+ITEM = literal_column("'ITEM'")
+
+# Номер короба как в dashboard.extract_box_number (то же выражение, что в индексе)
+BOX_NO = box_no_sql(Event.box)
+
+CLIENT_OR_DASH = func.coalesce(func.nullif(Event.client, EMPTY), DASH)
+CITY_OR_DASH = func.coalesce(func.nullif(Event.city, EMPTY), DASH)
+
+
+def event_filters(
+    start: datetime,
+    end: datetime,
+    operator: Optional[str] = None,
+    client: Optional[str] = None,
+    city: Optional[str] = None,
+    event_type: Optional[str] = None,
+) -> List:
+    """WHERE для events: период [start, end], живые строки, фильтры dashboard"""
+    where = [Event.ts >= start, Event.ts <= end, Event.deleted_at.is_(None)]
+    if operator:
+        where.append(Event.operator == operator)
+    if client:
+        where.append(Event.client == client)
+    if city:
+        where.append(Event.city == city)
+    if event_type:
+        where.append(Event.type == event_type)
+    return where
+
+
+def stats_filters(
+    start: datetime,
+    end: datetime,
+    operator: Optional[str] = None,
+    client: Optional[str] = None,
+    city: Optional[str] = None,
+) -> List:
+    """WHERE для event_daily_stats: те же фильтры по дням"""
+    where = [EventDailyStats.day >= start.date(), EventDailyStats.day <= end.date()]
+    if operator:
+        where.append(EventDailyStats.operator == operator)
+    if client:
+        where.append(EventDailyStats.client == client)
+    if city:
+        where.append(EventDailyStats.city == city)
+    return where
+
+
+# === /state ===
+
+async def operator_rows(db, where: List):
+    """
+    Строка на оператора: суммы за период + группа с последним событием
+
+        SELECT DISTINCT ON (operator) operator, client, city, last_box, last_received_at,
+               sum(items) OVER w, sum(errors) OVER w
+        ... ORDER BY operator, last_received_at DESC
+    """
+    s = EventDailyStats
+    per_operator = {"partition_by": s.operator}
+    stmt = (
+        select(
+            s.operator,
+            s.client,
+            s.city,
+            s.last_box,
+            s.last_received_at,
+            func.sum(s.items).over(**per_operator).label("items"),
+            func.sum(s.errors).over(**per_operator).label("errors"),
+        )
+        .where(*where)
+        .distinct(s.operator)
+        .order_by(s.operator, s.last_received_at.desc())
+    )
+    return (await db.execute(stmt)).all()
+
+
+async def client_rows(db, where: List):
+    """Строка на клиента ('' - без клиента): суммы ITEM/BOX/CLOSE/ERROR"""
+    s = EventDailyStats
+    stmt = (
+        select(
+            s.client,
+            func.sum(s.items).label("items"),
+            func.sum(s.boxes_open).label("boxes_open"),
+            func.sum(s.boxes_close).label("boxes_close"),
+            func.sum(s.errors).label("errors"),
+        )
+        .where(*where)
+        .group_by(s.client)
+    )
+    return (await db.execute(stmt)).all()
+
+
+async def city_list(db, where: List) -> List[str]:
+    """Города за период (для фильтра), без пустого"""
+    s = EventDailyStats
+    stmt = select(s.city).where(*where, s.city != '').distinct().order_by(s.city)
+    return list((await db.execute(stmt)).scalars())
+
+
+async def feed_rows(db, where: List, limit: int = 100):
+    """Последние события по received_at (только колонки FeedEvent)"""
+    stmt = (
+        select(
+            Event.ts, Event.operator, Event.type, Event.client, Event.city, Event.box, Event.code, Event.uuid
+        )
+        .where(*where)
+        .order_by(Event.received_at.desc())
+        .limit(limit)
+    )
+    return (await db.execute(stmt)).all()
+
+
+# === /boxes ===
+
+def box_stats_filters(
+    start: datetime,
+    end: datetime,
+    operator: Optional[str] = None,
+    client: Optional[str] = None,
+    city: Optional[str] = None,
+) -> List:
+    """WHERE для box_daily_stats: те же фильтры по дням"""
+    where = [BoxDailyStats.day >= start.date(), BoxDailyStats.day <= end.date()]
+    if operator:
+        where.append(BoxDailyStats.operator == operator)
+    if client:
+        where.append(BoxDailyStats.client == client)
+    if city:
+        where.append(BoxDailyStats.city == city)
+    return where
+
+
+async def box_group_rows(db, where: List, limit: Optional[int] = None, offset: int = 0):
+    """
+    Страница групп (клиент, город) по убыванию товаров
+
+    total_groups - число групп без учета limit/offset (window count).
+    """
+    b = BoxDailyStats
+    items = func.sum(b.items)
+    stmt = (
+        select(
+            b.client,
+            b.city,
+            items.label("items"),
+            func.count(func.distinct(b.box_no)).label("boxes"),
+            func.count().over().label("total_groups"),
+        )
+        .where(*where)
+        .group_by(b.client, b.city)
+        .order_by(items.desc(), b.client, b.city)
+        .offset(offset)
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return (await db.execute(stmt)).all()
+
+
+async def box_summary_rows(db, where: List, groups: List):
+    """Строка на короб групп (клиент, город): товары, границы по ts, операторы"""
+    b = BoxDailyStats
+    stmt = (
+        select(
+            b.client,
+            b.city,
+            b.box_no,
+            func.sum(b.items).label("items"),
+            func.sum(b.closes).label("closes"),
+            func.min(b.first_ts).label("first_ts"),
+            func.max(b.last_ts).label("last_ts"),
+            func.array_remove(
+                func.array_agg(func.distinct(func.nullif(b.operator, EMPTY))), None
+            ).label("operators"),
+        )
+        .where(*where, tuple_(b.client, b.city).in_(groups))
+        .group_by(b.client, b.city, b.box_no)
+    )
+    return (await db.execute(stmt)).all()
+
+
+def box_filter(client: str, city: str, box_no: str) -> List:
+    """WHERE для events одного короба ('—' - клиент/город не указан)"""
+    # Известный клиент/город - равенство по колонке (индекс), иначе по выражению
+    return [
+        Event.client == client if client != '—' else CLIENT_OR_DASH == client,
+        Event.city == city if city != '—' else CITY_OR_DASH == city,
+        BOX_NO == box_no,
+    ]
+
+
+async def box_item_rows(db, where: List):
+    """ITEM события для списка товаров короба (по ts)"""
+    stmt = (
+        select(
+            CLIENT_OR_DASH.label("client"),
+            CITY_OR_DASH.label("city"),
+            BOX_NO.label("box_no"),
+            Event.uuid,
+            Event.ts,
+            Event.code,
+            Event.operator,
+        )
+        .where(*where, Event.type == ITEM)
+        .order_by(Event.ts)
+    )
+    return (await db.execute(stmt)).all()
+
+
+# === /raw ===
+
+def encode_cursor(received_at: datetime, uuid) -> str:
+    """Непрозрачный курсор следующей страницы: последняя строка (received_at, uuid)"""
+    raw = json.dumps([received_at.isoformat(), str(uuid)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid_lib.UUID]:
+    """Курсор → (received_at, uuid); ValueError для испорченного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        received_at, uuid = json.loads(raw)
+        return datetime.fromisoformat(received_at), uuid_lib.UUID(uuid)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(received_at: datetime, uuid) -> list:
+    """
+    Строки после курсора в порядке received_at DESC, uuid DESC
+
+    received_at <= :r выделено отдельно - граница обратного прохода по idx_events_feed (received_at, uuid),
+    uuid различает строки с одинаковым received_at (один батч).
+    """
+    return [
+        Event.received_at <= received_at,
+        or_(Event.received_at < received_at, and_(Event.received_at == received_at, Event.uuid < uuid)),
+    ]
+
+
+# Формат format_datetime в to_char (dashboard: "%d.%M.%Y %H:%M:%S", поле месяца - минуты)
+RAW_DATETIME_FORMAT = literal_column("'DD.MI.YYYY HH24:MI:SS'")
+UTC = literal_column("'UTC'")
+
+
+def formatted_datetime(column):
+    """format_datetime на стороне Postgres (timestamptz → текст в UTC)"""
+    return func.to_char(func.timezone(UTC, column), RAW_DATETIME_FORMAT)
+
+
+def epoch_ms(column):
+    """int(dt.timestamp() * 1000) на стороне Postgres"""
+    return cast(func.floor(extract("epoch", column) * literal_column("1000")), BigInteger)
+
+
+# Колонки /raw под именами полей RawLogEvent: строки сразу сериализуются в JSON,
+# без ORM Event и pydantic моделей
+RAW_COLUMNS = [
+    cast(Event.uuid, Text).label("uuid"),
+    formatted_datetime(Event.ts).label("ts"),
+    Event.type.label("type"),
+    func.coalesce(Event.operator, EMPTY).label("operator"),
+    func.coalesce(Event.client, EMPTY).label("client"),
+    func.coalesce(Event.city, EMPTY).label("city"),
+    func.coalesce(Event.box, EMPTY).label("box"),
+    func.coalesce(Event.code, EMPTY).label("code"),
+    Event.details.label("details"),
+    formatted_datetime(Event.received_at).label("receivedAt"),
+    Event.source.label("source"),
+    epoch_ms(Event.ts).label("tsMs"),
+    epoch_ms(Event.received_at).label("receivedAtMs"),
+]
+RAW_FIELDS = tuple(column.key for column in RAW_COLUMNS)
+
+
+async def raw_page(db, where: List, limit: int):
+    """
+    Страница /raw: limit + 1 строк (лишняя - признак следующей страницы)
+
+    Строка - кортеж RAW_FIELDS + received_at (для курсора последней строки).
+    """
+    stmt = (
+        select(*RAW_COLUMNS, Event.received_at)
+        .where(*where)
+        .order_by(Event.received_at.desc(), Event.uuid.desc())
+        .limit(limit + 1)
+    )
+    return (await db.execute(stmt)).all()
+
+
+# Счетчики event_daily_stats по типу события
+STAT_BY_TYPE = {
+    'ITEM': EventDailyStats.items,
+    'BOX': EventDailyStats.boxes_open,
+    'CLOSE': EventDailyStats.boxes_close,
+    'ERROR': EventDailyStats.errors,
+}
+
+
+async def estimate_event_count(
+    db,
+    start: datetime,
+    end: datetime,
+    operator: Optional[str] = None,
+    client: Optional[str] = None,
+    city: Optional[str] = None,
+    event_type: Optional[str] = None,
+) -> int:
+    """
+    Быстрая оценка числа событий под фильтр без чтения строк events
+
+    - без типа или ITEM/BOX/CLOSE/ERROR: сумма event_daily_stats за дни периода
+      (точно, если агрегаты актуальны)
+    - прочие типы: оценка планировщика (EXPLAIN) - O(1), но приблизительно
+    """
+    column = EventDailyStats.events if not event_type else STAT_BY_TYPE.get(event_type)
+    if column is not None:
+        stmt = select(func.coalesce(func.sum(column), 0)).where(
+            *stats_filters(start, end, operator, client, city)
+        )
+        return int((await db.execute(stmt)).scalar())
+
+    stmt = select(Event.uuid).where(*event_filters(start, end, operator, client, city, event_type))
+    compiled = stmt.compile(dialect=postgresql.dialect(paramstyle="named"))
+    plan = (await db.execute(text("EXPLAIN (FORMAT JSON) " + str(compiled)), compiled.params)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+# === CSV ===
+
+EXPORT_COLUMNS = (
+    Event.uuid, Event.ts, Event.type, Event.operator, Event.client, Event.city,
+    Event.box, Event.code, Event.details, Event.received_at, Event.source,
+)
+
+
+def export_statement(where: List, by_client: bool = False):
+    """Колонки /export/csv в порядке ts (by_client - по клиенту, затем ts: файл на клиента в zip)"""
+    order = (Event.client, Event.ts.asc()) if by_client else (Event.ts.asc(),)
+    return select(*EXPORT_COLUMNS).where(*where).order_by(*order)
+
+
+def box_export_statement(where: List):
+    """
+    Колонки /export/boxes-csv: ITEM события по клиенту, городу, коробу, ts
+
+    Ключ events - (uuid, ts): повторная отправка события с другим ts дает
+    вторую строку с тем же uuid. В выгрузку попадает первая полученная
+    (DISTINCT ON (uuid) по received_at).
+    """
+    items = (
+        select(Event.uuid, Event.client, Event.city, Event.box, Event.code, Event.ts, Event.operator)
+        .where(*where, Event.type == ITEM)
+        .distinct(Event.uuid)
+        .order_by(Event.uuid, Event.received_at)
+        .subquery()
+    )
+    return (
+        select(items.c.client, items.c.city, items.c.box, items.c.code, items.c.ts, items.c.operator)
+        .order_by(items.c.client, items.c.city, items.c.box, items.c.ts)
+    )
+
+
+async def stream_rows(db, stmt, chunk_rows: int):
+    """
+    Строки stmt частями по chunk_rows через server-side cursor
+
+    В памяти одновременно не больше chunk_rows строк, сколько бы их ни было.
+    """
+    result = await db.stream(stmt.execution_options(yield_per=chunk_rows))
+    async for rows in result.partitions():
+        yield rows
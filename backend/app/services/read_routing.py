@@ -0,0 +1,213 @@
+"""
+Маршрутизация чтений dashboard/export на read реплику
+
+Большой экспорт или /raw на 10000 строк не должен конкурировать с ingest
+сканеров за соединения и shared buffers primary. При DATABASE_READ_URL
+GET эндпоинты dashboard и экспорта получают сессию через get_read_db:
+
+- реплика недоступна или отстает больше READ_REPLICA_MAX_LAG_SECONDS → primary
+- запрос с токеном X-Read-After (выдается /remove и /bulk-remove), а
+  реплика еще не применила WAL до этой позиции → primary (read-your-writes)
+- иначе → реплика
+
+Отставание каждый воркер замеряет раз в READ_REPLICA_CHECK_SECONDS
+(pg_last_xact_replay_timestamp / pg_last_wal_replay_lsn на реплике), а не
+на каждый запрос. Токен - позиция WAL primary после commit удаления и
+время выдачи: "<lsn>@<unix ms>". Токены старше READ_YOUR_WRITES_SECONDS
+игнорируются.
+
+Запрос с действующим токеном не читает кэш ответов (cache.py): запись
+могла быть посчитана на отстающей реплике уже с новыми версиями данных.
+Ответ такого запроса перезаписывает запись кэша.
+
+Без DATABASE_READ_URL get_read_db отдает сессию primary, как get_db.
+Проверка на двух Postgres со streaming replication -
+docker-compose.replica.yml и scripts/check_read_routing.py.
+"""
+from contextlib import asynccontextmanager
+from fastapi import Header
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Tuple
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.database import AsyncSessionLocal, ReadSessionLocal, read_engine
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "X-Read-After"
+# Метка сессии: действующий токен read-your-writes (cache.py не читает кэш)
+FRESH_READ = "read_your_writes"
+
+REPLICA_LAG = Gauge("read_replica_lag_seconds", "Отставание read реплики (последний замер)")
+REPLICA_UP = Gauge("read_replica_up", "Read реплика доступна (последний замер)")
+READ_ROUTES = Counter("db_read_routes_total", "Чтения dashboard/export по базам", ["target", "reason"])
+
+# Отставание на реплике: 0, если весь полученный WAL применен (нет записи на
+# primary - replay_timestamp не растет, но реплика не отстает)
+LAG_SQL = text("""
+    SELECT
+        pg_is_in_recovery(),
+        CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END::text,
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+""")
+
+
+def parse_lsn(lsn: str) -> int:
+    """'16/B374D848' → позиция WAL числом"""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def parse_token(token: Optional[str], ttl_seconds: float) -> Optional[int]:
+    """LSN из токена X-Read-After; None - токена нет, он поврежден или устарел"""
+    if not token:
+        return None
+    try:
+        lsn, issued_ms = token.strip().split("@")
+        if time.time() - int(issued_ms) / 1000 > ttl_seconds:
+            return None
+        return parse_lsn(lsn)
+    except ValueError:
+        return None
+
+
+async def write_token(db) -> str:
+    """
+    Токен read-your-writes: позиция WAL primary после commit
+
+    Вызывается после db.commit(): pg_current_wal_insert_lsn не меньше
+    конца записи commit-а, даже если WAL еще не сброшен на диск
+    (synchronous_commit=off).
+    """
+    lsn = (await db.execute(text("SELECT pg_current_wal_insert_lsn()::text"))).scalar()
+    return f"{lsn}@{int(time.time() * 1000)}"
+
+
+class ReadRouter:
+    """Выбор базы для чтения по отставанию реплики и токену read-your-writes"""
+
+    def __init__(self, engine=None, max_lag_seconds: float = 5.0, check_seconds: float = 1.0,
+                 token_ttl_seconds: float = 60):
+        self.engine = engine
+        self.max_lag_seconds = max_lag_seconds
+        self.check_seconds = check_seconds
+        self.token_ttl_seconds = token_ttl_seconds
+
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.replay_lsn: Optional[int] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine is not None
+
+    async def check(self) -> None:
+        """Замерить отставание реплики (ошибка - реплика считается недоступной)"""
+        try:
+            async with self.engine.connect() as conn:
+                in_recovery, lsn, lag = (await conn.execute(LAG_SQL)).one()
+            if not in_recovery and self.checked_at is None:
+                logger.warning("⚠️ DATABASE_READ_URL is not a standby (pg_is_in_recovery() = false)")
+            self.lag = float(lag)
+            self.replay_lsn = parse_lsn(lsn)
+            self.healthy = True
+        except Exception as e:
+            if self.healthy or self.checked_at is None:
+                logger.warning(f"⚠️ Read replica unavailable, reading from primary: {e}")
+            self.healthy = False
+        self.checked_at = time.monotonic()
+        REPLICA_UP.set(1 if self.healthy else 0)
+        if self.lag is not None:
+            REPLICA_LAG.set(self.lag)
+
+    def choose(self, token: Optional[str] = None) -> Tuple[bool, str]:
+        """(читать с реплики, причина)"""
+        if not self.enabled:
+            return False, "disabled"
+        # Замер устарел (цикл замеров завис) - отставание неизвестно
+        stale = self.checked_at is None or time.monotonic() - self.checked_at > max(5 * self.check_seconds, 5)
+        if not self.healthy or stale:
+            return False, "replica_down"
+        if self.lag > self.max_lag_seconds:
+            return False, "lag"
+        token_lsn = parse_token(token, self.token_ttl_seconds)
+        if token_lsn is not None and (self.replay_lsn is None or self.replay_lsn < token_lsn):
+            return False, "read_your_writes"
+        return True, "ok"
+
+    def is_fresh(self, token: Optional[str]) -> bool:
+        """Действующий токен read-your-writes (без реплики токен не нужен)"""
+        return self.enabled and parse_token(token, self.token_ttl_seconds) is not None
+
+    @asynccontextmanager
+    async def session(self, token: Optional[str] = None):
+        """Сессия на выбранной базе (для фоновых задач, например пересчета кэша)"""
+        replica, reason = self.choose(token)
+        READ_ROUTES.labels("replica" if replica else "primary", reason).inc()
+        factory = ReadSessionLocal if replica else AsyncSessionLocal
+        async with factory() as session:
+            session.info["replica"] = replica
+            session.info[FRESH_READ] = self.is_fresh(token)
+            yield session
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_seconds)
+            await self.check()
+
+    async def start(self):
+        """Запустить замеры отставания (первый - до приема запросов)"""
+        if self.enabled and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton instance (замеры запускаются в lifespan при DATABASE_READ_URL)
+read_router = ReadRouter(
+    engine=read_engine,
+    max_lag_seconds=settings.READ_REPLICA_MAX_LAG_SECONDS,
+    check_seconds=settings.READ_REPLICA_CHECK_SECONDS,
+    token_ttl_seconds=settings.READ_YOUR_WRITES_SECONDS,
+)
+
+
+async def get_read_db(
+    x_read_after: Optional[str] = Header(None, description="Токен read-your-writes из ответа /remove")
+) -> AsyncSession:
+    """
+    Dependency для GET эндпоинтов dashboard/export: сессия реплики или primary
+
+    Usage:
+        @router.get("/raw")
+        async def endpoint(db: AsyncSession = Depends(get_read_db)):
+            ...
+    """
+    async with read_router.session(x_read_after) as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
@@ -0,0 +1,300 @@
+"""
+Поддержка дневных агрегатов event_daily_stats и сводок коробов box_daily_stats
+
+- add_rows: инкремент по вставленным строкам (ingest путь, та же транзакция)
+- refresh_groups / refresh_boxes: точный пересчет затронутых групп из events (удаление)
+- rebuild_days: пересчет целых дней (backfill / восстановление)
+"""
+from sqlalchemy import select, delete, func, case, and_, or_, tuple_, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert, aggregate_order_by
+from typing import Iterable, List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+
+from app.models.event import Event
+from app.models.stats import EventDailyStats, BoxDailyStats
+from app.services.queries import BOX_NO
+
+stats_table = EventDailyStats.__table__
+box_stats_table = BoxDailyStats.__table__
+
+# (day, operator, client, city)
+GroupKey = Tuple[date, str, str, str]
+
+STAT_COLUMNS = (
+    "day", "operator", "client", "city",
+    "items", "boxes_open", "boxes_close", "errors", "events",
+    "last_received_at", "last_box",
+)
+
+# (day, client, city, box_no, operator)
+BoxKey = Tuple[date, str, str, str, str]
+
+BOX_COLUMNS = (
+    "day", "client", "city", "box_no", "operator",
+    "items", "closes", "events", "first_ts", "last_ts",
+)
+
+# Счетчики по типу события
+TYPE_COUNTERS = {
+    "ITEM": "items",
+    "BOX": "boxes_open",
+    "CLOSE": "boxes_close",
+    "ERROR": "errors",
+}
+
+
+def event_day(ts: datetime) -> date:
+    """День события - дата ts в UTC"""
+    return ts.astimezone(timezone.utc).date()
+
+
+def group_key(row: dict) -> GroupKey:
+    return (event_day(row["ts"]), row["operator"], row["client"] or '', row["city"] or '')
+
+
+def box_number(box: Optional[str]) -> str:
+    """Номер короба после '/' (как dashboard.extract_box_number и queries.BOX_NO)"""
+    if not box:
+        return "—"
+    parts = box.split('/')
+    return parts[1] if len(parts) > 1 else box
+
+
+def box_key(row: dict) -> BoxKey:
+    return (
+        event_day(row["ts"]), row["client"] or '', row["city"] or '',
+        box_number(row["box"]), row["operator"],
+    )
+
+
+def _upsert_stmt():
+    stmt = pg_insert(stats_table)
+    excluded = stmt.excluded
+    c = stats_table.c
+    return stmt.on_conflict_do_update(
+        index_elements=[c.day, c.operator, c.client, c.city],
+        set_={
+            # c["items"]: c.items - это метод ColumnCollection
+            name: c[name] + excluded[name]
+            for name in ("items", "boxes_open", "boxes_close", "errors", "events")
+        } | {
+            "last_box": case(
+                (excluded.last_received_at >= c.last_received_at, excluded.last_box),
+                else_=c.last_box,
+            ),
+            "last_received_at": func.greatest(c.last_received_at, excluded.last_received_at),
+        },
+    )
+
+
+upsert_stats_stmt = _upsert_stmt()
+
+
+def _upsert_box_stmt():
+    stmt = pg_insert(box_stats_table)
+    excluded = stmt.excluded
+    c = box_stats_table.c
+    return stmt.on_conflict_do_update(
+        index_elements=[c.day, c.client, c.city, c.box_no, c.operator],
+        set_={
+            "items": c["items"] + excluded["items"],
+            "closes": c.closes + excluded.closes,
+            "events": c["events"] + excluded["events"],
+            "first_ts": func.least(c.first_ts, excluded.first_ts),
+            "last_ts": func.greatest(c.last_ts, excluded.last_ts),
+        },
+    )
+
+
+upsert_box_stats_stmt = _upsert_box_stmt()
+
+
+async def add_rows(db, rows: List[dict]) -> None:
+    """
+    Учесть вставленные строки в агрегатах (вызывать в транзакции вставки)
+
+    Ключи сортируются: параллельные транзакции блокируют строки агрегатов
+    в одном порядке и не ловят deadlock.
+    """
+    if not rows:
+        return
+
+    deltas = {}
+    for row in rows:
+        key = group_key(row)
+        stats = deltas.get(key)
+        if stats is None:
+            stats = deltas[key] = {
+                "day": key[0], "operator": key[1], "client": key[2], "city": key[3],
+                "items": 0, "boxes_open": 0, "boxes_close": 0, "errors": 0, "events": 0,
+                "last_received_at": row["received_at"], "last_box": row["box"],
+            }
+        counter = TYPE_COUNTERS.get(row["type"])
+        if counter:
+            stats[counter] += 1
+        stats["events"] += 1
+        if row["received_at"] >= stats["last_received_at"]:
+            stats["last_received_at"] = row["received_at"]
+            stats["last_box"] = row["box"]
+
+    await db.execute(upsert_stats_stmt, [deltas[key] for key in sorted(deltas)])
+
+    boxes = {}
+    for row in rows:
+        key = box_key(row)
+        stats = boxes.get(key)
+        if stats is None:
+            stats = boxes[key] = {
+                "day": key[0], "client": key[1], "city": key[2], "box_no": key[3], "operator": key[4],
+                "items": 0, "closes": 0, "events": 0, "first_ts": row["ts"], "last_ts": row["ts"],
+            }
+        if row["type"] == "ITEM":
+            stats["items"] += 1
+        elif row["type"] == "CLOSE":
+            stats["closes"] += 1
+        stats["events"] += 1
+        stats["first_ts"] = min(stats["first_ts"], row["ts"])
+        stats["last_ts"] = max(stats["last_ts"], row["ts"])
+
+    await db.execute(upsert_box_stats_stmt, [boxes[key] for key in sorted(boxes)])
+
+
+def aggregate_select(*where):
+    """SELECT агрегатов из events (живые строки) в порядке STAT_COLUMNS"""
+    # Литералы, а не bind параметры: выражения повторяются в GROUP BY
+    empty = literal_column("''")
+    day = func.date(func.timezone(literal_column("'UTC'"), Event.ts))
+    client = func.coalesce(Event.client, empty)
+    city = func.coalesce(Event.city, empty)
+    counts = [
+        func.count().filter(Event.type == event_type)
+        for event_type in TYPE_COUNTERS
+    ]
+    last_box = func.array_agg(aggregate_order_by(Event.box, Event.received_at.desc()))[1]
+
+    return (
+        select(
+            day, Event.operator, client, city,
+            *counts, func.count(),
+            func.max(Event.received_at), last_box,
+        )
+        .where(Event.deleted_at.is_(None), *where)
+        .group_by(day, Event.operator, client, city)
+    )
+
+
+def box_aggregate_select(*where):
+    """SELECT сводок коробов из events (живые строки) в порядке BOX_COLUMNS"""
+    empty = literal_column("''")
+    day = func.date(func.timezone(literal_column("'UTC'"), Event.ts))
+    client = func.coalesce(Event.client, empty)
+    city = func.coalesce(Event.city, empty)
+
+    return (
+        select(
+            day, client, city, BOX_NO, Event.operator,
+            func.count().filter(Event.type == "ITEM"), func.count().filter(Event.type == "CLOSE"),
+            func.count(), func.min(Event.ts), func.max(Event.ts),
+        )
+        .where(Event.deleted_at.is_(None), *where)
+        .group_by(day, client, city, BOX_NO, Event.operator)
+    )
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """[начало дня, начало следующего дня) в UTC"""
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+async def refresh_groups(db, keys: Iterable[GroupKey]) -> None:
+    """
+    Пересчитать группы из events (после удаления/tombstone)
+
+    Пересчет точный (включая last_box), но затрагивает только события
+    указанных групп.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return
+
+    c = stats_table.c
+    await db.execute(
+        delete(stats_table).where(tuple_(c.day, c.operator, c.client, c.city).in_(keys))
+    )
+
+    conditions = []
+    for day, operator, client, city in keys:
+        start, end = day_bounds(day)
+        conditions.append(and_(
+            Event.ts >= start,
+            Event.ts < end,
+            Event.operator == operator,
+            func.coalesce(Event.client, '') == client,
+            func.coalesce(Event.city, '') == city,
+        ))
+
+    await db.execute(
+        stats_table.insert().from_select(STAT_COLUMNS, aggregate_select(or_(*conditions)))
+    )
+
+
+async def refresh_boxes(db, keys: Iterable[BoxKey]) -> None:
+    """Пересчитать сводки коробов из events (после удаления/tombstone)"""
+    keys = sorted(set(keys))
+    if not keys:
+        return
+
+    c = box_stats_table.c
+    await db.execute(
+        delete(box_stats_table).where(tuple_(c.day, c.client, c.city, c.box_no, c.operator).in_(keys))
+    )
+
+    conditions = []
+    for day, client, city, box_no, operator in keys:
+        start, end = day_bounds(day)
+        conditions.append(and_(
+            Event.ts >= start,
+            Event.ts < end,
+            Event.operator == operator,
+            func.coalesce(Event.client, '') == client,
+            func.coalesce(Event.city, '') == city,
+            BOX_NO == box_no,
+        ))
+
+    await db.execute(
+        box_stats_table.insert().from_select(BOX_COLUMNS, box_aggregate_select(or_(*conditions)))
+    )
+
+
+async def rebuild_days(db, day_from: Optional[date] = None, day_to: Optional[date] = None) -> int:
+    """
+    Полностью пересчитать агрегаты и сводки коробов за диапазон дней
+    (включительно) из events
+
+    Без границ - пересчитываются таблицы целиком.
+
+    Returns:
+        количество строк event_daily_stats после пересчета
+    """
+    events_where = []
+    if day_from:
+        events_where.append(Event.ts >= day_bounds(day_from)[0])
+    if day_to:
+        events_where.append(Event.ts < day_bounds(day_to)[1])
+
+    for table in (stats_table, box_stats_table):
+        table_where = []
+        if day_from:
+            table_where.append(table.c.day >= day_from)
+        if day_to:
+            table_where.append(table.c.day <= day_to)
+        await db.execute(delete(table).where(*table_where))
+
+    await db.execute(
+        box_stats_table.insert().from_select(BOX_COLUMNS, box_aggregate_select(*events_where))
+    )
+    result = await db.execute(
+        stats_table.insert().from_select(STAT_COLUMNS, aggregate_select(*events_where))
+    )
+    return result.rowcount or 0
@@ -0,0 +1,65 @@
+"""
+Single-flight: одно вычисление на ключ для одновременных запросов
+
+В начале смены десяток супервизоров открывает dashboard с одинаковыми
+фильтрами; без объединения каждый запрос (и каждый воркер) выполняет
+один и тот же тяжелый запрос. SingleFlight.do(key, fn): первый запрос
+с ключом выполняет fn, остальные, пришедшие до его завершения, ждут и
+получают тот же результат (или то же исключение).
+
+Если запрос-лидер отменен (клиент закрыл соединение), ожидающие не
+получают CancelledError, а выполняют fn сами (новый лидер). Отмена
+ожидающего не отменяет вычисление лидера.
+
+Объединение между воркерами (Redis) - в app.services.cache.
+"""
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+
+class LeaderCancelled(Exception):
+    """Лидер отменен до результата: ожидающие считают сами"""
+
+
+class SingleFlight:
+    """Объединение одновременных вычислений с одинаковым ключом (в пределах процесса)"""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """(результат, получен ли он от другого запроса)"""
+        future = self._calls.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future), True
+            except LeaderCancelled:
+                return await self.do(key, fn)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._fail(future, LeaderCancelled())
+            raise
+        except Exception as e:
+            self._fail(future, e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: Exception) -> None:
+        future.set_exception(error)
+        # Без ожидающих исключение никто не заберет - не писать в лог "never retrieved"
+        future.exception()
@@ -0,0 +1,160 @@
+"""
+Потоковый прием NDJSON (одно событие на строку) для POST /events/stream
+
+Поток читается кусками, валидируется построчно и пишется в БД чанками по
+INGEST_STREAM_CHUNK_SIZE событий - память сервера не зависит от длины потока.
+После commit каждого чанка клиенту отправляется строка-подтверждение (ACK):
+
+    {"chunk": 0, "ackedThrough": 499, "inserted": 497, "skipped": 3, "errors": []}
+    ...
+    {"done": true, "ackedThrough": 4999, "lines": 5000, "inserted": ..., ...}
+
+ackedThrough - номер последней строки (0-based, с учетом ?offset=),
+которая гарантированно записана. После обрыва соединения клиент
+отправляет строки начиная с ackedThrough + 1 (вставка идемпотентна по UUID,
+повторная отправка недоподтвержденного чанка безопасна).
+"""
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.types import Receive, Scope, Send
+from typing import AsyncIterator, List, Tuple
+import json
+import logging
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.schemas.event import EventCreate, EventBatchResponse
+from app.services.ingest import after_commit, ingest_events
+from app.services.ingest_queue import ingest_queue
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingAckResponse(StreamingResponse):
+    """
+    StreamingResponse без listen_for_disconnect
+
+    Стандартный StreamingResponse параллельно читает receive() в ожидании
+    disconnect и тем самым "съедает" тело запроса. Здесь тело запроса
+    читает сам генератор ответа, поэтому отдельный слушатель не нужен.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def ingest_committed(events: List[EventCreate]) -> EventBatchResponse:
+    """Вставка с commit: через group commit очередь или отдельной транзакцией"""
+    if ingest_queue.running:
+        return await ingest_queue.ingest(events)
+
+    async with AsyncSessionLocal() as db:
+        response, inserted, txid = await ingest_events(db, events)
+        await db.commit()
+    await after_commit(inserted, txid)
+    return response
+
+
+async def iter_lines(body: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[bytes, bool]]:
+    """
+    Разбить поток байт на строки (без \\n)
+
+    Yields:
+        (line, too_long) - строки длиннее max_line_bytes не буферизуются,
+        вместо них отдается (b"", True)
+    """
+    buffer = b""
+    skipping = False
+
+    async for chunk in body:
+        buffer += chunk
+        while True:
+            pos = buffer.find(b"\n")
+            if pos < 0:
+                break
+            line, buffer = buffer[:pos], buffer[pos + 1:]
+            if skipping:
+                skipping = False
+                yield b"", True
+            else:
+                yield line, False
+
+        if len(buffer) > max_line_bytes:
+            buffer = b""
+            skipping = True
+
+    if skipping:
+        yield b"", True
+    elif buffer.strip():
+        yield buffer, False
+
+
+def ack_line(payload: dict) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def ingest_ndjson(
+    body: AsyncIterator[bytes],
+    offset: int = 0,
+    chunk_size: int = settings.INGEST_STREAM_CHUNK_SIZE,
+    max_line_bytes: int = settings.INGEST_STREAM_MAX_LINE_BYTES,
+) -> AsyncIterator[bytes]:
+    """Генератор ответа: читает NDJSON, пишет чанками, отдает ACK строки"""
+    line_no = offset - 1
+    chunk_idx = 0
+    events: List[EventCreate] = []
+    errors: List[str] = []
+    totals = {"inserted": 0, "skipped": 0, "invalid": 0}
+
+    async def flush() -> bytes:
+        nonlocal chunk_idx, events, errors
+        response = await ingest_committed(events) if events else None
+        inserted = response.inserted if response else 0
+        skipped = response.skipped if response else 0
+
+        totals["inserted"] += inserted
+        totals["skipped"] += skipped
+        totals["invalid"] += len(errors)
+
+        payload = {
+            "chunk": chunk_idx,
+            "ackedThrough": line_no,
+            "inserted": inserted,
+            "skipped": skipped,
+            "errors": errors,
+        }
+        chunk_idx += 1
+        events, errors = [], []
+        return ack_line(payload)
+
+    try:
+        async for line, too_long in iter_lines(body, max_line_bytes):
+            line_no += 1
+
+            if too_long:
+                errors.append(f"line {line_no}: exceeds {max_line_bytes} bytes")
+            elif line.strip():
+                try:
+                    events.append(EventCreate.model_validate_json(line))
+                except ValidationError as e:
+                    errors.append(f"line {line_no}: {e.errors()[0]['msg']}")
+
+            if len(events) >= chunk_size:
+                yield await flush()
+
+        if events or errors:
+            yield await flush()
+
+    except Exception as e:
+        # Заголовки уже отправлены - сообщаем об ошибке последней строкой
+        logger.error(f"❌ Error in stream ingest at line {line_no}: {e}", exc_info=True)
+        yield ack_line({"done": False, "error": str(e), **totals})
+        return
+
+    logger.info(
+        f"✅ Stream ingest: {line_no - offset + 1} lines, {chunk_idx} chunks, "
+        f"inserted {totals['inserted']}, skipped {totals['skipped']}, invalid {totals['invalid']}"
+    )
+    yield ack_line({"done": True, "ackedThrough": line_no, "lines": line_no - offset + 1, **totals})
@@ -0,0 +1,120 @@
+"""
+Soft delete (tombstone) и фоновый purge
+
+/bulk-remove в режиме BULK_REMOVE_MODE="tombstone" только проставляет
+events.deleted_at. Все dashboard/export запросы отбрасывают такие строки
+(Event.deleted_at IS NULL), а сами строки физически удаляются здесь:
+в окне TOMBSTONE_PURGE_WINDOW (время в settings.TIMEZONE), чанками по
+TOMBSTONE_PURGE_CHUNK_SIZE с паузой между ними, чтобы не держать
+долгие блокировки на горячей таблице.
+
+Пока tombstone не удален, его uuid занят в event_uuids: повторная отправка
+того же UUID из PWA пропускается и не "воскрешает" удаленное событие.
+Purge освобождает uuid вместе со строкой.
+"""
+from sqlalchemy import delete, select, text, tuple_
+from prometheus_client import Counter
+from typing import Optional
+from datetime import datetime, time as dt_time, timedelta, timezone
+import asyncio
+import logging
+import pytz
+
+from app.config import settings
+from app.database import engine
+from app.models.event import Event, EventUUID
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock: purge выполняет только один воркер
+PURGE_LOCK_ID = 0x5CA7_0001
+
+PURGED_ROWS = Counter("tombstone_purged_rows_total", "Физически удаленные tombstone строки")
+
+
+def parse_window(window: str) -> tuple[dt_time, dt_time]:
+    """'01:00-05:00' → (01:00, 05:00)"""
+    start, end = window.split("-")
+    return dt_time.fromisoformat(start.strip()), dt_time.fromisoformat(end.strip())
+
+
+def in_purge_window(now: Optional[datetime] = None) -> bool:
+    """Попадает ли текущее локальное время в off-peak окно (поддерживает окно через полночь)"""
+    start, end = parse_window(settings.TOMBSTONE_PURGE_WINDOW)
+    local = (now or datetime.now(timezone.utc)).astimezone(pytz.timezone(settings.TIMEZONE)).time()
+    if start <= end:
+        return start <= local < end
+    return local >= start or local < end
+
+
+async def purge_tombstones(max_chunks: Optional[int] = None) -> int:
+    """
+    Удалить tombstone-ы старше TOMBSTONE_RETENTION_HOURS чанками
+
+    Каждый чанк - отдельная короткая транзакция:
+        DELETE FROM events WHERE (uuid, ts) IN (
+            SELECT uuid, ts FROM events WHERE deleted_at < :cutoff
+            LIMIT :chunk FOR UPDATE SKIP LOCKED
+        ) RETURNING uuid
+        DELETE FROM event_uuids WHERE uuid IN (...)
+
+    (uuid, ts) - первичный ключ секционированной events: строка ищется
+    по индексу PK только в своей секции.
+
+    Returns:
+        количество удаленных строк
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.TOMBSTONE_RETENTION_HOURS)
+    victims = (
+        select(Event.uuid, Event.ts)
+        .where(Event.deleted_at < cutoff)
+        .limit(settings.TOMBSTONE_PURGE_CHUNK_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = delete(Event).where(tuple_(Event.uuid, Event.ts).in_(victims)).returning(Event.uuid)
+
+    total = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        async with engine.begin() as conn:
+            uuids = (await conn.execute(stmt)).scalars().all()
+            if uuids:
+                await conn.execute(delete(EventUUID).where(EventUUID.uuid.in_(uuids)))
+        deleted = len(uuids)
+        total += deleted
+        chunks += 1
+        PURGED_ROWS.inc(deleted)
+
+        if deleted < settings.TOMBSTONE_PURGE_CHUNK_SIZE:
+            break
+        if max_chunks is None and not in_purge_window():
+            break
+        await asyncio.sleep(settings.TOMBSTONE_PURGE_PAUSE_MS / 1000)
+
+    if total:
+        logger.info(f"🧹 Purged {total} tombstoned events in {chunks} chunks")
+    return total
+
+
+async def purge_loop():
+    """Фоновая задача: раз в TOMBSTONE_PURGE_INTERVAL_SECONDS запускает purge в off-peak окне"""
+    while True:
+        await asyncio.sleep(settings.TOMBSTONE_PURGE_INTERVAL_SECONDS)
+        if not in_purge_window():
+            continue
+        try:
+            async with engine.connect() as conn:
+                locked = (await conn.execute(
+                    text("SELECT pg_try_advisory_lock(:id)"), {"id": PURGE_LOCK_ID}
+                )).scalar()
+                if not locked:
+                    continue
+                try:
+                    await purge_tombstones()
+                finally:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": PURGE_LOCK_ID})
+                    await conn.commit()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Tombstone purge failed: {e}", exc_info=True)
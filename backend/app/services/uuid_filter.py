@@ -0,0 +1,381 @@
+"""
+Bloom фильтр UUID событий для POST /verify
+
+Фильтр содержит UUID всех событий в БД и пополняется ingest путем.
+Ответ "нет в фильтре" - гарантированно нет в БД, такие UUID не ищутся по
+всей таблице events. В БД проверяются только возможные попадания.
+
+Режимы (UUID_FILTER_BACKEND):
+- memory: bytearray в каждом воркере. Вставки других воркеров фоновая
+  задача подтягивает из БД раз в UUID_FILTER_SYNC_SECONDS (по received_at).
+  Чтобы "нет" оставалось гарантией, отсеянные UUID дополнительно ищутся
+  только среди событий, полученных после последней синхронизации (хвост
+  idx_events_feed по received_at, секунды данных).
+- redis: общий битовый массив в Redis (SETBIT/GETBIT), все воркеры пишут в него
+  сразу. Признак готовности - бит num_bits в том же ключе: если Redis вытеснит
+  ключ, пропадет и признак, /verify пойдет в БД, а фильтр пересоберется.
+
+Размер задается бюджетом памяти UUID_FILTER_MEMORY_BYTES; емкость
+(при которой достигается UUID_FILTER_FP_RATE) считается из него.
+"""
+from sqlalchemy import select, func
+from prometheus_client import Counter, Gauge
+from typing import Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import logging
+import math
+import uuid as uuid_lib
+
+from app.config import settings
+from app.database import engine
+from app.models.event import Event
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "scanner:uuid_filter:bits"
+REDIS_LOCK_KEY = "scanner:uuid_filter:rebuild"
+REDIS_ITEMS_KEY = "scanner:uuid_filter:items"
+
+# Запас при догоняющей синхронизации: received_at ставится до commit
+SYNC_OVERLAP = timedelta(seconds=30)
+# Хвост по received_at читается частичным idx_events_feed (deleted_at IS NULL).
+# UUID, удаленный в окне синхронизации, фильтр не увидит до rebuild - PWA
+# отправит событие повторно, ON CONFLICT его пропустит.
+# Повтор неудачного rebuild и проверка признака готовности в Redis
+# (ключ мог быть вытеснен)
+CHECK_SECONDS = 30
+
+# === Метрики ===
+FILTER_ITEMS = Gauge("uuid_filter_items", "Количество UUID, добавленных в фильтр")
+FILTER_CAPACITY = Gauge("uuid_filter_capacity", "Емкость фильтра при целевом FP rate")
+FILTER_ESTIMATED_FPR = Gauge(
+    "uuid_filter_estimated_fp_rate",
+    "Теоретический false positive rate при текущем заполнении",
+)
+FILTER_OBSERVED_FPR = Gauge(
+    "uuid_filter_observed_fp_rate",
+    "Наблюдаемая доля ложных попаданий среди отсутствующих в БД UUID",
+)
+FILTER_QUERIES = Counter(
+    "uuid_filter_queries_total",
+    "Проверки UUID через фильтр",
+    ["result"],  # negative | maybe | recent | bypass
+)
+FILTER_FALSE_POSITIVES = Counter(
+    "uuid_filter_false_positives_total",
+    "UUID, прошедшие фильтр, но не найденные в БД",
+)
+
+
+def normalize_uuid(value: str) -> Optional[uuid_lib.UUID]:
+    try:
+        return uuid_lib.UUID(str(value))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class UUIDFilter:
+    """
+    Bloom фильтр (double hashing поверх blake2b)
+
+    Usage:
+        await uuid_filter.start()          # rebuild из БД в фоне
+        maybe = await uuid_filter.maybe_present(uuids)
+        await uuid_filter.add_committed(uuids)  # после commit
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = settings.UUID_FILTER_MEMORY_BYTES,
+        fp_rate: float = settings.UUID_FILTER_FP_RATE,
+        backend: str = settings.UUID_FILTER_BACKEND,
+        enabled: bool = settings.UUID_FILTER_ENABLED,
+    ):
+        if backend not in ("memory", "redis"):
+            raise ValueError("UUID_FILTER_BACKEND must be one of: memory, redis")
+
+        self.enabled = enabled
+        self.backend = backend
+        self.num_bits = memory_bytes * 8
+        self.num_hashes = max(1, round(-math.log(fp_rate) / math.log(2)))
+        self.capacity = int(-self.num_bits * math.log(2) ** 2 / math.log(fp_rate))
+
+        self._bits = bytearray(memory_bytes) if enabled and backend == "memory" else None
+        self._items = 0
+        self._ready = False
+        self._watermark: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # для наблюдаемого FP rate
+        self._negatives = 0
+        self._false_positives = 0
+
+        FILTER_CAPACITY.set(self.capacity)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def _positions(self, value: uuid_lib.UUID) -> List[int]:
+        digest = hashlib.blake2b(value.bytes, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _update_gauges(self):
+        FILTER_ITEMS.set(self._items)
+        fill = 1 - math.exp(-self.num_hashes * self._items / self.num_bits)
+        FILTER_ESTIMATED_FPR.set(fill ** self.num_hashes)
+
+    # === Запись ===
+
+    async def add(self, values: Iterable, count: bool = True) -> None:
+        """
+        Добавить UUID (uuid.UUID или str) в фильтр
+
+        count=False - не учитывать в количестве элементов (UUID, которые
+        позже будут учтены догоняющей синхронизацией)
+        """
+        if not self.enabled:
+            return
+        uuids = [v if isinstance(v, uuid_lib.UUID) else normalize_uuid(v) for v in values]
+        uuids = [u for u in uuids if u is not None]
+        if not uuids:
+            return
+
+        if self.backend == "memory":
+            bits = self._bits
+            for value in uuids:
+                for pos in self._positions(value):
+                    bits[pos >> 3] |= 1 << (pos & 7)
+            if count:
+                self._items += len(uuids)
+        else:
+            redis = get_redis()
+            if redis is None:
+                return
+            try:
+                pipe = redis.pipeline(transaction=False)
+                for value in uuids:
+                    for pos in self._positions(value):
+                        pipe.setbit(REDIS_KEY, pos, 1)
+                pipe.incrby(REDIS_ITEMS_KEY, len(uuids) if count else 0)
+                self._items = (await pipe.execute())[-1]
+            except Exception as e:
+                logger.warning(f"⚠️ uuid_filter: Redis SETBIT failed: {e}")
+                return
+
+        self._update_gauges()
+
+    async def add_committed(self, values: Iterable) -> None:
+        """Хук ingest пути: UUID, вставленные в этом воркере"""
+        # memory: количество учтет _sync (он увидит эти строки по received_at)
+        await self.add(values, count=self.backend == "redis")
+
+    # === Чтение ===
+
+    async def maybe_present(self, values: List[str]) -> List[str]:
+        """
+        Отфильтровать UUID, которых гарантированно нет в БД
+
+        Returns:
+            подсписок values, которые нужно проверить в БД
+            (все values, если фильтр еще не готов)
+        """
+        if not self.enabled or (self.backend == "memory" and not self._ready):
+            FILTER_QUERIES.labels(result="bypass").inc(len(values))
+            return list(values)
+
+        parsed = [(v, normalize_uuid(v)) for v in values]
+        candidates = [(v, u) for v, u in parsed if u is not None]
+
+        if self.backend == "memory":
+            bits = self._bits
+            maybe = [
+                v for v, u in candidates
+                if all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(u))
+            ]
+            seen = set(maybe)
+            recent = await self._recent([(v, u) for v, u in candidates if v not in seen])
+            FILTER_QUERIES.labels(result="recent").inc(len(recent))
+            maybe += recent
+        else:
+            try:
+                self._ready, maybe = await self._redis_maybe(candidates)
+            except Exception as e:
+                logger.warning(f"⚠️ uuid_filter: Redis GETBIT failed, bypassing: {e}")
+                self._ready = False
+            if not self._ready:
+                FILTER_QUERIES.labels(result="bypass").inc(len(values))
+                return list(values)
+
+        negatives = len(values) - len(maybe)
+        self._negatives += negatives
+        FILTER_QUERIES.labels(result="negative").inc(negatives)
+        FILTER_QUERIES.labels(result="maybe").inc(len(maybe))
+        return maybe
+
+    async def _recent(self, candidates) -> List[str]:
+        """
+        memory: отсеянные UUID среди событий, полученных после синхронизации
+
+        Вставки других воркеров попадают в биты этого воркера только при
+        следующей синхронизации; найденные здесь - уже в БД.
+        """
+        if not candidates:
+            return []
+        by_uuid = {u: v for v, u in candidates}
+        stmt = select(Event.uuid).where(Event.uuid.in_(list(by_uuid)))
+        if self._watermark is not None:
+            stmt = stmt.where(
+                Event.received_at > self._watermark - SYNC_OVERLAP, Event.deleted_at.is_(None)
+            )
+        async with engine.connect() as conn:
+            found = list((await conn.execute(stmt)).scalars())
+        await self.add(found, count=False)
+        return [by_uuid[u] for u in found if u in by_uuid]
+
+    async def _redis_maybe(self, candidates) -> Tuple[bool, List[str]]:
+        """(фильтр готов, возможные попадания); признак готовности читается тем же pipeline"""
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.getbit(REDIS_KEY, self.num_bits)
+        for _, value in candidates:
+            for pos in self._positions(value):
+                pipe.getbit(REDIS_KEY, pos)
+        ready, *bits = await pipe.execute()
+
+        k = self.num_hashes
+        return bool(ready), [
+            v for idx, (v, _) in enumerate(candidates)
+            if all(bits[idx * k:(idx + 1) * k])
+        ]
+
+    def record_false_positives(self, count: int) -> None:
+        """Учесть UUID, которые прошли фильтр, но не нашлись в БД"""
+        self._false_positives += count
+        FILTER_FALSE_POSITIVES.inc(count)
+        total = self._negatives + self._false_positives
+        if total:
+            FILTER_OBSERVED_FPR.set(self._false_positives / total)
+
+    # === Rebuild / синхронизация ===
+
+    async def start(self):
+        """
+        Запустить фоновую задачу: rebuild из БД (до готовности /verify идет
+        в БД как раньше), затем синхронизация (memory) или проверка, что
+        общий фильтр не вытеснен из Redis (redis)
+        """
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        if self.backend == "memory":
+            while not self._ready:
+                await self._rebuild_logged()
+                if not self._ready:
+                    await asyncio.sleep(CHECK_SECONDS)
+            while True:
+                await asyncio.sleep(settings.UUID_FILTER_SYNC_SECONDS)
+                await self._sync()
+
+        while True:
+            await self._ensure_redis()
+            await asyncio.sleep(CHECK_SECONDS)
+
+    async def _rebuild_logged(self):
+        try:
+            await self.rebuild()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ uuid_filter rebuild failed: {e}", exc_info=True)
+
+    async def _ensure_redis(self):
+        """redis: пересобрать общий фильтр, если нет признака готовности (один воркер)"""
+        redis = get_redis()
+        if redis is None:
+            logger.warning("⚠️ uuid_filter: Redis unavailable, filter disabled")
+            self._ready = False
+            return
+        try:
+            self._ready = bool(await redis.getbit(REDIS_KEY, self.num_bits))
+            if self._ready:
+                return
+            if not await redis.set(REDIS_LOCK_KEY, 1, nx=True, ex=3600):
+                return
+            try:
+                await redis.delete(REDIS_KEY, REDIS_ITEMS_KEY)
+                await self.rebuild()
+                await redis.setbit(REDIS_KEY, self.num_bits, 1)
+            finally:
+                await redis.delete(REDIS_LOCK_KEY)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._ready = False
+            logger.error(f"❌ uuid_filter rebuild failed: {e}", exc_info=True)
+
+    async def rebuild(self, chunk_size: int = 50000):
+        """Заполнить фильтр всеми UUID из таблицы events (потоково)"""
+        started = datetime.now()
+        stmt = select(Event.uuid).execution_options(yield_per=chunk_size)
+
+        async with engine.connect() as conn:
+            watermark = (await conn.execute(select(func.max(Event.received_at)))).scalar()
+            result = await conn.stream(stmt)
+            async for partition in result.partitions():
+                await self.add(row[0] for row in partition)
+
+        self._watermark = watermark
+        self._ready = True
+
+        if self._items > self.capacity:
+            logger.warning(
+                f"⚠️ uuid_filter: {self._items} items exceed capacity {self.capacity}, "
+                f"raise UUID_FILTER_MEMORY_BYTES"
+            )
+        logger.info(
+            f"✅ uuid_filter rebuilt ({self.backend}): {self._items} UUIDs, "
+            f"{self.num_bits // 8 // 1024} KiB, k={self.num_hashes}, "
+            f"{(datetime.now() - started).total_seconds():.1f}s"
+        )
+
+    async def _sync(self):
+        """memory режим: подтянуть UUID, вставленные другими воркерами (фоновая задача)"""
+        stmt = select(Event.uuid, Event.received_at)
+        if self._watermark is not None:
+            stmt = stmt.where(
+                Event.received_at > self._watermark - SYNC_OVERLAP, Event.deleted_at.is_(None)
+            )
+
+        try:
+            async with engine.connect() as conn:
+                rows = (await conn.execute(stmt)).fetchall()
+        except Exception as e:
+            logger.warning(f"⚠️ uuid_filter sync failed: {e}")
+            return
+
+        if rows:
+            # Строки из окна перекрытия уже учтены - считаем только новые
+            new = [row for row in rows if self._watermark is None or row[1] > self._watermark]
+            await self.add((row[0] for row in rows), count=False)
+            self._items += len(new)
+            self._update_gauges()
+            self._watermark = max(row[1] for row in rows)
+
+
+# Singleton instance (rebuild запускается в lifespan при UUID_FILTER_ENABLED)
+uuid_filter = UUIDFilter()
@@ -0,0 +1,49 @@
+"""baseline: таблица events
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-11-01
+
+Существующие БД создавались через Base.metadata.create_all() при старте,
+поэтому миграция идемпотентна (IF NOT EXISTS): на таких БД достаточно
+`alembic upgrade head`, без `alembic stamp`.
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            uuid        UUID PRIMARY KEY,
+            ts          TIMESTAMP WITH TIME ZONE NOT NULL,
+            type        VARCHAR(50) NOT NULL,
+            operator    VARCHAR(100) NOT NULL,
+            client      VARCHAR(100),
+            city        VARCHAR(100),
+            box         VARCHAR(100),
+            code        VARCHAR(500),
+            details     TEXT,
+            received_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            source      VARCHAR(50) NOT NULL,
+            created_at  TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_events_ts ON events (ts)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_events_type ON events (type)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_events_operator ON events (operator)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_events_client ON events (client)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_events_box ON events (box)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_events_received_at ON events (received_at)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_events_date ON events (ts, operator)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_received_at_desc ON events (received_at DESC)")
+    # idx_dashboard не воспроизводится: его предикат (ts > <момент импорта модели>)
+    # зависит от того, когда create_all() впервые создал таблицу
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS events")
@@ -0,0 +1,31 @@
+"""soft delete: events.deleted_at
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-11-01
+
+/bulk-remove помечает события (deleted_at) вместо физического DELETE;
+фоновая задача удаляет помеченные строки небольшими чанками в off-peak.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ADD COLUMN без DEFAULT не переписывает таблицу
+    op.execute("ALTER TABLE events ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE")
+    # CONCURRENTLY - без блокировки записи сканеров на время построения
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_deleted_at ON events (deleted_at) "
+            "WHERE deleted_at IS NOT NULL"
+        )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_events_deleted_at")
+    op.execute("ALTER TABLE events DROP COLUMN IF EXISTS deleted_at")
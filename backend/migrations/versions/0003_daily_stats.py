@@ -0,0 +1,67 @@
+"""daily stats: event_daily_stats
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-11-01
+
+Дневные агрегаты по (day, operator, client, city) для /dashboard/state.
+Таблица сразу заполняется из events (то же, что scripts/backfill_rollups.py),
+дальше ее поддерживает ingest путь.
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS event_daily_stats (
+            day              DATE NOT NULL,
+            operator         VARCHAR(100) NOT NULL,
+            client           VARCHAR(100) NOT NULL DEFAULT '',
+            city             VARCHAR(100) NOT NULL DEFAULT '',
+            items            INTEGER NOT NULL DEFAULT 0,
+            boxes_open       INTEGER NOT NULL DEFAULT 0,
+            boxes_close      INTEGER NOT NULL DEFAULT 0,
+            errors           INTEGER NOT NULL DEFAULT 0,
+            events           INTEGER NOT NULL DEFAULT 0,
+            last_received_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            last_box         VARCHAR(100),
+            PRIMARY KEY (day, operator, client, city)
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_daily_stats_day_client ON event_daily_stats (day, client, city)"
+    )
+
+    # Backfill (см. app.services.rollups.aggregate_select)
+    op.execute("TRUNCATE event_daily_stats")
+    op.execute("""
+        INSERT INTO event_daily_stats (
+            day, operator, client, city,
+            items, boxes_open, boxes_close, errors, events,
+            last_received_at, last_box
+        )
+        SELECT
+            date(timezone('UTC', ts)),
+            operator,
+            coalesce(client, ''),
+            coalesce(city, ''),
+            count(*) FILTER (WHERE type = 'ITEM'),
+            count(*) FILTER (WHERE type = 'BOX'),
+            count(*) FILTER (WHERE type = 'CLOSE'),
+            count(*) FILTER (WHERE type = 'ERROR'),
+            count(*),
+            max(received_at),
+            (array_agg(box ORDER BY received_at DESC))[1]
+        FROM events
+        WHERE deleted_at IS NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS event_daily_stats")
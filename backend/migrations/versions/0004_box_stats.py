@@ -0,0 +1,68 @@
+"""box stats: box_daily_stats
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-11-08
+
+Дневные сводки коробов по (day, client, city, box_no, operator) для
+/dashboard/boxes. Таблица сразу заполняется из events (то же, что
+scripts/backfill_rollups.py), дальше ее поддерживает ingest путь.
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS box_daily_stats (
+            day      DATE NOT NULL,
+            client   VARCHAR(100) NOT NULL DEFAULT '',
+            city     VARCHAR(100) NOT NULL DEFAULT '',
+            box_no   VARCHAR(100) NOT NULL,
+            operator VARCHAR(100) NOT NULL,
+            items    INTEGER NOT NULL DEFAULT 0,
+            closes   INTEGER NOT NULL DEFAULT 0,
+            events   INTEGER NOT NULL DEFAULT 0,
+            first_ts TIMESTAMP WITH TIME ZONE NOT NULL,
+            last_ts  TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (day, client, city, box_no, operator)
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_box_stats_day_client ON box_daily_stats (day, client, city)"
+    )
+
+    # Backfill (см. app.services.rollups.box_aggregate_select)
+    op.execute("TRUNCATE box_daily_stats")
+    op.execute("""
+        INSERT INTO box_daily_stats (
+            day, client, city, box_no, operator,
+            items, closes, events, first_ts, last_ts
+        )
+        SELECT
+            date(timezone('UTC', ts)),
+            coalesce(client, ''),
+            coalesce(city, ''),
+            CASE
+                WHEN coalesce(box, '') = '' THEN '—'
+                WHEN strpos(box, '/') > 0 THEN split_part(box, '/', 2)
+                ELSE box
+            END,
+            operator,
+            count(*) FILTER (WHERE type = 'ITEM'),
+            count(*) FILTER (WHERE type = 'CLOSE'),
+            count(*),
+            min(ts),
+            max(ts)
+        FROM events
+        WHERE deleted_at IS NULL
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS box_daily_stats")
@@ -0,0 +1,200 @@
+"""events: секционирование по месяцам ts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-11-15
+
+events становится PARTITION BY RANGE (ts) с секциями events_pYYYYMM и
+events_default (см. app.services.partitions), первичный ключ - (uuid, ts).
+Такой ключ не запрещает тот же uuid с другим ts; уникальность uuid
+возвращает event_uuids (миграция 0009).
+
+Перенос без долгой остановки записи:
+1. events_new (секционированная, сразу с индексами) и секции для всех
+   месяцев, где есть события, плюс текущий и следующий месяц
+2. триггер на events зеркалирует INSERT/UPDATE/DELETE в events_new,
+   удаления дополнительно пишутся в events_migration_deleted
+3. копирование по дням, каждый день - отдельная транзакция
+   (INSERT ... SELECT ... ON CONFLICT DO NOTHING); сканеры все это время
+   пишут в events
+4. короткая транзакция: ACCESS EXCLUSIVE на events, повтор удалений,
+   совпавших с копированием, events → events_legacy, events_new → events
+
+Миграцию запускают новым образом, пока работает старый backend, и сразу
+после нее перезапускают backend: INSERT старой версии (ON CONFLICT (uuid))
+на новой таблице падает, PWA повторит отправку.
+
+Старая таблица остается как events_legacy (место на диске ×2) - удалить
+вручную после проверки: DROP TABLE events_legacy.
+idx_dashboard не переносится: его предикат зафиксирован моментом create_all().
+"""
+from alembic import op
+from sqlalchemy import text
+from datetime import date, datetime, timedelta, timezone
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# Индексы events: имя → определение
+INDEXES = {
+    "ix_events_ts": "(ts)",
+    "ix_events_type": "(type)",
+    "ix_events_operator": "(operator)",
+    "ix_events_client": "(client)",
+    "ix_events_box": "(box)",
+    "ix_events_received_at": "(received_at)",
+    "idx_events_date": "(ts, operator)",
+    "idx_received_at_desc": "(received_at DESC)",
+    "idx_events_deleted_at": "(deleted_at) WHERE deleted_at IS NOT NULL",
+}
+
+# Колонки кроме ключа (uuid, ts) - для UPSERT в триггере
+COLUMNS = [
+    "type", "operator", "client", "city", "box", "code", "details",
+    "received_at", "source", "created_at", "deleted_at",
+]
+
+SWAP_LOCK_TIMEOUT = "10s"
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def utc(day: date) -> str:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).isoformat()
+
+
+def is_partitioned(bind) -> bool:
+    return bind.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('events'))"
+    )).scalar()
+
+
+def data_months(bind) -> list:
+    """Месяцы (UTC) с событиями: по индексу ix_events_ts, одна проба на месяц"""
+    rows = bind.execute(text("""
+        WITH RECURSIVE months AS (
+            SELECT date_trunc('month', timezone('UTC', min(ts))) AS month FROM events
+            UNION ALL
+            SELECT (
+                SELECT date_trunc('month', timezone('UTC', min(ts))) FROM events
+                WHERE ts >= timezone('UTC', months.month + interval '1 month')
+            )
+            FROM months WHERE months.month IS NOT NULL
+        )
+        SELECT month::date FROM months WHERE month IS NOT NULL
+    """))
+    return [row[0] for row in rows]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if is_partitioned(bind):
+        # БД создана create_all() уже с секционированной моделью
+        return
+
+    # Повторный запуск после сбоя начинает перенос заново
+    op.execute("DROP TRIGGER IF EXISTS events_migration_mirror ON events")
+    op.execute("DROP FUNCTION IF EXISTS events_migration_mirror()")
+    op.execute("DROP TABLE IF EXISTS events_new CASCADE")
+    op.execute("DROP TABLE IF EXISTS events_migration_deleted")
+
+    # 1. Секционированная таблица, индексы, секции
+    op.execute("CREATE TABLE events_new (LIKE events INCLUDING DEFAULTS) PARTITION BY RANGE (ts)")
+    op.execute("ALTER TABLE events_new ADD CONSTRAINT events_new_pkey PRIMARY KEY (uuid, ts)")
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX {name}_new ON events_new {definition}")
+
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    months = sorted(set(data_months(bind)) | {current, add_months(current, 1)})
+    for month in months:
+        op.execute(
+            f"CREATE TABLE events_p{month:%Y%m} PARTITION OF events_new "
+            f"FOR VALUES FROM ('{utc(month)}') TO ('{utc(add_months(month, 1))}')"
+        )
+    op.execute("CREATE TABLE events_default PARTITION OF events_new DEFAULT")
+
+    # 2. Зеркалирование изменений на время копирования
+    op.execute("CREATE TABLE events_migration_deleted (uuid UUID NOT NULL, ts TIMESTAMP WITH TIME ZONE NOT NULL)")
+    assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in COLUMNS)
+    op.execute(f"""
+        CREATE FUNCTION events_migration_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM events_new WHERE uuid = OLD.uuid AND ts = OLD.ts;
+                INSERT INTO events_migration_deleted VALUES (OLD.uuid, OLD.ts);
+                RETURN OLD;
+            END IF;
+            INSERT INTO events_new SELECT NEW.*
+            ON CONFLICT (uuid, ts) DO UPDATE SET {assignments};
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER events_migration_mirror
+        AFTER INSERT OR UPDATE OR DELETE ON events
+        FOR EACH ROW EXECUTE FUNCTION events_migration_mirror()
+    """)
+
+    # 3. Копирование по дням (commit триггера - до первого дня)
+    with op.get_context().autocommit_block():
+        for month in months:
+            day = month
+            while day < add_months(month, 1):
+                op.execute(
+                    "INSERT INTO events_new SELECT * FROM events "
+                    f"WHERE ts >= '{utc(day)}' AND ts < '{utc(day + timedelta(days=1))}' "
+                    "ON CONFLICT (uuid, ts) DO NOTHING"
+                )
+                day += timedelta(days=1)
+
+    # 4. Переключение (одна короткая транзакция)
+    op.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+    op.execute("LOCK TABLE events IN ACCESS EXCLUSIVE MODE")
+    # DELETE мог совпасть с копированием своего дня и "воскресить" строку
+    op.execute("""
+        DELETE FROM events_new n USING events_migration_deleted d
+        WHERE n.uuid = d.uuid AND n.ts = d.ts
+          AND NOT EXISTS (SELECT 1 FROM events e WHERE e.uuid = d.uuid AND e.ts = d.ts)
+    """)
+    op.execute("DROP TRIGGER events_migration_mirror ON events")
+    op.execute("DROP FUNCTION events_migration_mirror()")
+    op.execute("DROP TABLE events_migration_deleted")
+
+    op.execute("ALTER TABLE events RENAME TO events_legacy")
+    op.execute("ALTER INDEX IF EXISTS events_pkey RENAME TO events_legacy_pkey")
+    for name in [*INDEXES, "idx_dashboard"]:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy")
+
+    op.execute("ALTER TABLE events_new RENAME TO events")
+    op.execute("ALTER INDEX events_new_pkey RENAME TO events_pkey")
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+
+
+def downgrade():
+    """Обратно в обычную таблицу (с остановкой записи на время копирования)"""
+    bind = op.get_bind()
+    if not is_partitioned(bind):
+        return
+
+    if bind.execute(text("SELECT to_regclass('events_legacy') IS NULL")).scalar():
+        op.execute("CREATE TABLE events_legacy (LIKE events INCLUDING DEFAULTS)")
+        op.execute("ALTER TABLE events_legacy ADD CONSTRAINT events_legacy_pkey PRIMARY KEY (uuid)")
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX {name}_legacy ON events_legacy {definition}")
+
+    op.execute("LOCK TABLE events IN ACCESS EXCLUSIVE MODE")
+    op.execute("TRUNCATE events_legacy")
+    op.execute("INSERT INTO events_legacy SELECT * FROM events ON CONFLICT (uuid) DO NOTHING")
+    op.execute("DROP TABLE events CASCADE")
+
+    op.execute("ALTER TABLE events_legacy RENAME TO events")
+    op.execute("ALTER INDEX events_legacy_pkey RENAME TO events_pkey")
+    for name in [*INDEXES, "idx_dashboard"]:
+        op.execute(f"ALTER INDEX IF EXISTS {name}_legacy RENAME TO {name}")
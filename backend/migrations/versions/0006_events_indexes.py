@@ -0,0 +1,107 @@
+"""events: индексы по формам запросов dashboard/экспорта
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-11-22
+
+Одиночные btree по ts/type/operator/client/box/received_at, (ts, operator) и
+(received_at DESC) заменяются набором под реальные запросы
+(app.services.queries, см. app.models.event):
+- BRIN по ts - диапазоны дней (экспорт, пересчет агрегатов)
+- (received_at, uuid) - лента /state и keyset пагинация /raw
+- (operator, ts), (client, city, ts), (type, ts) - фильтры за период
+- (client, city, номер короба, ts) для ITEM - товары короба
+Все составные индексы частичные (deleted_at IS NULL), как и запросы.
+idx_dashboard (предикат зафиксирован моментом create_all()) удаляется.
+
+events секционирована, а CREATE INDEX CONCURRENTLY на секционированной
+таблице невозможен, поэтому без блокировки вставок:
+1. CREATE INDEX ... ON ONLY events - пустой (invalid) индекс родителя
+2. для каждой секции CREATE INDEX CONCURRENTLY + ALTER INDEX ... ATTACH
+   PARTITION; после последней секции индекс родителя становится valid
+Новые секции (app.services.partitions) получают индексы при ATTACH.
+
+Проверка планов - scripts/check_query_plans.py.
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# Номер короба: то же выражение, что app.models.event.box_no_sql
+BOX_NO = (
+    "CASE WHEN (coalesce(box, '') = '') THEN '—' "
+    "WHEN (strpos(box, '/') > 0) THEN split_part(box, '/', 2) ELSE box END"
+)
+
+# Новые индексы: имя → определение (после ON <таблица>)
+INDEXES = {
+    "idx_events_ts_brin": "USING brin (ts) WITH (pages_per_range = 32)",
+    "idx_events_feed": "(received_at, uuid) WHERE deleted_at IS NULL",
+    "idx_events_operator_ts": "(operator, ts) WHERE deleted_at IS NULL",
+    "idx_events_client_city_ts": "(client, city, ts) WHERE deleted_at IS NULL",
+    "idx_events_type_ts": "(type, ts) WHERE deleted_at IS NULL",
+    "idx_events_box_items": f"(client, city, ({BOX_NO}), ts) WHERE type = 'ITEM' AND deleted_at IS NULL",
+}
+
+# Прежние индексы (0005): имя → определение, для downgrade
+OLD_INDEXES = {
+    "ix_events_ts": "(ts)",
+    "ix_events_type": "(type)",
+    "ix_events_operator": "(operator)",
+    "ix_events_client": "(client)",
+    "ix_events_box": "(box)",
+    "ix_events_received_at": "(received_at)",
+    "idx_events_date": "(ts, operator)",
+    "idx_received_at_desc": "(received_at DESC)",
+}
+
+DROP_LOCK_TIMEOUT = "10s"
+
+
+def partitions(bind) -> list:
+    rows = bind.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('events') ORDER BY c.relname"
+    ))
+    return [row[0] for row in rows]
+
+
+def index_valid(bind, name: str):
+    """True/False - индекс есть и valid/invalid; None - индекса нет"""
+    return bind.execute(text(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+    ), {"name": name}).scalar()
+
+
+def upgrade():
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            # Уже valid: БД создана create_all() с текущей моделью
+            if index_valid(bind, name):
+                continue
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY events {definition}")
+            for partition in partitions(bind):
+                child = f"{partition}_{name[len('idx_events_'):]}"
+                # Прерванный CREATE INDEX CONCURRENTLY оставляет invalid индекс
+                if index_valid(bind, child) is False:
+                    op.execute(f"DROP INDEX {child}")
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {definition}")
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+    # DROP INDEX на секционированной таблице - только обычный (ACCESS
+    # EXCLUSIVE на время удаления файлов), поэтому с lock_timeout
+    op.execute(f"SET LOCAL lock_timeout = '{DROP_LOCK_TIMEOUT}'")
+    for name in ["idx_dashboard", *OLD_INDEXES]:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def downgrade():
+    for name, definition in OLD_INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON events {definition}")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
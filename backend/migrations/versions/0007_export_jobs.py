@@ -0,0 +1,53 @@
+"""export jobs: export_jobs
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-11-29
+
+Фоновые экспорты (app.services.export_jobs): задачи, их прогресс и
+ключ кэша готового файла. Сами файлы - на диске (EXPORT_JOBS_DIR).
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id           UUID PRIMARY KEY,
+            kind         VARCHAR(20) NOT NULL,
+            params       JSONB NOT NULL,
+            cache_key    VARCHAR(64) NOT NULL,
+            status       VARCHAR(20) NOT NULL DEFAULT 'queued',
+            cached       BOOLEAN NOT NULL DEFAULT false,
+            attempts     INTEGER NOT NULL DEFAULT 0,
+            days_total   INTEGER NOT NULL DEFAULT 0,
+            days_done    INTEGER NOT NULL DEFAULT 0,
+            rows_done    BIGINT NOT NULL DEFAULT 0,
+            bytes        BIGINT,
+            artifact     VARCHAR(200),
+            filename     VARCHAR(200),
+            media_type   VARCHAR(100),
+            error        TEXT,
+            worker       VARCHAR(100),
+            created_at   TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            started_at   TIMESTAMP WITH TIME ZONE,
+            heartbeat_at TIMESTAMP WITH TIME ZONE,
+            finished_at  TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_export_jobs_queue ON export_jobs (created_at) "
+        "WHERE status IN ('queued', 'running')"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_export_jobs_cache_key ON export_jobs (cache_key, finished_at)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS export_jobs")
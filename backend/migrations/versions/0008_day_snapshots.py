@@ -0,0 +1,55 @@
+"""day snapshots: day_snapshot_epochs, day_snapshots, day_snapshot_parts
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-12-03
+
+Снимки выгрузок закрытых дней (app.services.day_snapshots). Таблицы
+создаются пустыми: снимки строит фоновая задача (DAY_SNAPSHOT_*).
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS day_snapshot_epochs (
+            day        DATE PRIMARY KEY,
+            epoch      BIGINT NOT NULL DEFAULT 0,
+            changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS day_snapshots (
+            day      DATE NOT NULL,
+            kind     VARCHAR(20) NOT NULL,
+            epoch    BIGINT NOT NULL,
+            rows     INTEGER NOT NULL DEFAULT 0,
+            parts    INTEGER NOT NULL DEFAULT 0,
+            bytes    BIGINT NOT NULL DEFAULT 0,
+            built_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (day, kind)
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS day_snapshot_parts (
+            day  DATE NOT NULL,
+            kind VARCHAR(20) NOT NULL,
+            part INTEGER NOT NULL,
+            data BYTEA NOT NULL,
+            PRIMARY KEY (day, kind, part),
+            FOREIGN KEY (day, kind) REFERENCES day_snapshots (day, kind) ON DELETE CASCADE
+        )
+    """)
+    # Части уже сжаты zlib: без повторного сжатия TOAST
+    op.execute("ALTER TABLE day_snapshot_parts ALTER COLUMN data SET STORAGE EXTERNAL")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS day_snapshot_parts")
+    op.execute("DROP TABLE IF EXISTS day_snapshots")
+    op.execute("DROP TABLE IF EXISTS day_snapshot_epochs")
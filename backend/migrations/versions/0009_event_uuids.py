@@ -0,0 +1,65 @@
+"""event_uuids: глобальная уникальность uuid событий
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-12-10
+
+После 0005 первичный ключ events - (uuid, ts), и тот же uuid с другим ts
+вставлялся второй строкой (считался дважды в агрегатах, выгрузках и live
+состоянии). event_uuids (uuid PRIMARY KEY) - несекционированная таблица
+занятых uuid: ingest вставляет событие, только если занял его uuid
+(app.models.event.EventUUID).
+
+Заполнение - по месяцам ts, каждый месяц отдельной транзакцией; при
+повторе uuid в events занимает его самая ранняя строка. Сразу после
+миграции перезапустите backend: вставки старой версии uuid не занимают.
+Дубликаты, оставшиеся в events, и незанятые uuid показывает
+scripts/check_partition_pruning.py; догнать незанятые можно повтором того
+же INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+"""
+from alembic import op
+from sqlalchemy import text
+from datetime import date, datetime, timezone
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def utc(day: date) -> str:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).isoformat()
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS event_uuids (
+            uuid UUID PRIMARY KEY,
+            ts   TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_event_uuids_ts_brin ON event_uuids USING brin (ts)")
+
+    bind = op.get_bind()
+    first, last = bind.execute(text("SELECT min(ts), max(ts) FROM events")).one()
+    if first is not None:
+        first = first.astimezone(timezone.utc)
+        month = date(first.year, first.month, 1)
+        with op.get_context().autocommit_block():
+            while month <= last.astimezone(timezone.utc).date():
+                op.execute(
+                    "INSERT INTO event_uuids (uuid, ts) SELECT uuid, ts FROM events "
+                    f"WHERE ts >= '{utc(month)}' AND ts < '{utc(add_months(month, 1))}' "
+                    "ORDER BY ts ON CONFLICT (uuid) DO NOTHING"
+                )
+                month = add_months(month, 1)
+    op.execute("ANALYZE event_uuids")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS event_uuids")
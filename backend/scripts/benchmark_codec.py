@@ -0,0 +1,109 @@
+"""
+Бенчмарк форматов тела POST /api/v1/events/batch: размер payload и время декодирования
+
+Сравнивает текущий путь (JSON → EventBatchRequest, pydantic на каждое событие)
+с msgpack (построчная и колоночная раскладка) и gzip поверх каждого формата.
+БД не нужна.
+
+Использование:
+    python scripts/benchmark_codec.py --batch-size 100 --rounds 500
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import os
+import time
+import uuid as uuid_lib
+
+import msgpack
+
+# Добавить путь к app модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import settings
+from app.schemas.event import EventBatchRequest
+from app.services.codec import decode_batch, decompress
+
+
+def make_events(n: int) -> list:
+    """Синтетический батч одного оператора (как его формирует sync/index.js)"""
+    now_ms = int(time.time() * 1000)
+    box_no = random.randint(1, 500)
+    return [
+        {
+            "uuid": str(uuid_lib.uuid4()),
+            "ts": now_ms - (n - i) * 1500,
+            "type": "ITEM",
+            "operator": "Иванов Иван",
+            "client": "OZON",
+            "city": "Москва",
+            "box": f"OZON/{box_no}",
+            "code": str(random.randint(10**12, 10**13)),
+            "source": "pwa",
+            "details": "",
+        }
+        for i in range(n)
+    ]
+
+
+def columnar(events: list) -> dict:
+    """Колоночная раскладка: общие поля один раз, UUID как bin(16)"""
+    shared_keys = ("operator", "client", "city", "source", "box", "type", "details")
+    shared = {k: events[0][k] for k in shared_keys if all(e[k] == events[0][k] for e in events)}
+    columns = {
+        k: [e[k] for e in events]
+        for k in events[0]
+        if k not in shared
+    }
+    columns["uuid"] = [uuid_lib.UUID(u).bytes for u in columns["uuid"]]
+    return {"shared": shared, "columns": columns}
+
+
+def bench(fn, rounds: int) -> float:
+    """Среднее время вызова в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк форматов /events/batch")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    settings.MAX_BATCH_SIZE = max(settings.MAX_BATCH_SIZE, args.batch_size)
+    events = make_events(args.batch_size)
+
+    json_body = json.dumps({"events": events}, ensure_ascii=False).encode("utf-8")
+    rows_body = msgpack.packb({"events": events})
+    col_body = msgpack.packb(columnar(events))
+
+    variants = [
+        ("json (текущий)", json_body, None,
+         lambda b: EventBatchRequest.model_validate_json(b)),
+        ("json + gzip", gzip.compress(json_body), "gzip",
+         lambda b: EventBatchRequest.model_validate_json(decompress(b, "gzip"))),
+        ("msgpack rows", rows_body, None, lambda b: decode_batch(b)),
+        ("msgpack columnar", col_body, None, lambda b: decode_batch(b)),
+        ("msgpack columnar + gzip", gzip.compress(col_body), "gzip",
+         lambda b: decode_batch(b, "gzip")),
+    ]
+
+    print(f"🚀 Батч {args.batch_size} событий, {args.rounds} прогонов\n")
+    print(f"{'формат':26s} {'байт':>8s} {'%json':>7s} {'decode мкс':>11s} {'мкс/событие':>12s}")
+    for name, body, _, decode in variants:
+        micros = bench(lambda: decode(body), args.rounds)
+        print(
+            f"{name:26s} {len(body):8d} {len(body) / len(json_body):7.1%} "
+            f"{micros:11.1f} {micros / args.batch_size:12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Бенчмарк колоночного экспорта: CSV vs Parquet vs Arrow IPC
+
+Синтетические строки /export/csv (как из server-side курсора, частями
+по EXPORT_CHUNK_ROWS) пишутся тремя способами, как в эндпоинтах
+(stream_csv, columnar_stream). Для каждого формата печатает время записи,
+размер файла и время загрузки в pandas так, как это делают аналитики:
+- CSV: read_csv(sep=';') + разбор дат dd.MM.yyyy + снятие ="код"
+- Parquet: read_parquet
+- Arrow: ipc.open_stream(...).read_pandas()
+
+Использование:
+    python scripts/benchmark_columnar.py --sizes 100000,1000000
+"""
+import asyncio
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import uuid as uuid_lib
+
+import pandas as pd
+import pyarrow as pa
+
+# Добавить путь к app модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import settings
+from app.api.export_router import CSV_HEADER, event_csv_row, stream_csv
+from app.services.columnar_export import columnar_stream
+
+Row = namedtuple("Row", "uuid ts type operator client city box code details received_at source")
+TYPES = ['ITEM'] * 16 + ['BOX', 'CLOSE', 'ERROR', 'CITY']
+
+
+async def synthetic_chunks(count: int, seed: int):
+    """(день, строки) частями по EXPORT_CHUNK_ROWS; одинаковые для всех форматов"""
+    rng = random.Random(seed)
+    day = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(0, count, settings.EXPORT_CHUNK_ROWS):
+        rows = []
+        for i in range(offset, min(count, offset + settings.EXPORT_CHUNK_ROWS)):
+            ts = day + timedelta(microseconds=i * 86_400_000_000 // count)
+            client = f"client_{rng.randint(1, 10)}"
+            rows.append(Row(
+                uuid_lib.UUID(int=rng.getrandbits(128), version=4), ts, rng.choice(TYPES),
+                f"operator_{rng.randint(1, 40)}", client, f"city_{rng.randint(1, 15)}",
+                f"{client}/{rng.randint(1, 300)}", str(rng.randint(10**12, 10**13)), None,
+                ts + timedelta(seconds=rng.randint(0, 30)), "pwa",
+            ))
+        yield day, rows
+
+
+async def collect(body) -> bytes:
+    return b"".join([chunk async for chunk in body])
+
+
+def load_csv(data: bytes) -> pd.DataFrame:
+    df = pd.read_csv(io.BytesIO(data), sep=';', encoding='utf-8-sig', dtype=str, keep_default_na=False)
+    for column in ("ts", "received_at"):
+        df[column] = pd.to_datetime(df[column], format="%d.%m.%Y %H:%M:%S", errors="coerce")
+    df["code"] = df["code"].str.removeprefix('="').str.removesuffix('"')
+    return df
+
+
+def load_parquet(data: bytes) -> pd.DataFrame:
+    return pd.read_parquet(io.BytesIO(data))
+
+
+def load_arrow(data: bytes) -> pd.DataFrame:
+    return pa.ipc.open_stream(data).read_pandas()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="CSV vs Parquet vs Arrow: размер, запись, загрузка в pandas")
+    parser.add_argument('--sizes', default='100000,1000000', help='Строк, через запятую')
+    parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+
+    for count in [int(s) for s in args.sizes.split(',')]:
+        print(f"📊 {count} строк")
+        writers = (
+            ("csv", lambda: stream_csv(synthetic_chunks(count, args.seed), CSV_HEADER, event_csv_row), load_csv),
+            ("parquet", lambda: columnar_stream(
+                synthetic_chunks(count, args.seed), "parquet",
+                settings.EXPORT_COLUMNAR_COMPRESSION, settings.EXPORT_PARQUET_ROW_GROUP_ROWS), load_parquet),
+            ("arrow", lambda: columnar_stream(
+                synthetic_chunks(count, args.seed), "arrow",
+                settings.EXPORT_COLUMNAR_COMPRESSION, settings.EXPORT_PARQUET_ROW_GROUP_ROWS), load_arrow),
+        )
+        csv_size = None
+        for name, write, load in writers:
+            started = time.perf_counter()
+            data = await collect(write())
+            write_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            df = load(data)
+            load_seconds = time.perf_counter() - started
+
+            csv_size = csv_size or len(data)
+            memory = df.memory_usage(deep=True).sum() / 1024 / 1024
+            print(f"  {name:8s} запись {write_seconds:6.2f}s | {len(data) / 1024 / 1024:7.1f}MB "
+                  f"({len(data) / csv_size:5.1%} от CSV) | pandas {load_seconds:6.2f}s, {memory:7.1f}MB в памяти")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Нагрузка "начало смены": одинаковые одновременные запросы к dashboard
+
+Отправляет --concurrency одинаковых GET запросов разом (--rounds раз) на
+работающий backend и по /metrics считает, сколько расчетов реально
+выполнено и сколько запросов объединено single-flight слоем
+(response_single_flight_total: computed / coalesced / remote / timeout).
+
+Чтобы запросы доходили до расчета, а не до кэша, каждый раунд использует
+новый limit (ключ кэша другой), либо запускайте backend с
+DASHBOARD_CACHE_ENABLED=false.
+
+Использование:
+    python scripts/benchmark_single_flight.py --api-url http://localhost:8000 \
+        --api-key your_secret_api_key --path "/api/v1/dashboard/raw?date=2025-11-10" \
+        --concurrency 12 --rounds 5
+"""
+import asyncio
+import argparse
+import re
+import time
+from collections import defaultdict
+
+import httpx
+
+METRIC_RE = re.compile(r'^response_single_flight_total\{endpoint="([^"]+)",result="([^"]+)"\} ([0-9.e+]+)$', re.M)
+
+
+async def flight_metrics(client: httpx.AsyncClient) -> dict:
+    """{(endpoint, result): value} одного воркера, ответившего на /metrics"""
+    text = (await client.get("/metrics/")).text
+    return {(m.group(1), m.group(2)): float(m.group(3)) for m in METRIC_RE.finditer(text)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Одинаковые одновременные запросы dashboard (single-flight)")
+    parser.add_argument('--api-url', default='http://localhost:8000')
+    parser.add_argument('--api-key', required=True)
+    parser.add_argument('--path', default='/api/v1/dashboard/raw', help='GET путь с фильтрами')
+    parser.add_argument('--concurrency', type=int, default=12, help='Одновременных запросов (супервизоров)')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--base-limit', type=int, default=1000,
+                        help='limit первого раунда; каждый раунд +1, чтобы не попадать в кэш')
+
+    args = parser.parse_args()
+    headers = {"X-API-Key": args.api_key}
+    separator = "&" if "?" in args.path else "?"
+
+    async with httpx.AsyncClient(base_url=args.api_url, headers=headers, timeout=120) as client:
+        # Метрики - по воркеру, ответившему на запрос: при нескольких
+        # воркерах это оценка, точные суммы - в Prometheus
+        before = await flight_metrics(client)
+        latencies = []
+        statuses = defaultdict(int)
+
+        for round_no in range(args.rounds):
+            path = f"{args.path}{separator}limit={args.base_limit + round_no}"
+
+            async def one():
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*[one() for _ in range(args.concurrency)])
+            print(f"🚀 Раунд {round_no + 1}: {args.concurrency} запросов за {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        after = await flight_metrics(client)
+
+    latencies.sort()
+    print(f"⏱️  p50 {latencies[len(latencies) // 2] * 1000:.0f}ms, max {latencies[-1] * 1000:.0f}ms, "
+          f"статусы {dict(statuses)}")
+    deltas = {key: after.get(key, 0) - before.get(key, 0) for key in set(before) | set(after)}
+    for (endpoint, result), value in sorted(deltas.items()):
+        if value:
+            print(f"  📊 {endpoint:10s} {result:10s} {value:6.0f}")
+    if not any(deltas.values()):
+        print("  — метрики single-flight не изменились (ответы из кэша или другой воркер)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""
+Бенчмарк XLSX экспорта (openpyxl write-only): строк/сек и память
+
+Без --database-url: синтетические строки /export/xlsx (как из
+server-side курсора, частями по EXPORT_CHUNK_ROWS) собираются в книгу
+write_xlsx и для сравнения рендерятся в CSV (stream_csv). Печатает
+строк/сек, пиковый RSS процесса и размер файла. Размеры идут по
+возрастанию: RSS не должен расти вместе с числом строк (с --tracemalloc
+дополнительно пик памяти Python, но замер в разы медленнее).
+
+С --database-url: вызывает эндпоинты /xlsx и /boxes-xlsx за --date на
+уже загруженных данных (без TRUNCATE; данные - например, из
+scripts/benchmark_export.py).
+
+Использование:
+    python scripts/benchmark_xlsx.py --sizes 10000,100000,500000
+    python scripts/benchmark_xlsx.py --database-url "postgresql+asyncpg://.../scanner_bench" --date 2025-11-10
+"""
+import asyncio
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import uuid as uuid_lib
+
+# Добавить путь к app модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import settings
+from app.api.export_router import (
+    CSV_HEADER, EVENTS_XLSX_FORMATS, EVENTS_XLSX_WIDTHS,
+    event_xlsx_row, event_csv_row, stream_csv, export_xlsx, export_boxes_xlsx
+)
+from app.services.export_stream import write_xlsx
+
+Row = namedtuple("Row", "uuid ts type operator client city box code details received_at source")
+TYPES = ['ITEM'] * 16 + ['BOX', 'CLOSE', 'ERROR', 'CITY']
+
+
+async def synthetic_chunks(count: int):
+    """(день, строки) частями по EXPORT_CHUNK_ROWS, строки не накапливаются"""
+    day = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(0, count, settings.EXPORT_CHUNK_ROWS):
+        rows = []
+        for i in range(offset, min(count, offset + settings.EXPORT_CHUNK_ROWS)):
+            ts = day + timedelta(microseconds=i * 86_400_000_000 // count)
+            client = f"client_{random.randint(1, 10)}"
+            rows.append(Row(
+                uuid_lib.uuid4(), ts, random.choice(TYPES), f"operator_{random.randint(1, 40)}",
+                client, f"city_{random.randint(1, 15)}", f"{client}/{random.randint(1, 300)}",
+                str(random.randint(10**12, 10**13)), None, ts + timedelta(seconds=3), "pwa",
+            ))
+        yield day, rows
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss в KB (Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure(name: str, count: int, run, trace: bool = False) -> None:
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    size = await run()
+    seconds = time.perf_counter() - started
+    python_peak = ""
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        python_peak = f" | Python пик {peak / 1024 / 1024:7.1f}MB"
+    print(f"  {name:5s} {count:>8d} строк | {count / seconds:9.0f} строк/с | {seconds:7.2f}s | "
+          f"RSS {peak_rss_mb():7.1f}MB | {size / 1024 / 1024:7.1f}MB{python_peak}")
+
+
+async def synthetic(sizes: list, trace: bool) -> None:
+    for count in sorted(sizes):
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+
+        async def run_xlsx():
+            await write_xlsx(synthetic_chunks(count), path, "События", CSV_HEADER, event_xlsx_row,
+                             EVENTS_XLSX_FORMATS, EVENTS_XLSX_WIDTHS)
+            return os.path.getsize(path)
+
+        async def run_csv():
+            size = 0
+            async for chunk in stream_csv(synthetic_chunks(count), CSV_HEADER, event_csv_row):
+                size += len(chunk)
+            return size
+
+        try:
+            await measure("xlsx", count, run_xlsx, trace)
+            await measure("csv", count, run_csv, trace)
+        finally:
+            os.unlink(path)
+
+
+async def endpoints(database_url: str, date: str) -> None:
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+    engine = create_async_engine(database_url, echo=False)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    day_sql = "FROM events WHERE ts >= CAST(:day AS date) AND ts < CAST(:day AS date) + 1"
+    async with engine.connect() as conn:
+        count = (await conn.execute(text(f"SELECT count(*) {day_sql}"), {"day": date})).scalar()
+        items = (await conn.execute(text(f"SELECT count(*) {day_sql} AND type = 'ITEM'"), {"day": date})).scalar()
+    print(f"📅 {date}: {count} событий, {items} ITEM")
+
+    for name, rows, call in (
+        ("/xlsx", count, lambda db: export_xlsx(
+            date=date, date_end=None, operator=None, client=None, type_filter=None, db=db, api_key=None)),
+        ("/boxes-xlsx", items, lambda db: export_boxes_xlsx(
+            date=date, date_end=None, client=None, db=db, api_key=None)),
+    ):
+        async def run():
+            async with session_factory() as db:
+                response = await call(db)
+            size = os.path.getsize(response.path)
+            os.unlink(response.path)
+            return size
+
+        print(f"🔎 {name}")
+        await measure("xlsx", rows, run)
+
+    await engine.dispose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк XLSX экспорта (строк/сек, память)")
+    parser.add_argument('--sizes', default='10000,100000,500000', help='Строк (синтетика), через запятую')
+    parser.add_argument('--database-url', default=None, help='Эндпоинты на загруженных данных')
+    parser.add_argument('--date', default=None, help='День для --database-url YYYY-MM-DD')
+    parser.add_argument('--tracemalloc', action='store_true', help='Пик памяти Python (медленно)')
+    parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    if args.database_url:
+        await endpoints(args.database_url, args.date or datetime.now(timezone.utc).date().isoformat())
+    else:
+        await synthetic([int(s) for s in args.sizes.split(',')], args.tracemalloc)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
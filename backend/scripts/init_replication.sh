@@ -0,0 +1,6 @@
+#!/bin/sh
+# Primary для docker-compose.replica.yml: разрешить streaming replication
+# (выполняется docker-entrypoint-initdb.d только на пустом томе; для
+# существующей базы добавьте строку в pg_hba.conf и SELECT pg_reload_conf())
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
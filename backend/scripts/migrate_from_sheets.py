@@ -10,7 +10,7 @@ import asyncio
 import argparse
 import sys
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List, Dict
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
@@ -21,8 +21,9 @@ import uuid as uuid_lib
 # Добавить путь к app модулю
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from app.models.event import Event
 from app.database import Base
+from app.services.ingest import insert_rows
+from app.services.partitions import maintain_partitions
 
 
 # Формат даты в Google Sheets: dd.MM.yyyy HH:mm:ss
@@ -57,6 +58,23 @@ def parse_uuid(uuid_str: str) -> uuid_lib.UUID:
         return uuid_lib.uuid4()
 
 
+def as_utc(value: datetime) -> datetime:
+    """Даты Sheets без часового пояса - UTC (как их раньше понимал Postgres)"""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def insert_batch(session: AsyncSession, rows: List[dict], stats: Dict) -> None:
+    """
+    Вставка через ingest (app.services.ingest.insert_rows): uuid занимается
+    в event_uuids, уже занятые (в т.ч. с другим ts) пропускаются,
+    агрегаты обновляются в той же транзакции
+    """
+    inserted_uuids, _ = await insert_rows(session, rows)
+    await session.commit()
+    stats['inserted'] += len(inserted_uuids)
+    stats['skipped'] += len(rows) - len(inserted_uuids)
+
+
 async def migrate_sheet_to_db(
     worksheet,
     session: AsyncSession,
@@ -139,29 +157,29 @@ async def migrate_sheet_to_db(
             ts_dt = parse_sheets_datetime(ts_str)
             received_at_dt = parse_sheets_datetime(received_at_str) if received_at_str else ts_dt
             
-            # Создание модели Event
-            event = Event(
-                uuid=event_uuid,
-                ts=ts_dt,
-                type=type_str,
-                operator=operator,
-                client=client or None,
-                city=city or None,
-                box=box or None,
-                code=code or None,
-                details=details or None,
-                received_at=received_at_dt,
-                source=source or 'pwa'
-            )
-            
-            events_to_insert.append(event)
-            stats['inserted'] += 1
+            # Строка для Core INSERT (как app.services.ingest.event_to_row)
+            events_to_insert.append({
+                "uuid": event_uuid,
+                "ts": as_utc(ts_dt),
+                "type": type_str,
+                "operator": operator,
+                "client": client or None,
+                "city": city or None,
+                "box": box or None,
+                "code": code or None,
+                "details": details or None,
+                "source": source or 'pwa',
+                "received_at": as_utc(received_at_dt),
+                "created_at": as_utc(received_at_dt),
+            })
             
             # Batch insert каждые 1000 записей
-            if len(events_to_insert) >= 1000 and not dry_run:
-                session.add_all(events_to_insert)
-                await session.commit()
-                print(f"  ✅ Вставлено {len(events_to_insert)} записей...")
+            if len(events_to_insert) >= 1000:
+                if dry_run:
+                    stats['inserted'] += len(events_to_insert)
+                else:
+                    await insert_batch(session, events_to_insert, stats)
+                    print(f"  ✅ Обработано {len(events_to_insert)} записей...")
                 events_to_insert = []
         
         except Exception as e:
@@ -170,10 +188,12 @@ async def migrate_sheet_to_db(
             continue
     
     # Финальная вставка оставшихся записей
-    if events_to_insert and not dry_run:
-        session.add_all(events_to_insert)
-        await session.commit()
-        print(f"  ✅ Вставлено {len(events_to_insert)} записей (финал)")
+    if events_to_insert:
+        if dry_run:
+            stats['inserted'] += len(events_to_insert)
+        else:
+            await insert_batch(session, events_to_insert, stats)
+            print(f"  ✅ Обработано {len(events_to_insert)} записей (финал)")
     
     print(f"✅ Лист {worksheet.title} обработан:")
     print(f"   Всего строк: {stats['total']}")
@@ -225,6 +245,8 @@ async def main():
         # Создать таблицы если их нет
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+        async with engine.connect() as conn:
+            await maintain_partitions(conn)
         
         AsyncSessionLocal = sessionmaker(
             engine, class_=AsyncSession, expire_on_commit=False
@@ -275,6 +297,12 @@ async def main():
     
     if args.dry_run:
         print("\n⚠️  DRY RUN режим - данные НЕ были сохранены в БД")
+    else:
+        # История попала в events_default - разложить по месячным секциям
+        async with engine.connect() as conn:
+            created = (await maintain_partitions(conn))["created"]
+        if created:
+            print(f"🗂️  Созданы секции: {', '.join(created)}")
     
     # Закрыть соединение
     await engine.dispose()
@@ -7,7 +7,28 @@ import BoxesNew from './components/BoxesNew';
 import DeleteLogs from './components/DeleteLogs';
 import RawLogsNew from './components/RawLogsNew';
 import ExportNew from './components/ExportNew';
-import { getDashboardState, getRawLogs, getBoxes, getOperators, getClients, getCities } from './api/client';
+import { getDashboardState, getRawLogs, getBoxes, getOperators, getClients, getCities, subscribeDashboard } from './api/client';
+
+const FEED_LIMIT = 100;
+const BOX_GROUPS_PAGE = 50;
+
+// Заменить записи list с тем же key на записи updates (или добавить)
+function mergeBy(list = [], updates = [], key) {
+  const byKey = new Map(list.map(item => [item[key], item]));
+  updates.forEach(item => byKey.set(item[key], item));
+  return Array.from(byKey.values());
+}
+
+// Операторы: онлайн первыми, затем по itemsToday (как на сервере)
+function sortOperators(list) {
+  return list.sort((a, b) => (b.online - a.online) || (b.itemsToday - a.itemsToday));
+}
+
+// Новые события ленты в начало, без повторов по uuid
+function mergeFeed(newEvents = [], feed = []) {
+  const seen = new Set(newEvents.map(e => e.uuid));
+  return [...newEvents, ...feed.filter(e => !e.uuid || !seen.has(e.uuid))].slice(0, FEED_LIMIT);
+}
 
 function App() {
   const [activeTab, setActiveTab] = useState('dashboard');
@@ -51,22 +72,21 @@ function App() {
           summary: data.summary || {}
         });
       } else if (activeTab === 'boxes') {
-        // Для коробов используем feed из getDashboardState
-        const data = await getDashboardState(filters);
-        console.log('Boxes data (from feed):', data);
-        setEvents(data.feed || []);
-        setStats({
-          operators: data.operators || [],
-          clients: data.clients || [],
-          summary: data.summary || {}
-        });
+        // Только сводки коробов, товары грузятся при раскрытии
+        const data = await getBoxes({ ...filters, limit: BOX_GROUPS_PAGE });
+        console.log('Boxes data:', data);
+        setEvents([]);
+        setStats({ boxes: data });
       } else if (activeTab === 'raw' || activeTab === 'deletes' || activeTab === 'export') {
-        const data = await getRawLogs(filters);
+        const data = await getRawLogs({ ...filters, estimateTotal: true });
         console.log('📊 Raw logs data:', data);
-        console.log('📊 Raw logs count:', data.logs?.length || 0, 'Total:', data.total);
+        console.log('📊 Raw logs count:', data.logs?.length || 0, 'Total:', data.totalEstimate);
         // API возвращает "logs", а не "events"
         setEvents(data.logs || data.events || []);
-        setStats({ total: data.total || 0 });
+        setStats({
+          total: data.totalEstimate ?? data.total ?? 0,
+          nextCursor: data.nextCursor || null
+        });
       }
     } catch (err) {
       setError(err.message);
@@ -77,6 +97,23 @@ function App() {
     }
   };
 
+  // Следующая страница сырых логов (по nextCursor)
+  const loadMoreRaw = async () => {
+    if (!stats?.nextCursor) return;
+    setLoading(true);
+    
+    try {
+      const data = await getRawLogs({ ...filters, cursor: stats.nextCursor });
+      setEvents(prev => [...prev, ...(data.logs || [])]);
+      setStats(prev => ({ ...prev, nextCursor: data.nextCursor || null }));
+    } catch (err) {
+      setError(err.message);
+      console.error('Ошибка загрузки страницы:', err);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   // Загрузка списков для фильтров
   const loadFilterOptions = async () => {
     try {
@@ -100,16 +137,52 @@ function App() {
     loadFilterOptions();
   }, []);
 
-  // Автообновление каждые 30 секунд
+  // За сегодня на вкладке dashboard - live поток вместо опроса
+  const today = new Date().toISOString().split('T')[0];
+  const liveMode = autoRefresh
+    && activeTab === 'dashboard'
+    && filters.startDate === today
+    && filters.endDate === today;
+
+  useEffect(() => {
+    if (!liveMode) return;
+    
+    return subscribeDashboard(filters, {
+      snapshot: (data) => {
+        setEvents(data.feed || []);
+        setStats({
+          operators: data.operators || [],
+          clients: data.clients || [],
+          summary: data.summary || {}
+        });
+      },
+      delta: (data) => {
+        setEvents(prev => mergeFeed(data.feed, prev));
+        setStats(prev => prev && {
+          operators: sortOperators(mergeBy(prev.operators, data.operators, 'operator')),
+          clients: mergeBy(prev.clients, data.clients, 'client').sort((a, b) => b.items - a.items),
+          summary: data.summary
+        });
+      },
+      status: (data) => {
+        setStats(prev => prev && {
+          ...prev,
+          operators: sortOperators(mergeBy(prev.operators, data.operators, 'operator'))
+        });
+      }
+    });
+  }, [liveMode, filters.operator, filters.client, filters.city]);
+
+  // Автообновление каждые 30 секунд (кроме live потока)
   useEffect(() => {
-    if (!autoRefresh) return;
+    if (!autoRefresh || liveMode) return;
     
     const interval = setInterval(() => {
       loadData();
     }, 30000);
     
     return () => clearInterval(interval);
-  }, [autoRefresh, filters]);
+  }, [autoRefresh, liveMode, filters]);
 
   // Обновление при изменении фильтров или вкладки
   useEffect(() => {
@@ -180,6 +253,7 @@ function App() {
               stats={stats}
               loading={loading}
               filters={filters}
+              onLoadMore={loadMoreRaw}
             />
           )}
         </div>
@@ -46,6 +46,64 @@ export async function getDashboardState(filters = {}) {
   return fetchAPI(`/dashboard/state${query ? '?' + query : ''}`);
 }
 
+// Live поток изменений dashboard за сегодня (Server-Sent Events)
+// handlers: { snapshot, delta, status } - получают распарсенный JSON
+// Возвращает функцию отписки
+export function subscribeDashboard(filters = {}, handlers = {}) {
+  const params = new URLSearchParams();
+  
+  if (filters.operator) params.append('operator', filters.operator);
+  if (filters.client) params.append('client', filters.client);
+  if (filters.city) params.append('city', filters.city);
+  
+  let source = null;
+  let retryTimer = null;
+  let closed = false;
+  
+  const retry = (delay) => {
+    source?.close();
+    if (!closed) retryTimer = setTimeout(connect, delay);
+  };
+  
+  // EventSource не умеет заголовки - вместо ключа короткоживущий токен,
+  // новый на каждое подключение
+  const connect = async () => {
+    let token;
+    try {
+      ({ token } = await fetchAPI('/dashboard/stream-token', { method: 'POST' }));
+    } catch (error) {
+      console.warn('⚠️ Live stream token failed, retry in 5s');
+      retry(5000);
+      return;
+    }
+    if (closed) return;
+    
+    const query = new URLSearchParams(params);
+    query.append('token', token);
+    console.log('📡 Live stream connect:', filters);
+    source = new EventSource(`${API_BASE}/dashboard/stream?${query.toString()}`);
+    
+    ['snapshot', 'delta', 'status'].forEach((name) => {
+      source.addEventListener(name, (e) => handlers[name]?.(JSON.parse(e.data)));
+    });
+    
+    // После reset сервер закрывает поток; автоматическое переподключение
+    // EventSource пришло бы с устаревшим токеном - переподключаемся сами
+    // с новым (сразу после обрыва, через 5с после ошибки HTTP).
+    source.onerror = () => {
+      retry(source.readyState === EventSource.CLOSED ? 5000 : 0);
+    };
+  };
+  
+  connect();
+  
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    source?.close();
+  };
+}
+
 // Получить сырые логи
 export async function getRawLogs(filters = {}) {
   const params = new URLSearchParams();
@@ -57,7 +115,9 @@ export async function getRawLogs(filters = {}) {
   if (filters.city) params.append('city', filters.city);
   if (filters.eventType) params.append('type', filters.eventType);
   if (filters.limit) params.append('limit', filters.limit);
-  if (filters.offset) params.append('offset', filters.offset);
+  // Keyset пагинация: nextCursor предыдущей страницы
+  if (filters.cursor) params.append('cursor', filters.cursor);
+  if (filters.estimateTotal) params.append('estimate_total', 'true');
   
   const query = params.toString();
   console.log('📡 API request: /dashboard/raw?' + query, {
@@ -76,6 +136,9 @@ export async function getBoxes(filters = {}) {
   if (filters.operator) params.append('operator', filters.operator);
   if (filters.client) params.append('client', filters.client);
   if (filters.city) params.append('city', filters.city);
+  // Пагинация по группам (клиент, город)
+  if (filters.limit) params.append('limit', filters.limit);
+  if (filters.offset) params.append('offset', filters.offset);
   
   const query = params.toString();
   console.log('📡 API request: /dashboard/boxes?' + query, {
@@ -85,6 +148,20 @@ export async function getBoxes(filters = {}) {
   return fetchAPI(`/dashboard/boxes${query ? '?' + query : ''}`);
 }
 
+// Получить товары короба (при раскрытии)
+export async function getBoxItems(filters = {}, box = {}) {
+  const params = new URLSearchParams();
+  
+  if (filters.startDate) params.append('date', filters.startDate);
+  if (filters.endDate) params.append('date_end', filters.endDate);
+  if (filters.operator) params.append('operator', filters.operator);
+  params.append('client', box.client);
+  params.append('city', box.city);
+  params.append('box_no', box.boxNo);
+  
+  return fetchAPI(`/dashboard/boxes/items?${params.toString()}`);
+}
+
 // Получить список операторов
 export async function getOperators() {
   try {
@@ -1,120 +1,69 @@
-import React, { useMemo, useState, useEffect } from 'react';
+import React, { useState, useEffect } from 'react';
+import { getBoxes, getBoxItems } from '../api/client';
+
+const GROUPS_PAGE = 50;
+
+// Добавить страницу групп (клиент, город): клиент может прийти на нескольких страницах
+function mergeClients(list, page) {
+  const byName = new Map(list.map(c => [c.client, { ...c, cities: [...c.cities] }]));
+  page.forEach(client => {
+    const existing = byName.get(client.client);
+    if (!existing) {
+      byName.set(client.client, client);
+      return;
+    }
+    existing.cities.push(...client.cities);
+    existing.totalItems += client.totalItems;
+    existing.totalBoxes += client.totalBoxes;
+  });
+  return Array.from(byName.values());
+}
 
-export default function BoxesNew({ events, stats, loading }) {
+export default function BoxesNew({ stats, loading, filters }) {
   const [expandedClients, setExpandedClients] = useState(new Set());
   const [expandedCities, setExpandedCities] = useState(new Set());
   const [expandedBoxes, setExpandedBoxes] = useState(new Set());
 
-  // Отладка только при изменении данных
-  useEffect(() => {
-    console.log('BoxesNew - events:', events);
-    console.log('BoxesNew - events.length:', events?.length);
-    console.log('BoxesNew - stats:', stats);
-    console.log('BoxesNew - loading:', loading);
-  }, [events, stats, loading]);
+  // Сводки коробов: первая страница от App, следующие - "Показать ещё"
+  const [clientsData, setClientsData] = useState([]);
+  const [nextOffset, setNextOffset] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // boxId → { loading, items, error }
+  const [boxItems, setBoxItems] = useState({});
 
-  // Парсинг даты
-  const parseDate = (dateStr) => {
-    if (!dateStr) return null;
+  useEffect(() => {
+    const data = stats?.boxes;
+    console.log('BoxesNew - boxes:', data);
+    setClientsData(data?.clients || []);
+    setNextOffset(data?.nextOffset ?? null);
+    setBoxItems({});
+  }, [stats]);
+
+  const loadMore = async () => {
+    if (nextOffset === null) return;
+    setLoadingMore(true);
     try {
-      const [datePart, timePart] = dateStr.split(' ');
-      const [month, day, year] = datePart.split('.');
-      return new Date(`${year}-${month}-${day}T${timePart}`);
-    } catch (e) {
-      return null;
+      const data = await getBoxes({ ...filters, limit: GROUPS_PAGE, offset: nextOffset });
+      setClientsData(prev => mergeClients(prev, data.clients || []));
+      setNextOffset(data.nextOffset ?? null);
+    } catch (error) {
+      console.error('Error loading boxes:', error);
+    } finally {
+      setLoadingMore(false);
     }
   };
 
-  // Структура: Клиент → Города → Короба → Штрихкоды
-  const clientsData = useMemo(() => {
-    const clients = {};
-
-    events.forEach(event => {
-      const client = event.client || 'Без клиента';
-      const city = event.city || 'Без города';
-      const box = event.box || null;
-
-      if (!clients[client]) {
-        clients[client] = {
-          name: client,
-          cities: {},
-          totalItems: 0,
-          totalBoxes: 0
-        };
-      }
-
-      if (!clients[client].cities[city]) {
-        clients[client].cities[city] = {
-          name: city,
-          boxes: {},
-          totalItems: 0,
-          totalBoxes: 0
-        };
-      }
-
-      if (event.type === 'ITEM' && box) {
-        clients[client].totalItems++;
-        clients[client].cities[city].totalItems++;
-
-        if (!clients[client].cities[city].boxes[box]) {
-          clients[client].cities[city].boxes[box] = {
-            box: box,
-            items: [],
-            opened: null,
-            closed: null,
-            operators: new Set()
-          };
-          clients[client].totalBoxes++;
-          clients[client].cities[city].totalBoxes++;
-        }
-
-        clients[client].cities[city].boxes[box].items.push({
-          code: event.code,
-          ts: event.ts,
-          operator: event.operator,
-          uuid: event.uuid
-        });
-
-        if (event.operator) {
-          clients[client].cities[city].boxes[box].operators.add(event.operator);
-        }
-      }
-
-      if (event.type === 'BOX' && box) {
-        if (!clients[client].cities[city].boxes[box]) {
-          clients[client].cities[city].boxes[box] = {
-            box: box,
-            items: [],
-            opened: event.ts,
-            closed: null,
-            operators: new Set()
-          };
-          clients[client].totalBoxes++;
-          clients[client].cities[city].totalBoxes++;
-        } else {
-          clients[client].cities[city].boxes[box].opened = event.ts;
-        }
-      }
-
-      if (event.type === 'CLOSE' && box) {
-        if (clients[client].cities[city].boxes[box]) {
-          clients[client].cities[city].boxes[box].closed = event.ts;
-        }
-      }
-    });
-
-    // Преобразуем в массивы
-    return Object.values(clients).map(client => ({
-      ...client,
-      cities: Object.values(client.cities).map(city => ({
-        ...city,
-        boxes: Object.values(city.boxes).map(box => ({
-          ...box,
-          operators: Array.from(box.operators)
-        }))
-      }))
-    })).sort((a, b) => b.totalItems - a.totalItems);
-  }, [events]);
+  const loadBoxItems = async (boxId, box) => {
+    if (boxItems[boxId]?.items) return;
+    setBoxItems(prev => ({ ...prev, [boxId]: { loading: true } }));
+    try {
+      const data = await getBoxItems(filters, box);
+      setBoxItems(prev => ({ ...prev, [boxId]: { items: data.items || [] } }));
+    } catch (error) {
+      console.error('Error loading box items:', error);
+      setBoxItems(prev => ({ ...prev, [boxId]: { error: true } }));
+    }
+  };
 
   const toggleClient = (clientName) => {
     const newExpanded = new Set(expandedClients);
@@ -136,12 +85,13 @@ export default function BoxesNew({ events, stats, loading }) {
     setExpandedCities(newExpanded);
   };
 
-  const toggleBox = (boxId) => {
+  const toggleBox = (boxId, box) => {
     const newExpanded = new Set(expandedBoxes);
     if (newExpanded.has(boxId)) {
       newExpanded.delete(boxId);
     } else {
       newExpanded.add(boxId);
+      loadBoxItems(boxId, box);
     }
     setExpandedBoxes(newExpanded);
   };
@@ -166,43 +116,37 @@ export default function BoxesNew({ events, stats, loading }) {
   return (
     <div className="boxes-new">
       <h2>📦 Короба (структура матрёшки)</h2>
-      
-      {events.length === 0 && !loading && (
-        <div className="empty-state" style={{padding: '2rem', textAlign: 'center', color: '#999'}}>
-          Нет данных за выбранный период. Попробуйте изменить фильтры (дату, оператора, клиента).
-        </div>
-      )}
-      
+
       <div className="boxes-tree">
         {clientsData.map((client) => (
-          <div key={client.name} className="client-node">
-            <div 
+          <div key={client.client} className="client-node">
+            <div
               className="client-header node-header"
-              onClick={() => toggleClient(client.name)}
+              onClick={() => toggleClient(client.client)}
             >
-              <span className={`expand-icon ${expandedClients.has(client.name) ? 'expanded' : ''}`}>
+              <span className={`expand-icon ${expandedClients.has(client.client) ? 'expanded' : ''}`}>
                 ▶
               </span>
-              <span className="node-title">🏢 {client.name}</span>
+              <span className="node-title">🏢 {client.client}</span>
               <span className="node-stats">
                 {client.totalBoxes} коробов · {client.totalItems} товаров
               </span>
             </div>
 
-            {expandedClients.has(client.name) && (
+            {expandedClients.has(client.client) && (
               <div className="client-content">
                 {client.cities.map((city) => {
-                  const cityId = `${client.name}-${city.name}`;
+                  const cityId = `${client.client}-${city.city}`;
                   return (
                     <div key={cityId} className="city-node">
-                      <div 
+                      <div
                         className="city-header node-header"
                         onClick={() => toggleCity(cityId)}
                       >
                         <span className={`expand-icon ${expandedCities.has(cityId) ? 'expanded' : ''}`}>
                           ▶
                         </span>
-                        <span className="node-title">🏙️ {city.name}</span>
+                        <span className="node-title">🏙️ {city.city}</span>
                         <span className="node-stats">
                           {city.totalBoxes} коробов · {city.totalItems} товаров
                         </span>
@@ -211,19 +155,20 @@ export default function BoxesNew({ events, stats, loading }) {
                       {expandedCities.has(cityId) && (
                         <div className="city-content">
                           {city.boxes.map((box) => {
-                            const boxId = `${cityId}-${box.box}`;
+                            const boxId = `${cityId}-${box.boxNo}`;
+                            const loaded = boxItems[boxId];
                             return (
                               <div key={boxId} className="box-node">
-                                <div 
+                                <div
                                   className="box-header node-header"
-                                  onClick={() => toggleBox(boxId)}
+                                  onClick={() => toggleBox(boxId, box)}
                                 >
                                   <span className={`expand-icon ${expandedBoxes.has(boxId) ? 'expanded' : ''}`}>
                                     ▶
                                   </span>
-                                  <span className="node-title">📦 {box.box}</span>
+                                  <span className="node-title">📦 {box.boxNo}</span>
                                   <span className="node-stats">
-                                    {box.items.length} товаров · 
+                                    {box.itemsCount} товаров ·
                                     {box.operators.join(', ')}
                                     {box.closed ? (
                                       <span className="status-badge success">✅ Закрыт</span>
@@ -235,18 +180,20 @@ export default function BoxesNew({ events, stats, loading }) {
 
                                 {expandedBoxes.has(boxId) && (
                                   <div className="box-content">
+                                    {loaded?.loading && <div className="loading">⏳ Загрузка товаров...</div>}
+                                    {loaded?.error && <div className="error-banner">❌ Не удалось загрузить товары</div>}
                                     <div className="items-list">
-                                      {box.items.map((item, idx) => (
-                                        <div key={idx} className="item-card">
+                                      {(loaded?.items || []).map((item) => (
+                                        <div key={item.uuid} className="item-card">
                                           <div className="item-info">
                                             <span className="item-code">{item.code}</span>
                                             <span className="item-meta">
                                               {item.operator} · {item.ts}
                                             </span>
                                           </div>
-                                          <button 
+                                          <button
                                             className="delete-btn"
-                                            onClick={() => handleDeleteItem(item.uuid, box.box, client.name, city.name)}
+                                            onClick={() => handleDeleteItem(item.uuid, box.boxNo, client.client, city.city)}
                                           >
                                             🗑️ Удалить
                                           </button>
@@ -268,11 +215,20 @@ export default function BoxesNew({ events, stats, loading }) {
           </div>
         ))}
 
+        {nextOffset !== null && (
+          <div className="pagination">
+            <button onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? '⏳ Загрузка...' : '⬇️ Показать ещё'}
+            </button>
+          </div>
+        )}
+
         {clientsData.length === 0 && !loading && (
-          <div className="empty-state">Нет данных о коробах за выбранный период.</div>
+          <div className="empty-state">
+            Нет данных о коробах за выбранный период. Попробуйте изменить фильтры (дату, оператора, клиента).
+          </div>
         )}
       </div>
     </div>
   );
 }
-
@@ -1,6 +1,6 @@
 import { useState, useMemo, useEffect } from 'react';
 
-export default function RawLogsNew({ events, stats, loading }) {
+export default function RawLogsNew({ events, stats, loading, onLoadMore }) {
   const [searchQuery, setSearchQuery] = useState('');
   const [currentPage, setCurrentPage] = useState(1);
   const itemsPerPage = 50;
@@ -81,6 +81,7 @@ export default function RawLogsNew({ events, stats, loading }) {
 
       <div className="logs-info">
         Показано {paginatedEvents.length} из {filteredEvents.length} записей
+        {stats?.total > events.length && ` (загружено ${events.length} из ≈${stats.total})`}
         {searchQuery && ` (найдено по запросу "${searchQuery}")`}
       </div>
 
@@ -155,6 +156,14 @@ export default function RawLogsNew({ events, stats, loading }) {
         </div>
       )}
 
+      {stats?.nextCursor && onLoadMore && (
+        <div className="pagination">
+          <button onClick={onLoadMore} disabled={loading}>
+            {loading ? '⏳ Загрузка...' : '⬇️ Загрузить ещё'}
+          </button>
+        </div>
+      )}
+
       {paginatedEvents.length === 0 && !loading && (
         <div className="empty-state">
           {searchQuery 
@@ -3,6 +3,7 @@ import { APP, setStatePill, render } from '../state/appState.js';
 
 let syncInFlight = false;
 const MAX_BATCH = 20;
+const STREAM_THRESHOLD = 200; // больше неотправленных - шлем одним NDJSON потоком
 const MAX_RETRIES = 3;
 const RETRY_DELAY = 2000; // 2 секунды между попытками
 
@@ -10,6 +11,67 @@ async function sleep(ms) {
   return new Promise(resolve => setTimeout(resolve, ms));
 }
 
+function toApiEvent(r){
+  return {
+    uuid:r.uuid,
+    ts:r.timestamp,  // API ожидает 'ts', а не 'timestamp'
+    type:r.type,
+    operator:r.operator,
+    client:r.client||'',
+    city:r.city||'',
+    box:r.box||'',
+    code:r.code||'',
+    source:'pwa',
+    details:r.details||''
+  };
+}
+
+// Потоковая отправка большого хвоста (POST /events/stream, NDJSON).
+// Сервер подтверждает чанки строками {ackedThrough}; подтвержденные события
+// помечаются synced сразу, поэтому после обрыва следующий sync продолжит с места остановки.
+async function streamBacklog(apiUrl, apiKey, rows){
+  const resp = await fetch(`${apiUrl}/api/v1/events/stream`, {
+    method:'POST',
+    headers:{
+      'Content-Type':'application/x-ndjson',
+      'X-API-Key':apiKey
+    },
+    body:rows.map(r=>JSON.stringify(toApiEvent(r))).join('\n'),
+    signal: AbortSignal.timeout(120000)
+  });
+  if(!resp.ok){
+    const errorText=await resp.text();
+    throw new Error(`HTTP ${resp.status}: ${errorText.substring(0, 200)}`);
+  }
+  
+  const reader=resp.body.getReader();
+  const decoder=new TextDecoder();
+  let buffer='';
+  let acked=0;
+  let inserted=0;
+  let done=false;
+  
+  while(true){
+    const {value, done:eof}=await reader.read();
+    if(eof) break;
+    buffer+=decoder.decode(value, {stream:true});
+    let pos;
+    while((pos=buffer.indexOf('\n'))>=0){
+      const line=buffer.slice(0,pos); buffer=buffer.slice(pos+1);
+      if(!line.trim()) continue;
+      const ack=JSON.parse(line);
+      if(ack.error) throw new Error(ack.error);
+      if(ack.done){ done=true; continue; }
+      inserted+=ack.inserted;
+      for(const r of rows.slice(acked, ack.ackedThrough+1)){ r.synced=true; await put(APP.db,'events',r); }
+      acked=ack.ackedThrough+1;
+      console.log(`📦 Stream chunk ${ack.chunk}: ${acked}/${rows.length} acked`);
+    }
+  }
+  if(!done) throw new Error(`Stream interrupted: ${acked}/${rows.length} acked`);
+  return inserted;
+}
+
 export async function syncNow(){
   if(syncInFlight) {
     console.log('⏳ Sync already in progress, skipping...');
@@ -32,6 +94,30 @@ export async function syncNow(){
   
   console.log(`📤 Starting sync: ${unsent.length} unsent events (batch size: ${MAX_BATCH})`);
   
+  if(unsent.length>STREAM_THRESHOLD) {
+    try{
+      syncInFlight=true;
+      const apiUrl=APP.state.syncUrl || 'https://scanner-api.fulfilment-one.ru';
+      const apiKey=APP.state.apiKey || 'ihkLCIfVDynpEcr14NxuO8ZBWKHzMU60';
+      console.log(`🌊 Streaming ${unsent.length} events to: ${apiUrl}/api/v1/events/stream`);
+      const inserted=await streamBacklog(apiUrl, apiKey, unsent);
+      APP.state.lastSync=Date.now();
+      APP.state.lastSyncError=false;
+      setStatePill('ok','IDLE');
+      if(window.resetFirstUnsentTs) window.resetFirstUnsentTs();
+      if(statusMeta) statusMeta.textContent=`✓ Синхронизировано: ${inserted} новых`;
+      return;
+    }catch(e){
+      // Подтвержденные чанки уже помечены synced, остаток уйдет обычными батчами
+      console.warn('⚠️ Stream sync failed, falling back to batches:', e.message);
+      unsent=(await getAll(APP.db,'events')).filter(r=>!r.synced);
+      if(unsent.length===0){ setStatePill('ok','IDLE'); return; }
+    }finally{
+      syncInFlight=false;
+      render();
+    }
+  }
+  
   if(unsent.length>MAX_BATCH) {
     console.warn(`⚠️ Too many unsent events (${unsent.length}), sending first ${MAX_BATCH}`);
     unsent=unsent.slice(0,MAX_BATCH);
@@ -45,18 +131,7 @@ export async function syncNow(){
     console.log(`🌐 Syncing to: ${apiUrl}/api/v1/events/batch`);
     
     // Формат для нового FastAPI бэкенда
-    const events=unsent.map(r=>({
-      uuid:r.uuid,
-      ts:r.timestamp,  // API ожидает 'ts', а не 'timestamp'
-      type:r.type,
-      operator:r.operator,
-      client:r.client||'',
-      city:r.city||'',
-      box:r.box||'',
-      code:r.code||'',
-      source:'pwa',
-      details:r.details||''
-    }));
+    const events=unsent.map(toApiEvent);
     
     let lastError = null;
     let resp = null;